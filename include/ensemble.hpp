@@ -0,0 +1,25 @@
+# pragma once
+# include <vector>
+# include "system.hpp"
+
+/*
+Ensemble of independent systems, stored contiguously
+and stepped together on a pool of threads.
+References returned by getSystem are invalidated by addSystem & clearSystems.
+*/
+template<typename T, typename A = T>
+class Ensemble {
+    public:
+        std::vector<System<T, A>> systems;
+
+        Ensemble() {};
+
+        int getNumberSystems() const { return systems.size(); };
+        const System<T, A>& getSystem(int idx) const;
+
+        void addSystem(const System<T, A> &system);
+        void clearSystems() { systems.clear(); };
+
+        void run(int nSteps, int nThreads = 0, T dt = -1);
+        std::vector<Summary> summaries() const;
+};
@@ -19,6 +19,13 @@ class Vect2D {
             this->y = vect[1];
         }
 
+        // conversion between precisions
+        template<typename U>
+        explicit Vect2D(const Vect2D<U> &vect) {
+            this->x = static_cast<T>(vect.x);
+            this->y = static_cast<T>(vect.y);
+        }
+
         double length() const {
             return sqrt(x*x + y*y);
         }
@@ -47,6 +54,16 @@ class Vect2D {
                 this->y / number
             );
         }
+        Vect2D<T>& operator+=(const Vect2D<T> &vect) {
+            this->x += vect.x;
+            this->y += vect.y;
+            return *this;
+        }
+        Vect2D<T>& operator-=(const Vect2D<T> &vect) {
+            this->x -= vect.x;
+            this->y -= vect.y;
+            return *this;
+        }
 
         Vect2D<T> normalize() {
             double length = this->length();
@@ -1,28 +1,46 @@
 # pragma once
+# include <cstdint>
 # include <string>
 # include <vector>
 # include "physic.hpp"
 # include "math.hpp"
 
-
+/*
+Particule, templated on the storage precision T (float or double).
+The acceleration `a` holds the acceleration applied during the last update.
+The id is assigned by the system the particule belongs to (-1 otherwise).
+*/
+template<typename T>
 class Particule {
     public:
-        Vect2D<float> pos, v, a;
-        float q, m;
+        Vect2D<T> pos, v, a;
+        T q, m;
         bool isDead;
+        int64_t id = -1;
+
+        Particule(const Vect2D<T> &pos, T q, T m);
+        Particule(T x, T y, T q, T m);
 
-        Particule(Vect2D<float> &pos, float q, float m);
-        Particule(float x, float y, float q, float m);
+        // conversion between precisions
+        template<typename U>
+        explicit Particule(const Particule<U> &p) {
+            this->pos = Vect2D<T>(p.pos);
+            this->v = Vect2D<T>(p.v);
+            this->a = Vect2D<T>(p.a);
+            this->q = static_cast<T>(p.q);
+            this->m = static_cast<T>(p.m);
+            this->isDead = p.isDead;
+            this->id = p.id;
+        }
 
-        std::vector<float> getListPos() const { return {pos.x, pos.y}; }
-        std::vector<float> getListV() const { return {v.x, v.y}; }
-        std::vector<float> getListA() const { return {a.x, a.y}; }
-        void setListPos(std::vector<float> list) { pos = Vect2D<float>(list); }
-        void setListV(std::vector<float> list) { v = Vect2D<float>(list); }
-        void setListA(std::vector<float> list) { a = Vect2D<float>(list); }
+        std::vector<T> getListPos() const { return {pos.x, pos.y}; }
+        std::vector<T> getListV() const { return {v.x, v.y}; }
+        std::vector<T> getListA() const { return {a.x, a.y}; }
+        void setListPos(std::vector<T> list) { pos = Vect2D<T>(list); }
+        void setListV(std::vector<T> list) { v = Vect2D<T>(list); }
+        void setListA(std::vector<T> list) { a = Vect2D<T>(list); }
 
-        void applyForce(Vect2D<float> force);
-        void updateState(float dt);
+        void updateState(T dt);
 
         void print();
-};
\ No newline at end of file
+};
@@ -4,7 +4,7 @@
 # include "partcule.hpp"
 # include "math.hpp"
 
-class Particule;
+template<typename T> class Particule;
 
 class Constants {
     public:
@@ -33,32 +33,47 @@ class Constants {
         double _k = 1/(4 * this->pi * this->_e);
 };
 
+template<typename T>
 class MagneticField{
     public:
-        Vect2D<float> origin;
-        float intensity, dispersion;
+        Vect2D<T> origin;
+        T intensity, dispersion;
         bool isUniform;
 
-        MagneticField(float x, float y, float intensity, float dispersion = -1, bool isUniform = true);
-        MagneticField(Vect2D<float> origin, float intensity, float dispersion = -1, bool isUniform = true);
+        MagneticField(T x, T y, T intensity, T dispersion = -1, bool isUniform = true);
+        MagneticField(Vect2D<T> origin, T intensity, T dispersion = -1, bool isUniform = true);
 
-        std::vector<float> getListOrigin() const { return {origin.x, origin.y}; }
+        // conversion between precisions
+        template<typename U>
+        explicit MagneticField(const MagneticField<U> &field) {
+            this->origin = Vect2D<T>(field.origin);
+            this->intensity = static_cast<T>(field.intensity);
+            this->dispersion = static_cast<T>(field.dispersion);
+            this->isUniform = field.isUniform;
+        }
 
-        float getIntensity(const Vect2D<float> &coordinate) const;
+        std::vector<T> getListOrigin() const { return {origin.x, origin.y}; }
+
+        T getIntensity(const Vect2D<T> &coordinate) const;
     private:
-        float defaultDispersion = 20;
+        T defaultDispersion = 20;
 };
 
+/*
+Physical interactions, computed in the accumulation precision A
+from particules stored in precision T.
+*/
+template<typename T, typename A = T>
 class Physics {
     public:
         Constants constants;
 
         Physics();
 
-        Vect2D<float> getParticulesAttraction(const Particule &p1, const Particule &p2) const;
-        void handelnParticulesInteraction(Particule &p1, Particule &p2) const;
-        void handelnMagneticInteraction(Particule &p, MagneticField &m) const;
-        bool areNearby(Particule &p1, Particule &p2) const;
+        Vect2D<A> getParticulesAttraction(const Particule<T> &p1, const Particule<T> &p2) const;
+        void handelnParticulesInteraction(const Particule<T> &p1, const Particule<T> &p2, Vect2D<A> &a1, Vect2D<A> &a2) const;
+        void handelnMagneticInteraction(const Particule<T> &p, const MagneticField<T> &m, Vect2D<A> &a) const;
+        bool areNearby(const Particule<T> &p1, const Particule<T> &p2) const;
 };
 
 
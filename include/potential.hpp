@@ -0,0 +1,36 @@
+# pragma once
+# include <vector>
+# include "partcule.hpp"
+
+/*
+Electric potential of the particules on a regular grid, by particle-mesh:
+the charges are deposited on a mesh (cloud in cell), convolved with the softened
+kernel k / sqrt(r^2 + softening^2) through zero padded FFTs (open boundaries),
+then interpolated at the nodes of the grid.
+The mesh covers the grid & all the particules, with the spacing of the grid,
+coarsened to at most MAX_MESH nodes per axis: O(n + M log M), M the size of the mesh.
+
+The grid has nx * ny nodes, from (minX, minY) to (maxX, maxY) included,
+the potential is returned row by row: value of node (i, j) at j * nx + i.
+softening < 0: the spacing of the mesh.
+*/
+class PotentialGrid {
+    public:
+        static constexpr int MAX_MESH = 512;
+
+        double minX, maxX, minY, maxY;
+        int nx, ny;
+        double softening;
+
+        PotentialGrid(double minX, double maxX, double minY, double maxY, int nx, int ny, double softening = -1);
+
+        template<typename T>
+        std::vector<double> compute(const std::vector<Particule<T>> &particules, double k) const;
+        // positions: n * 2 values, x & y interleaved
+        template<typename T>
+        std::vector<double> compute(int n, const T *positions, const T *charges, double k) const;
+
+    private:
+        template<typename F>
+        std::vector<double> computeFrom(int n, F particule, double k) const;
+};
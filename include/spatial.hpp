@@ -0,0 +1,47 @@
+# pragma once
+# include <cstdint>
+# include <vector>
+# include "partcule.hpp"
+
+/*
+Uniform grid over the positions of the particules, for region & neighbour queries.
+The particules are sorted by cell (counting sort): a cell is a contiguous range
+of `order`, its positions are stored alongside, in the same order.
+The cell size is chosen for about CELL_OCCUPANCY particules per cell,
+the build is O(n), a query visits the cells overlapping its region.
+Results are indices in the particules vector the index was built from.
+*/
+template<typename T>
+class SpatialIndex {
+    public:
+        static constexpr double CELL_OCCUPANCY = 2;
+        static constexpr int MAX_CELLS_PER_AXIS = 1 << 15;
+
+        void build(const std::vector<Particule<T>> &particules);
+        // positions: n * 2 values, x & y interleaved
+        void build(int n, const T *positions);
+        bool isValid() const { return valid; };
+        // same number of particules at the positions of the build
+        bool matches(const std::vector<Particule<T>> &particules) const;
+        void invalidate() { valid = false; };
+        int size() const { return order.size(); };
+
+        std::vector<int64_t> queryRect(double minX, double maxX, double minY, double maxY) const;
+        std::vector<int64_t> queryRadius(double x, double y, double r) const;
+        // k nearest particules, by increasing distance
+        void nearest(double x, double y, int k, std::vector<int64_t> &indices, std::vector<double> &distances) const;
+
+    private:
+        bool valid = false;
+        double originX = 0, originY = 0, cellSize = 1, invCellSize = 1;
+        int nx = 1, ny = 1;
+
+        std::vector<int32_t> cellStart; // nx * ny + 1
+        std::vector<int32_t> order; // particule indices, by cell
+        std::vector<T> xs, ys; // positions, by cell
+
+        template<typename F>
+        void buildFrom(int n, F position);
+        int cellX(double x) const;
+        int cellY(double y) const;
+};
@@ -1,39 +1,133 @@
 # pragma once
+# include <cstdint>
 # include <iostream>
+# include <memory>
+# include <string>
 # include <vector>
 # include "partcule.hpp"
 # include "physic.hpp"
+# include "spatial.hpp"
+# include "trajectory.hpp"
 
-class Particule;
+// bumped whenever results of the engine change
+# define ENGINE_VERSION 1
 
+template<typename T> class Particule;
+
+/*
+Summary of the state of a system, accumulated in double.
+*/
+struct Summary {
+    int nParticules = 0;
+    double charge = 0;
+    double mass = 0;
+    double kineticEnergy = 0;
+    double momentumX = 0;
+    double momentumY = 0;
+};
+
+/*
+Profiling counters of a system, accumulated over the steps since the last reset.
+The engine has no tree: every pair is evaluated directly.
+*/
+struct Stats {
+    int64_t steps = 0;
+    int64_t pairInteractions = 0; // pair forces evaluated
+    int64_t fieldInteractions = 0; // particule-field forces evaluated
+    int64_t merges = 0; // pairs of nearby particules merged
+    int64_t removals = 0; // particules out of the limits
+    int64_t indexBuilds = 0; // spatial index built by a query
+    int64_t pairsNs = 0;
+    int64_t fieldsNs = 0;
+    int64_t integrationNs = 0; // limits culling & integration
+    int64_t recordNs = 0;
+};
+
+/*
+System of particules & magnetic fields.
+Particules are stored in precision T, forces are accumulated in precision A.
+*/
+template<typename T, typename A = T>
 class System{
     public:
-        Physics physic;
-        std::vector<Particule> particules;
-        std::vector<MagneticField> magneticFields;
+        Physics<T, A> physic;
+        std::vector<Particule<T>> particules;
+        std::vector<MagneticField<T>> magneticFields;
         int FLAG_SUM = 0;
         int FLAG_SUM_ONESIDE = 1;
 
-        System(std::vector<Particule> &particules, float dt=-1, int flag = 0);
+        System(std::vector<Particule<T>> &particules, T dt=-1, int flag = 0);
 
-        void setLimits(float minX, float maxX, float minY, float maxY);
+        void setLimits(T minX, T maxX, T minY, T maxY);
+        bool hasLimits() const { return isLimits; };
+        std::vector<T> getLimits() const { return {minX, maxX, minY, maxY}; };
+        T getDt() const { return dt; };
+        int getMergingFlag() const { return mergingFlag; };
+        int64_t getStep() const { return step; };
+        void setStep(int64_t step) { this->step = step; };
+        double getTime() const { return time; };
+        void setTime(double time) { this->time = time; };
         const Constants& constants() const { return physic.constants; }
         int getNumberParticules() const { return particules.size(); };
+        // particules modifiable from outside: the index can't follow them anymore,
+        // until the particules are replaced (update), every query checks their positions
+        // & rebuilds the index only if one has moved
+        std::vector<Particule<T>>& exposeParticules() { exposed = true; return particules; };
 
-        void updateState(float dt=-1);
+        void updateState(T dt=-1);
+        void run(int nSteps, T dt=-1);
+        Summary summary() const;
+        const Stats& stats() const { return statistics; };
+        void resetStats() { statistics = Stats(); };
+
+        // spatial queries, the index is rebuilt when the particules have changed
+        const SpatialIndex<T>& spatialIndex() const;
+        std::vector<int64_t> queryRect(double minX, double maxX, double minY, double maxY) const;
+        std::vector<int64_t> queryRadius(double x, double y, double r) const;
+        void nearest(double x, double y, int k, std::vector<int64_t> &indices, std::vector<double> &distances) const;
 
         void clearElements();
-        void addParticule(Particule &particule);
-        void addMagneticField(MagneticField &magneticField);
+        void addParticule(Particule<T> &particule);
+        void addParticules(int n, const T *pos, const T *q, const T *m,
+            const T *v = nullptr, const T *a = nullptr, const int64_t *ids = nullptr);
+        void addMagneticField(MagneticField<T> &magneticField);
+
+        void save(const std::string &path) const;
+        void load(const std::string &path);
+
+        void record(const std::string &path, int every = 1, int chunkFrames = 64, int codec = 0, int bits = 16);
+        void stopRecording();
+        void detachRecorder() { recorder.reset(); };
+        bool isRecording() const { return recorder != nullptr; };
 
         void print();
         
         private:
             bool isLimits = false;
             int mergingFlag;
-            float dt, minX, maxX, minY, maxY;
+            T dt, minX, maxX, minY, maxY;
+            int64_t step = 0;
+            double time = 0;
+            int64_t nextId = 0;
+
+            // shared by copies of the system, see detachRecorder
+            std::shared_ptr<TrajectoryWriter<T>> recorder;
+
+            // per-particule acceleration accumulators
+            std::vector<Vect2D<A>> accelerations;
+
+            // mutable: counts the builds of the index by the queries
+            mutable Stats statistics;
+
+            // built lazily, invalidated by any change of the particules
+            mutable SpatialIndex<T> index;
+            bool exposed = false; // see exposeParticules
+
+            // particules & fields of a checkpoint, see load
+            template<typename P>
+            void loadPayload(const P &payload, uint64_t n, uint64_t k);
 
-            bool isInLimits(Particule &particule) const;
-            bool willBeValidMerge(Particule &p1, Particule &p2);
-            Particule mergeParticules(Particule &p1, Particule &p2);
-};
\ No newline at end of file
+            bool isInLimits(Particule<T> &particule) const;
+            bool willBeValidMerge(Particule<T> &p1, Particule<T> &p2);
+            Particule<T> mergeParticules(Particule<T> &p1, Particule<T> &p2);
+};
@@ -0,0 +1,77 @@
+# pragma once
+# include <cstdint>
+# include <fstream>
+# include <string>
+# include <unordered_map>
+# include <utility>
+# include <vector>
+# include "partcule.hpp"
+
+/*
+Trajectory file format (native endianness), every block padded to 8 bytes
+---
+header:  magic "PSIMTRAJ", uint32 version, uint32 header size,
+         uint32 value size (sizeof(T)), uint32 codec, uint32 every, uint32 quantization bits,
+         double bounds[4] (min x, max x, min y, max y)
+chunks:  uint32 magic "CHNK", uint32 number of frames,
+         uint64 stored size, uint64 raw size, payload (stored size bytes, padded)
+frame:   int64 step, double time, uint64 n,
+         ids (n int64), pos (n*2 T), v (n*2 T), q (n T), m (n T)
+
+quantized codec: the payload of a chunk is compressed with zlib, in a frame:
+         ids are stored as the difference with the previous id of the frame,
+         positions as int32, quantized on the bounds with a step (max - min) / (2^bits - 1),
+         as the difference with the position of the same particule in the previous frame
+         of the chunk when it exists (the first frame of a chunk is a key frame)
+index:   written when the file is closed (version >= 2)
+         uint32 magic "INDX", uint32 reserved, uint64 number of entries,
+         entries: int64 step, double time, uint64 n,
+         uint64 chunk offset (in the file), uint64 frame offset (in the raw payload)
+trailer: uint64 index offset, magic "PSIMIDX" (8 bytes, null terminated)
+*/
+template<typename T>
+class TrajectoryWriter {
+    public:
+        static constexpr uint32_t VERSION = 2;
+        static constexpr uint32_t CODEC_RAW = 0;
+        static constexpr uint32_t CODEC_QUANTIZED = 1;
+
+        TrajectoryWriter(const std::string &path, int every, int chunkFrames, const std::vector<double> &bounds,
+            int codec = CODEC_RAW, int bits = 16);
+        ~TrajectoryWriter();
+
+        int getEvery() const { return every; };
+
+        void write(const std::vector<Particule<T>> &particules, int64_t step, double time);
+        void flush();
+        void close();
+
+    private:
+        struct IndexEntry {
+            int64_t step;
+            double time;
+            uint64_t n, chunkOffset, frameOffset;
+        };
+
+        std::ofstream file;
+        int every, chunkFrames, codec, bits;
+        uint32_t nFrames = 0;
+        uint64_t fileOffset = 0;
+        std::vector<char> chunk;
+        std::vector<IndexEntry> index;
+        int nIndexedFrames = 0; // entries of the flushed chunks
+
+        // quantization
+        double minX, minY, stepX, stepY;
+        std::unordered_map<int64_t, std::pair<int32_t, int32_t>> previous, current;
+
+        void writeIndex();
+        void writeRaw(const std::vector<Particule<T>> &particules);
+        void writeQuantized(const std::vector<Particule<T>> &particules);
+        void writeAttributes(const std::vector<Particule<T>> &particules);
+        int32_t quantize(double x, double min, double step) const;
+
+        template<typename V>
+        void append(const V &value);
+        void pad();
+};
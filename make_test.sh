@@ -1,5 +1,5 @@
 echo Compiling test.cpp...
-g++ -I include src/particule.cpp src/physic.cpp src/system.cpp src/test.cpp -o bin/test
+g++ -pthread -I include src/particule.cpp src/physic.cpp src/system.cpp src/ensemble.cpp src/checkpoint.cpp src/trajectory.cpp src/spatial.cpp src/potential.cpp src/test.cpp -lz -o bin/test
 echo Built bin/test
 echo Run bin/test...
 ./bin/test
\ No newline at end of file
@@ -2,37 +2,86 @@ from lib.plougame import Interface, Dimension, Form, Page, C, Font
 import lib.plougame.components as cmps
 from lib.plougame.helper import Delayer
 from lib.simulation import System, Particule, MagneticField
-from gui import FieldUI, ParticuleUI
+from lib.simulation.replay import TrajectoryPlayer
+from lib.simulation.stepper import FixedStepper
+from lib.simulation.worker import SimulationWorker
+from lib.simulation.shared import SharedFrameReader
+from gui import (
+    FieldUI, FieldLayer, ParticuleUI, DensityRaster, PotentialHeatmap,
+    display_particules, get_field_array
+)
+from hud import HUD
+from camera import Camera
+from selection import Selection
 from config import Consts
+from contextlib import nullcontext
 import pygame, time, numpy as np
 
 delayer = Delayer(20)
 
 class App(Page):
 
-    def __init__(self, system: System):
+    def __init__(self, system: System, speed=1.0, threaded=False, attach=None):
 
         components = Page.formatter.get_components('ui/app.json')
 
-        super().__init__(['base', 'edit'], components, active_states='none')
+        super().__init__(['base', 'edit', 'replay'], components, active_states='none')
 
-        self.set_states_components(['base', 'edit'], [
+        self.set_states_components(['base', 'edit', 'replay'], [
             'header',
             'label-time',
             'label-particules',
-            'button-edit',
             'button-start',
+            'button-hud',
+            ]
+        )
+
+        self.set_states_components(['base', 'edit'], [
+            'button-edit',
             'button-reset',
             'button-random'
             ]
         )
 
+        self.set_states_components('replay', [
+            'button-speed',
+            'replay-bar',
+            'replay-cursor',
+            ]
+        )
+
         self.set_states_components('edit', [
             'button-add-particule',
             'button-add-field',
             ]
         )
 
+        # composited once, again only when they change: the time label changes each frame
+        self.set_layer([
+            'header',
+            'label-particules',
+            'button-start',
+            'button-hud',
+            'button-edit',
+            'button-reset',
+            'button-random',
+            'button-speed',
+            'replay-bar',
+            'button-add-particule',
+            'button-add-field',
+            'options-panel',
+            'option-title',
+            'option-label1',
+            'option-label2',
+            'select-panel',
+            'select-title',
+            'select-label1',
+            'select-label2',
+            'select-label3',
+            'select-label4',
+            ], 'static'
+        )
+
         # timer attributes
         self.start_time = None
         self.current_time = 0
@@ -46,15 +95,72 @@ class App(Page):
         self.paused = True
         self.system = system
 
+        # fixed time steps, independent of the fps, see FixedStepper
+        self.stepper = FixedStepper(system, speed)
+
+        # threaded: the system is stepped by a worker thread, see SimulationWorker
+        self.worker = SimulationWorker(system, speed) if threaded else None
+
+        # viewer mode: the frames are read from a simulation server, see SharedFrameReader
+        self.viewer = None if attach is None else SharedFrameReader(attach)
+        self.shared_frame = None
+
+        # replay mode
+        self.player = None
+        self.replay_frame = None
+
+        self.hud = HUD()
+
+        # selection of particules, in edit mode
+        self.selection = Selection()
+        self.n_frames = 0
+
+        # zoom, pan & follow, see Camera
+        self.camera = Camera()
+
+        # level of detail: many particules are displayed as a density raster
+        self.lod = True
+        self.density = DensityRaster()
+
+        # the fields are rendered once, until they change
+        self.field_layer = FieldLayer()
+
+        # electric potential overlay, computed at an interval
+        self.potential = PotentialHeatmap()
+
+        # ids & positions of the displayed (visible) particules, for the picking
+        self.displayed_ids = np.empty(0, dtype=np.int64)
+        self.displayed_pos = np.empty((0, 2))
+
         self.add_button_logic('button-start', self.change_pause_state)
         self.add_button_logic('button-random', self.logic_random)
         self.add_button_logic('button-edit', self.logic_edit)
         self.add_button_logic('button-reset', self.reset)
         self.add_button_logic('button-add-particule', self.logic_add_p)
         self.add_button_logic('button-add-field', self.logic_add_f)
+        self.add_button_logic('button-speed', self.logic_speed)
+        self.add_button_logic('button-hud', self.hud.toggle)
     
+    def edit_system(self):
+        '''
+        Return a context in which the system can be modified,  
+        while the worker thread (if any) doesn't step it
+        '''
+        if self.worker is None:
+            return nullcontext(self.system)
+        return self.worker.edit()
+
     def reset(self):
-        self.system.clear_elements()
+        # the viewer can't modify the served system
+        if self.viewer is not None:
+            return
+
+        self.set_selection([])
+
+        with self.edit_system() as system:
+            system.clear_elements()
+
+        self.field_layer.invalidate()
 
         if not self.paused:
             self.change_pause_state()
@@ -64,6 +170,12 @@ class App(Page):
         '''
         Update `paused` attr, timer & start/stop button
         '''
+        if self.player is not None:
+            self.player.toggle()
+            self.paused = self.player.paused
+            self.set_text('button-start', "Start" if self.paused else "Stop")
+            return
+
         self.paused = not self.paused
         
         if self.paused:
@@ -71,6 +183,16 @@ class App(Page):
             self.start_time = None
         else:
             self.start_time = time.time()
+            self.stepper.reset()
+
+        if self.worker is not None:
+            if self.paused:
+                self.worker.pause()
+            else:
+                self.worker.start()
+
+        if self.viewer is not None and self.paused:
+            self.freeze_shared_frame()
         
         if self.paused:
             self.set_text('button-start', "Start")
@@ -79,49 +201,58 @@ class App(Page):
 
     def logic_random(self):
         '''Generate a random situation'''
+        if self.viewer is not None:
+            return
+
         if not self.paused:
             self.change_pause_state()
         
         self.reset()
         
-        n_particule = np.random.randint(
-            Consts.MIN_PARTICULES,
-            Consts.MAX_PARTICULES
-        )
+        with self.edit_system() as system:
+            n_particule = np.random.randint(
+                Consts.MIN_PARTICULES,
+                Consts.MAX_PARTICULES
+            )
 
-        taken_positions = []
+            taken_positions = []
 
-        for i in range(n_particule):
-            x = np.random.randint(Consts.MIN_X, Consts.MAX_X)
-            y = np.random.randint(Consts.MIN_Y, Consts.MAX_Y)
+            for i in range(n_particule):
+                x = np.random.randint(Consts.MIN_X, Consts.MAX_X)
+                y = np.random.randint(Consts.MIN_Y, Consts.MAX_Y)
 
-            if (x,y) in taken_positions:
-                continue
+                if (x,y) in taken_positions:
+                    continue
             
-            taken_positions.append((x,y))
+                taken_positions.append((x,y))
 
-            q = np.random.uniform(-5, 5)
-            m = abs(q)
-            p = Particule([x,y], q, m)
-            self.system.add_particule(p)
+                q = np.random.uniform(-5, 5)
+                m = abs(q)
+                p = Particule([x,y], q, m)
+                system.add_particule(p)
 
-        n_fields = np.random.randint(
-            Consts.MIN_FIELDS,
-            Consts.MAX_FIELDS
-        )
+            n_fields = np.random.randint(
+                Consts.MIN_FIELDS,
+                Consts.MAX_FIELDS
+            )
+
+            for i in range(n_fields):
+                x = np.random.randint(Consts.MIN_X, Consts.MAX_X)
+                y = np.random.randint(Consts.MIN_Y, Consts.MAX_Y)
 
-        for i in range(n_fields):
-            x = np.random.randint(Consts.MIN_X, Consts.MAX_X)
-            y = np.random.randint(Consts.MIN_Y, Consts.MAX_Y)
+                intensity = np.random.uniform(-5, 5)
+                dispersion = np.random.uniform(1, 5)
 
-            intensity = np.random.uniform(-5, 5)
-            dispersion = np.random.uniform(1, 5)
+                field = MagneticField(x, y, intensity, dispersion)
+                system.add_magnetic_field(field)
 
-            field = MagneticField(x, y, intensity, dispersion)
-            self.system.add_magnetic_field(field)
+        self.field_layer.invalidate()
 
     def logic_edit(self):
 
+        if self.viewer is not None:
+            return
+
         if self.get_state() == 'base':
             self.change_state('edit')
             self.set_text('button-edit', 'Done')
@@ -132,6 +263,7 @@ class App(Page):
             self.mode_p = False
             self.mode_f = False
             self.change_option_display_state(False)
+            self.set_selection([])
 
     def logic_add_p(self):
         self.mode_f = False
@@ -149,6 +281,64 @@ class App(Page):
         if self.mode_f:
             self.set_option_panel_field()
 
+    def start_replay(self, path: str):
+        '''
+        Play the trajectory file recorded at `path` (see `System.record`)
+        instead of the live simulation
+        '''
+        if not self.paused:
+            self.change_pause_state()
+
+        self.stop_replay()
+        self.player = TrajectoryPlayer(path)
+        self.replay_frame = None
+
+        self.change_state('replay')
+        self.set_text('button-start', "Start")
+        self.set_text('button-speed', "x1")
+
+    def stop_replay(self):
+        '''Stop the replay, go back to the live simulation'''
+        if self.player is None:
+            return
+
+        self.player.close()
+        self.player = None
+        self.replay_frame = None
+        self.paused = True
+        self.change_state('base')
+        self.set_text('button-start', "Start")
+
+    def logic_speed(self):
+        self.player.next_speed()
+        self.set_text('button-speed', f"x{self.player.speed:g}")
+
+    def handeln_scrub(self, pressed):
+        '''Seek in the trajectory while the replay bar is clicked'''
+        bar = self.get_component('replay-bar')
+
+        if pygame.mouse.get_pressed()[0] and bar.on_it():
+            x = pygame.mouse.get_pos()[0]
+            progress = (x - bar.TOPLEFT[0]) / (bar.TOPRIGHT[0] - bar.TOPLEFT[0])
+            self.player.seek_progress(min(max(progress, 0), 1))
+
+        elif self.is_step(pressed):
+            self.player.step(1 if pressed[pygame.K_RIGHT] else -1)
+
+    @delayer
+    def is_step(self, pressed):
+        return pressed[pygame.K_RIGHT] or pressed[pygame.K_LEFT]
+
+    def update_replay_cursor(self):
+        '''Move the cursor of the replay bar to the played frame'''
+        bar = self.get_component('replay-bar')
+        cursor = self.get_component('replay-cursor')
+
+        x, y = bar.get_pos()
+        width = bar.get_dim()[0] - cursor.get_dim()[0]
+
+        cursor.set_pos([x + self.player.progress * width, cursor.get_pos()[1]], scale=True)
+
     @delayer
     def is_pause(self, pressed):
         return pressed[pygame.K_SPACE]
@@ -156,11 +346,73 @@ class App(Page):
     def handeln_pause(self, pressed):
         if self.is_pause(pressed):
             self.change_pause_state()
+
+    @delayer
+    def is_hud(self, pressed):
+        return pressed[pygame.K_F3]
+
+    @delayer
+    def is_follow(self, pressed):
+        return pressed[pygame.K_f]
+
+    @delayer
+    def is_lod(self, pressed):
+        return pressed[pygame.K_l]
+
+    @delayer
+    def is_potential(self, pressed):
+        return pressed[pygame.K_p]
+
+    def handeln_camera(self, pressed, events):
+        '''
+        Zoom with the mouse wheel, pan by dragging with the right (or middle) button,  
+        F: follow the selection, L: level of detail on/off,
+        P: potential heatmap on/off, Home: default view
+        '''
+        for event in events:
+            if event.type == pygame.MOUSEWHEEL and not self.is_on_panel():
+                self.camera.zoom_at(pygame.mouse.get_pos(), event.y)
+
+            elif event.type == pygame.MOUSEMOTION and (event.buttons[1] or event.buttons[2]):
+                self.camera.pan(event.rel)
+                self.camera.following = False
+
+        # the inputs of the options panel take the keys
+        if self.mode_p or self.mode_f:
+            return
+
+        if self.is_follow(pressed):
+            self.camera.following = not self.camera.following
+
+        if self.is_lod(pressed):
+            self.lod = not self.lod
+
+        if self.is_potential(pressed):
+            self.potential.toggle()
+
+        if pressed[pygame.K_HOME]:
+            self.camera.reset()
+
+    def get_step(self) -> int:
+        '''Return the step of the displayed state'''
+        if self.viewer is not None:
+            return 0 if self.shared_frame is None else self.shared_frame.step
+        if self.worker is not None:
+            return self.worker.snapshot.step
+        if self.player is None:
+            return self.system.step
+        if self.replay_frame is None:
+            return 0
+        return self.replay_frame.step
     
     def update_labels(self):
         
         # time
-        if self.start_time is None:
+        if self.player is not None:
+            sec = self.player.time
+        elif self.viewer is not None:
+            sec = 0 if self.shared_frame is None else self.shared_frame.time
+        elif self.start_time is None:
             sec = self.current_time
         else:
             sec = self.current_time + time.time() - self.start_time
@@ -173,12 +425,22 @@ class App(Page):
         self.set_text('label-time', f"Time {_time}")
 
         # particules
-        self.set_text('label-particules', f"Paricules {self.system.n_particules}")
+        if self.player is not None:
+            n_particules = 0 if self.replay_frame is None else self.replay_frame.n_particules
+        elif self.viewer is not None:
+            n_particules = 0 if self.shared_frame is None else self.shared_frame.n_particules
+        elif self.worker is not None:
+            n_particules = self.worker.snapshot.n_particules
+        else:
+            n_particules = self.system.n_particules
+
+        self.set_text('label-particules', f"Paricules {n_particules}")
 
     def is_pushed(self, events):
-        '''Return if the mouse button has been pushed'''
+        '''Return if the left mouse button has been pushed'''
         for event in events:
-            if event.type == pygame.MOUSEBUTTONUP:
+            # the other buttons & the wheel move the camera
+            if event.type == pygame.MOUSEBUTTONUP and event.button == 1:
                 return True
         return False
 
@@ -190,6 +452,99 @@ class App(Page):
         self.change_display_state('option-input1', state)
         self.change_display_state('option-input2', state)
 
+    def change_selection_display_state(self, state: bool):
+        self.change_display_state('select-panel', state)
+        self.change_display_state('select-title', state)
+        for i in range(1, 5):
+            self.change_display_state(f'select-label{i}', state)
+
+    def set_selection(self, ids):
+        '''Select the particules of the given ids'''
+        self.selection.clear()
+        self.selection.ids = np.unique(np.asarray(ids, dtype=np.int64))
+        self.change_selection_display_state(len(self.selection) > 0)
+
+    def get_screen_positions(self, positions: np.ndarray) -> np.ndarray:
+        '''Return the positions on the screen (scaled) of simulation positions'''
+        return self.camera.world_to_screen(positions)
+
+    def get_particule_radius(self) -> float:
+        '''Return the radius (scaled) of a particule of mass 1 on the screen'''
+        return Dimension.scale(Consts.DIM_PARTICULE[0] / 2) * self.camera.zoom
+
+    def handeln_selection(self, events):
+        '''Select the particules by click or box, in edit mode'''
+        if self.mode_p or self.mode_f:
+            return
+
+        for event in events:
+            if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
+                if not self.is_on_panel():
+                    self.selection.start_drag(event.pos)
+
+            elif event.type == pygame.MOUSEBUTTONUP and event.button == 1 and self.selection.is_dragging:
+                add = pygame.key.get_mods() & pygame.KMOD_SHIFT
+                # the system is queried unless it is stepped by the worker
+                is_system = self.player is None and self.viewer is None and self.worker is None
+
+                self.selection.end_drag(
+                    event.pos,
+                    self.camera,
+                    2 * self.get_particule_radius(),
+                    system=self.system if is_system else None,
+                    ids=self.displayed_ids,
+                    positions=self.displayed_pos,
+                    add=add,
+                )
+                self.change_selection_display_state(len(self.selection) > 0)
+                self.update_selection_panel()
+
+    def is_on_panel(self) -> bool:
+        '''Return if the mouse is on the header or a displayed panel'''
+        for name in ('header', 'options-panel', 'select-panel'):
+            comp_info = self._components[name]
+            if (comp_info['displayed'] or name == 'header') and comp_info['object'].on_it():
+                return True
+        return False
+
+    def update_selection_panel(self):
+        '''Display the state of the selected particules: q, m, v & a'''
+        if len(self.selection) == 0:
+            return
+
+        with self.edit_system() as system:
+            ids = system.ids()
+            mask = self.selection.get_mask(ids)
+            ids = ids[mask]
+            q = system.charges()[mask]
+            m = system.masses()[mask]
+            v = system.velocities()[mask]
+            a = system.accelerations()[mask]
+
+        if len(ids) == 0:
+            lines = ["no particule", "", "", ""]
+            self.set_text('select-title', "Selection")
+
+        elif len(ids) == 1:
+            self.set_text('select-title', f"Particule {ids[0]}")
+            lines = [
+                f"q {q[0]:+.3g}",
+                f"m {m[0]:.3g}",
+                f"v ({v[0, 0]:.3g}, {v[0, 1]:.3g})",
+                f"a ({a[0, 0]:.3g}, {a[0, 1]:.3g})",
+            ]
+        else:
+            self.set_text('select-title', f"{len(ids)} particules")
+            lines = [
+                f"total q {q.sum():+.3g}",
+                f"total m {m.sum():.3g}",
+                f"mean |v| {np.hypot(*v.T).mean():.3g}",
+                f"mean |a| {np.hypot(*a.T).mean():.3g}",
+            ]
+
+        for i, line in enumerate(lines):
+            self.set_text(f'select-label{i+1}', line)
+
     def set_option_panel_particule(self):
         '''
         Set the option panel for a particule
@@ -211,10 +566,7 @@ class App(Page):
     def handeln_edit_releases(self, events):
         '''Handeln release of mouse button in edit mode'''
 
-        header = self.get_component('header')
-        panel = self.get_component('options-panel')
-
-        if header.on_it() or panel.on_it():
+        if self.is_on_panel():
             return
 
         if not self.is_pushed(events):
@@ -228,7 +580,7 @@ class App(Page):
             
     def add_particule(self):
         '''Add a particule to the system'''
-        pos = self.mode_p_ui.get_center() / Consts.SCALE_FACTOR
+        pos = self.camera.screen_to_world(self.mode_p_ui.get_center(scale=True))
 
         charge = self.get_text('option-input1')
         try:
@@ -244,11 +596,12 @@ class App(Page):
 
         particule = Particule(pos, charge, mass)
 
-        self.system.add_particule(particule)
+        with self.edit_system() as system:
+            system.add_particule(particule)
 
     def add_field(self):
         '''Add a field to the system'''
-        pos = self.mode_f_ui.get_center() / Consts.SCALE_FACTOR
+        pos = self.camera.screen_to_world(self.mode_f_ui.get_center(scale=True))
 
         intensity = self.get_text('option-input1')
         try:
@@ -264,21 +617,64 @@ class App(Page):
 
         field = MagneticField(pos[0], pos[1], intensity, dispersion)
 
-        self.system.add_magnetic_field(field)
+        with self.edit_system() as system:
+            system.add_magnetic_field(field)
+
+        self.field_layer.invalidate()
 
     def update_system(self):
-        '''Update system state'''
-        self.system.update()
+        '''
+        Update system state, by as many steps as the elapsed time requires,  
+        in threaded mode, the worker steps the system by itself,  
+        in viewer mode, the server does,  
+        in replay mode, advance the playback
+        '''
+        if (self.worker is not None or self.viewer is not None) and self.player is None:
+            return
+
+        if self.player is None:
+            self.stepper.advance(Interface.clock.get_time() / 1000)
+            return
+
+        self.player.advance(Interface.clock.get_time() / 1000)
+
+        # the playback stops at the end of the trajectory
+        if self.player.paused:
+            self.paused = True
+            self.set_text('button-start', "Start")
+
+    def update_replay_frame(self):
+        '''
+        Get the played frame from the reading thread,
+        keep the previous one if it isn't read yet
+        '''
+        frame = self.player.frame(timeout=0.005)
+        if frame is not None:
+            self.replay_frame = frame
 
     def react_events(self, pressed, events):
         
         self.update_labels()
         self.handeln_pause(pressed)
+        self.handeln_camera(pressed, events)
+
+        if self.is_hud(pressed):
+            self.hud.toggle()
         
         if self.get_state() == 'edit':
             self.handeln_edit_releases(events)
+            self.handeln_selection(events)
+
+            # the values change as the simulation runs
+            if self.n_frames % 10 == 0:
+                self.update_selection_panel()
+
+        if self.get_state() == 'replay':
+            self.handeln_scrub(pressed)
+            self.update_replay_cursor()
 
         super().react_events(pressed, events)
+        self.n_frames += 1
 
     def display_particule_pointer(self):
         '''Display a particule where the mouse is located'''
@@ -292,23 +688,133 @@ class App(Page):
         self.mode_f_ui.set_pos(pos, center=True, scale=False)
         self.mode_f_ui.display()
 
-    def display_system(self):
-        fields = self.system.magnetic_fields
+    def display_replay_frame(self):
+        '''Display the particules of the played frame'''
+        self.update_replay_frame()
 
-        field_ui = FieldUI(None)
+        if self.replay_frame is None:
+            return
 
-        for field in fields:
-            field_ui.field = field
-            field_ui.display()
+        frame = self.replay_frame
+        self.display_particules(frame.ids, frame.pos, frame.q, frame.m)
 
-        particules = self.system.particules
+    def freeze_shared_frame(self):
+        '''
+        Copy the last frame out of the shared memory,
+        for it to be kept while the server overwrites the ring buffer
+        '''
+        frame = self.viewer.read(copy=True, new_only=False)
+        if frame is not None:
+            self.shared_frame = frame
+        elif self.shared_frame is not None and not self.shared_frame.detach():
+            self.shared_frame = None
+
+    def detach(self):
+        '''Stop viewing the simulation server'''
+        if self.viewer is None:
+            return
+
+        self.shared_frame = None
+        self.viewer.close()
+        self.viewer = None
+
+    def display_shared_frame(self):
+        '''
+        Display the last frame published by the simulation server,
+        read in place in the shared memory (copied while paused, see `freeze_shared_frame`)
+        '''
+        if not self.paused:
+            frame = self.viewer.read()
+            if frame is not None:
+                self.shared_frame = frame
+
+        if self.shared_frame is None:
+            return
+
+        frame = self.shared_frame
+
+        # the layer is kept while the served fields are the same
+        self.field_layer.set_fields(frame.fields)
+        self.field_layer.display(self.camera)
+
+        self.display_particules(frame.ids, frame.pos, frame.q, frame.m)
+
+        # the server came back to the slot of the frame while it was displayed: it is torn,
+        # the last published frame is displayed next
+        if not frame.is_valid():
+            self.shared_frame = self.viewer.read(copy=self.paused, new_only=False)
+
+    def get_coulomb_constant(self):
+        '''
+        Return the coulomb constant of the displayed particules,  
+        None in replay & viewer modes: the trajectories and the served frames
+        don't store the constants of their system, the potential heatmap isn't shown
+        '''
+        if self.player is not None or self.viewer is not None:
+            return None
+        return self.system.constants.k
+
+    def display_particules(self, ids, positions, charges, masses):
+        '''
+        Display particules given as arrays, through the camera:  
+        only the ones in the window are drawn, as a density raster
+        past `Consts.LOD_PARTICULES` (see `DensityRaster`),  
+        they are kept for the picking (see `Selection`)
+        '''
+        if self.camera.following:
+            self.camera.follow(positions[self.selection.get_mask(ids)])
+
+        # the potential of all the particules, under the visible ones
+        k = self.get_coulomb_constant()
+        if self.potential.visible and k is not None:
+            self.potential.update(positions, charges, k, self.camera)
+            self.potential.display()
+
+        # the biggest particule decides how far out of the window a particule can be seen
+        margin = 0
+        if len(masses) > 0:
+            margin = self.get_particule_radius() * np.sqrt(np.abs(masses).max())
+
+        visible = self.camera.get_visible_mask(positions, margin)
+
+        self.displayed_ids = ids[visible]
+        self.displayed_pos = positions[visible]
+
+        screen_pos = self.get_screen_positions(self.displayed_pos)
+
+        if self.lod and len(self.displayed_ids) > Consts.LOD_PARTICULES:
+            self.density.display(screen_pos, charges[visible])
+            return
+
+        display_particules(
+            screen_pos,
+            charges[visible],
+            masses[visible],
+            self.camera.zoom,
+        )
 
-        for particule in particules:
-            particule_ui = ParticuleUI(particule)
-            particule_ui.display()
+    def display_system(self):
+        if not self.field_layer.is_valid():
+            self.field_layer.set_fields(get_field_array(self.system.magnetic_fields))
+
+        self.field_layer.display(self.camera)
+
+        if self.worker is not None:
+            # last state published by the worker, read without lock
+            snapshot = self.worker.snapshot
+            self.display_particules(snapshot.ids, snapshot.pos, snapshot.q, snapshot.m)
+            return
+
+        # positions interpolated between the last two steps
+        self.display_particules(self.system.ids(), *self.stepper.get_state())
     
     def display(self):
-        self.display_system()
+        if self.player is not None:
+            self.display_replay_frame()
+        elif self.viewer is not None:
+            self.display_shared_frame()
+        else:
+            self.display_system()
         
         if self.mode_p:
             self.display_particule_pointer()
@@ -316,4 +822,15 @@ class App(Page):
         elif self.mode_f:
             self.display_field_pointer()
 
-        super().display()
\ No newline at end of file
+        if self.get_state() == 'edit':
+            self.selection.display(
+                self.displayed_ids,
+                self.get_screen_positions(self.displayed_pos),
+                2 * self.get_particule_radius(),
+            )
+
+        super().display()
+
+        if self.hud.visible:
+            self.hud.update(self.get_step())
+            self.hud.display()
\ No newline at end of file
@@ -0,0 +1,295 @@
+'''
+Benchmarks
+======
+Time the native engine on fixed-seed scenarios:
+
+- `system`: `System.run` for each number of particules, precision,
+merging flag and number of magnetic fields
+- `ensemble`: `Ensemble.run` of many small systems for each number of threads
+
+    python bench.py --output bench.json --plot bench.png
+    python bench.py --quick --baseline bench.json
+
+The results are written as JSON, they can be compared against a baseline
+(a previous output): cases slower than the baseline beyond the tolerance
+are reported as regressions, and the exit code is 1.
+
+The cost of a step grows as N^2, sizes whose estimated step time exceeds
+`--max-step-time` are skipped (recorded as such in the results).
+'''
+from typing import Dict, List, Optional
+import argparse, datetime, json, os, platform, sys, time
+import numpy as np
+
+from lib.simulation import System, ENGINE_VERSION
+from lib.simulation.scenario import Scenario
+from lib.simulation.sweep import PRECISIONS
+
+SIZES = (100, 1_000, 10_000, 100_000, 1_000_000)
+QUICK_SIZES = (100, 1_000)
+FLAGS = {
+    'sum': System.FLAG_SUM,
+    'sum-oneside': System.FLAG_SUM_ONESIDE,
+}
+LIMITS = (0, 1000, 0, 1000)
+
+def make_scenario(n_particules: int, n_fields: int, flag: int, seed: int) -> Scenario:
+    '''
+    Uniform particules in a large box, with weak charges:
+    the number of particules stays about constant during the benchmark
+    '''
+    rng = np.random.default_rng(seed)
+    min_x, max_x, min_y, max_y = LIMITS
+
+    pos = np.stack([
+        rng.uniform(min_x, max_x, n_particules),
+        rng.uniform(min_y, max_y, n_particules),
+    ], axis=1)
+    q = rng.uniform(-1e-3, 1e-3, n_particules)
+    m = np.ones(n_particules)
+
+    fields = np.stack([
+        rng.uniform(min_x, max_x, n_fields),
+        rng.uniform(min_y, max_y, n_fields),
+        rng.uniform(-1e-3, 1e-3, n_fields),
+        rng.uniform(10, 50, n_fields),
+    ], axis=1)
+
+    return Scenario(pos, q, m, fields, dt=0.01, k=1, flag=flag, limits=LIMITS)
+
+def time_steps(run, min_time: float, max_steps: int=1000) -> (int, float):
+    '''
+    Call `run(n_steps)` with a growing number of steps until it lasts at least
+    `min_time`, return the number of steps & the duration of the last call
+    '''
+    n_steps = 1
+    while True:
+        start = time.perf_counter()
+        run(n_steps)
+        elapsed = time.perf_counter() - start
+
+        if elapsed >= min_time or n_steps >= max_steps:
+            return n_steps, elapsed
+
+        # aim directly at the minimal time
+        n_steps = min(max_steps, max(2 * n_steps, int(1.2 * n_steps * min_time / max(elapsed, 1e-9))))
+
+def bench_systems(sizes, precisions, flags, field_counts, *, seed: int,
+        min_time: float, max_step_time: float, log=print) -> List[Dict]:
+    results = []
+
+    for precision in precisions:
+        system_cls = PRECISIONS[precision][0]
+
+        for flag in flags:
+            for n_fields in field_counts:
+                # step time of the last measured size, to extrapolate the next ones
+                last = None
+
+                for n_particules in sizes:
+                    case = {
+                        'name': f"system/{precision}/{flag}/fields={n_fields}/n={n_particules}",
+                        'kind': 'system',
+                        'n_particules': n_particules,
+                        'precision': precision,
+                        'flag': flag,
+                        'n_fields': n_fields,
+                        'n_threads': 1,
+                    }
+
+                    if last is not None:
+                        estimate = last[1] * (n_particules / last[0]) ** 2
+                        if estimate > max_step_time:
+                            case['skipped'] = f"estimated step time {estimate:.3g} s"
+                            results.append(case)
+                            log(f"{case['name']:<55} skipped ({case['skipped']})")
+                            continue
+
+                    scenario = make_scenario(n_particules, n_fields, FLAGS[flag], seed)
+                    system = scenario.build(system_cls)
+                    system.update() # warm up
+
+                    n_steps, elapsed = time_steps(system.run, min_time)
+                    time_per_step = elapsed / n_steps
+                    last = (n_particules, time_per_step)
+
+                    case.update({
+                        'n_steps': n_steps,
+                        'seconds': elapsed,
+                        'time_per_step': time_per_step,
+                        'particule_steps_per_s': n_particules / time_per_step,
+                        'final_n_particules': system.n_particules,
+                    })
+                    results.append(case)
+                    log(f"{case['name']:<55} {1e3 * time_per_step:>12.4f} ms/step")
+
+    return results
+
+def bench_ensembles(thread_counts, *, n_systems: int, n_particules: int,
+        precision: str, seed: int, min_time: float, log=print) -> List[Dict]:
+    results = []
+    system_cls, ensemble_cls = PRECISIONS[precision]
+
+    for n_threads in thread_counts:
+        ensemble = ensemble_cls()
+        for i in range(n_systems):
+            scenario = make_scenario(n_particules, 0, System.FLAG_SUM, seed + i)
+            ensemble.add_system(scenario.build(system_cls))
+
+        n_steps, elapsed = time_steps(lambda n: ensemble.run(n, n_threads), min_time)
+        time_per_step = elapsed / n_steps
+
+        case = {
+            'name': f"ensemble/{precision}/systems={n_systems}/n={n_particules}/threads={n_threads}",
+            'kind': 'ensemble',
+            'n_particules': n_particules,
+            'n_systems': n_systems,
+            'precision': precision,
+            'n_threads': n_threads,
+            'n_steps': n_steps,
+            'seconds': elapsed,
+            'time_per_step': time_per_step,
+            'particule_steps_per_s': n_systems * n_particules / time_per_step,
+        }
+        results.append(case)
+        log(f"{case['name']:<55} {1e3 * time_per_step:>12.4f} ms/step")
+
+    return results
+
+def get_metadata(args: argparse.Namespace) -> Dict:
+    return {
+        'engine_version': ENGINE_VERSION,
+        'date': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'seed': args.seed,
+        'min_time': args.min_time,
+    }
+
+def compare(results: List[Dict], baseline: Dict, tolerance: float) -> List[Dict]:
+    '''
+    Return the cases slower than in the baseline by more than `tolerance`
+    (relative), with their speedup (< 1)
+    '''
+    reference = {
+        case['name']: case for case in baseline['results'] if 'time_per_step' in case
+    }
+    regressions = []
+
+    for case in results:
+        if 'time_per_step' not in case or case['name'] not in reference:
+            continue
+
+        speedup = reference[case['name']]['time_per_step'] / case['time_per_step']
+        case['baseline_speedup'] = speedup
+
+        if speedup < 1 / (1 + tolerance):
+            regressions.append(case)
+
+    return regressions
+
+def plot(results: List[Dict], path: str):
+    '''Plot the time per step vs the number of particules of the system cases'''
+    try:
+        import matplotlib
+        matplotlib.use('Agg')
+        import matplotlib.pyplot as plt
+    except ImportError:
+        print("matplotlib is not installed, no plot", file=sys.stderr)
+        return
+
+    series = {}
+    for case in results:
+        if case['kind'] != 'system' or 'time_per_step' not in case:
+            continue
+        label = f"{case['precision']}, {case['flag']}, {case['n_fields']} fields"
+        series.setdefault(label, []).append((case['n_particules'], case['time_per_step']))
+
+    fig, ax = plt.subplots(figsize=(8, 5))
+    for label, points in series.items():
+        n, t = zip(*sorted(points))
+        ax.loglog(n, t, marker='o', label=label)
+
+    ax.set_xlabel("particules")
+    ax.set_ylabel("time per step [s]")
+    ax.grid(True, which='both', alpha=0.3)
+    ax.legend(fontsize='small')
+    fig.tight_layout()
+    fig.savefig(path)
+
+def parse_args(args: Optional[List[str]]=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark the simulation engine.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES)
+    parser.add_argument('--precisions', nargs='+', choices=list(PRECISIONS), default=list(PRECISIONS))
+    parser.add_argument('--flags', nargs='+', choices=list(FLAGS), default=list(FLAGS))
+    parser.add_argument('--fields', type=int, nargs='+', default=[0, 10])
+    parser.add_argument('--threads', type=int, nargs='+',
+        default=sorted({1, 2, 4, os.cpu_count() or 1}))
+    parser.add_argument('--systems', type=int, default=64, help="systems of the ensemble cases")
+    parser.add_argument('--system-size', type=int, default=100,
+        help="particules per system of the ensemble cases")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--min-time', type=float, default=0.2,
+        help="minimal duration of a measure, in seconds")
+    parser.add_argument('--max-step-time', type=float, default=2.0,
+        help="skip the sizes whose estimated step time exceeds it, in seconds")
+    parser.add_argument('--quick', action='store_true',
+        help=f"only sizes {QUICK_SIZES}, float32, no fields")
+    parser.add_argument('--output', help="write the results in a JSON file")
+    parser.add_argument('--plot', help="plot the time per step in an image file")
+    parser.add_argument('--baseline', help="JSON results to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.1,
+        help="relative slowdown tolerated against the baseline")
+
+    args = parser.parse_args(args)
+
+    if args.quick:
+        args.sizes = QUICK_SIZES
+        args.precisions = ['float32']
+        args.fields = [0]
+
+    return args
+
+def main(args: Optional[List[str]]=None) -> int:
+    args = parse_args(args)
+
+    results = bench_systems(
+        args.sizes, args.precisions, args.flags, args.fields,
+        seed=args.seed, min_time=args.min_time, max_step_time=args.max_step_time,
+    )
+    results += bench_ensembles(
+        args.threads, n_systems=args.systems, n_particules=args.system_size,
+        precision=args.precisions[0], seed=args.seed, min_time=args.min_time,
+    )
+
+    output = {'metadata': get_metadata(args), 'results': results}
+    status = 0
+
+    if args.baseline is not None:
+        with open(args.baseline, 'r') as file:
+            baseline = json.load(file)
+
+        regressions = compare(results, baseline, args.tolerance)
+
+        for case in regressions:
+            print(f"REGRESSION {case['name']}: {1 / case['baseline_speedup']:.2f}x slower")
+
+        if len(regressions) > 0:
+            status = 1
+        else:
+            print("no regression against the baseline")
+
+    if args.output is not None:
+        with open(args.output, 'w') as file:
+            json.dump(output, file, indent=2)
+
+    if args.plot is not None:
+        plot(results, args.plot)
+
+    return status
+
+if __name__ == '__main__':
+    sys.exit(main())
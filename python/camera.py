@@ -0,0 +1,91 @@
+from lib.plougame import Interface, Dimension
+from config import Consts
+import numpy as np
+
+class Camera:
+    '''
+    Viewport over the simulation: zoom, pan & follow.
+
+    A simulation position `pos` is displayed at
+    `Dimension.scale((pos - origin) * SCALE_FACTOR * zoom)`,
+    the default camera (origin 0, zoom 1) is the fixed mapping of `Consts.SCALE_FACTOR`.
+    Only what is in the window is displayed: `get_visible_mask` culls
+    the particules, vectorized over their positions.
+
+    Methods
+    ---
+    `world_to_screen`: Return the screen positions of simulation positions  
+    `screen_to_world`: Return the simulation positions of screen positions  
+    `get_visible_mask`: Return which positions are in the window  
+    `zoom_at`: Zoom, keeping the point under a screen position in place  
+    `pan`: Move the view by a screen distance  
+    `follow`: Center the view on positions
+    '''
+    MIN_ZOOM = 0.02
+    MAX_ZOOM = 100
+    ZOOM_STEP = 1.2
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        '''Go back to the default view'''
+        self.origin = np.zeros(2) # simulation position of the top left corner
+        self.zoom = 1.0
+        self.following = False
+
+    def get_scale(self) -> float:
+        '''Return the number of (scaled) pixels per simulation unit'''
+        return Dimension.scale(Consts.SCALE_FACTOR * self.zoom)
+
+    def world_to_screen(self, positions) -> np.ndarray:
+        '''Return the screen positions (scaled) of simulation positions'''
+        return (np.asarray(positions, dtype=np.float64) - self.origin) * self.get_scale()
+
+    def screen_to_world(self, positions) -> np.ndarray:
+        '''Return the simulation positions of screen positions (scaled)'''
+        return np.asarray(positions, dtype=np.float64) / self.get_scale() + self.origin
+
+    def get_visible_rect(self, margin: float=0) -> (float, float, float, float):
+        '''
+        Return the window in simulation coordinates: min x, max x, min y, max y,
+        `margin`: distance (scaled pixels) added around the window
+        '''
+        width, height = Interface.screen.get_size()
+        (min_x, min_y) = self.screen_to_world((-margin, -margin))
+        (max_x, max_y) = self.screen_to_world((width + margin, height + margin))
+        return min_x, max_x, min_y, max_y
+
+    def get_visible_mask(self, positions: np.ndarray, margin: float=0) -> np.ndarray:
+        '''
+        Return which of the simulation positions (n, 2) are in the window,
+        `margin`: distance (scaled pixels) added around the window
+        '''
+        min_x, max_x, min_y, max_y = self.get_visible_rect(margin)
+        x, y = positions[:, 0], positions[:, 1]
+        return (x >= min_x) & (x <= max_x) & (y >= min_y) & (y <= max_y)
+
+    def zoom_at(self, screen_pos, steps: float):
+        '''
+        Zoom by `ZOOM_STEP` to the power of `steps` (negative: zoom out),
+        the simulation position under `screen_pos` stays in place
+        '''
+        world_pos = self.screen_to_world(screen_pos)
+
+        zoom = self.zoom * self.ZOOM_STEP ** steps
+        self.zoom = min(max(zoom, self.MIN_ZOOM), self.MAX_ZOOM)
+
+        self.origin = world_pos - np.asarray(screen_pos, dtype=np.float64) / self.get_scale()
+
+    def pan(self, shift):
+        '''Move the view by a screen distance (scaled), the content follows the mouse'''
+        self.origin = self.origin - np.asarray(shift, dtype=np.float64) / self.get_scale()
+
+    def follow(self, positions: np.ndarray):
+        '''Center the view on the mean of simulation positions (n, 2), if any'''
+        if len(positions) == 0:
+            return
+
+        center = np.asarray(positions, dtype=np.float64).mean(axis=0)
+        window_center = np.array(Interface.screen.get_size()) / 2
+        self.origin = center - window_center / self.get_scale()
@@ -10,6 +10,18 @@ class Consts:
     COLOR_LIGHTEST = 200
     SCALE_FACTOR = 100
 
+    ### MAGNETIC FIELD ###
+    C_FIELD_POSITIVE = (225, 200, 200)
+    C_FIELD_NEGATIVE = (200, 200, 225)
+
+    ### POTENTIAL HEATMAP ###
+    # seconds between two computations of the potential
+    POTENTIAL_PERIOD = 0.5
+
+    ### LEVEL OF DETAIL ###
+    # number of visible particules above which they are displayed as a density raster
+    LOD_PARTICULES = 20000
+
     ### DIMENSION ###
     MIN_X = -2
     MAX_X = 34
@@ -1,7 +1,7 @@
 from lib.plougame import Interface, Dimension, Form, Page, C, Font
 import lib.plougame.components as cmps
 from lib.plougame.helper import Delayer
-from lib.simulation import Particule, MagneticField
+from lib.simulation import Particule, MagneticField, potential_grid
 from config import Consts
 import numpy as np
 import pygame, time
@@ -38,6 +38,305 @@ class ParticuleUI(Form):
 
         return tuple(shade)
 
+def get_shaded_colors(charges: np.ndarray) -> np.ndarray:
+    '''Return the colors (n, 3) of particules of the given charges, see `ParticuleUI.get_shaded_color`'''
+    charges = np.asarray(charges, dtype=np.float64)
+
+    colors = np.where(charges[:, None] >= 0, Consts.C_POSITIVE, Consts.C_NEGATIVE)
+    colors = colors + ((Consts.COLOR_MAX_CHARGE - np.abs(charges)) / Consts.COLOR_MAX_CHARGE * Consts.COLOR_LIGHTEST)[:, None]
+
+    return np.clip(colors, 0, 255).astype(int)
+
+def display_particules(screen_pos: np.ndarray, charges: np.ndarray, masses: np.ndarray, zoom: float=1):
+    '''
+    Display particules as `ParticuleUI` does, without creating a Form for each of them,  
+    `screen_pos`: centers of the particules on the screen (scaled)  
+    `zoom`: zoom of the camera, the particules are sized in the simulation space
+    '''
+    if len(screen_pos) == 0:
+        return
+
+    sizes = Dimension.scale(Consts.DIM_PARTICULE[0] * np.sqrt(np.abs(masses))) * zoom
+    sizes = np.maximum(sizes, 1)
+
+    rects = np.empty((len(screen_pos), 4))
+    rects[:, :2] = screen_pos - sizes[:, None] / 2
+    rects[:, 2] = sizes
+    rects[:, 3] = sizes
+
+    fill = Interface.screen.fill
+    for color, rect in zip(get_shaded_colors(charges).tolist(), rects.astype(int).tolist()):
+        fill(color, rect)
+
+class DensityRaster:
+    '''
+    Level of detail for huge numbers of particules: instead of one rect
+    per particule, the particules are counted by cell of `CELL` pixels,
+    separately by sign of charge, the counts are mapped to colors
+    and blitted at once (`pygame.surfarray`).  
+    Apart from the counting (numpy), the cost depends on the window, not on the number of particules.
+
+    A cell is shaded from `C_POSITIVE` to `C_NEGATIVE` by its proportion of
+    negative particules, and darkened by its number of particules (log scale).  
+    The empty cells are transparent.
+    '''
+    CELL = 3 # scaled pixels
+    MIN_SHADE = 0.35 # shade of a cell of one particule, 1: the color of the charge
+
+    def __init__(self):
+        self._surf = None
+        self._screen_surf = None
+
+    def _get_surfaces(self, n_x: int, n_y: int) -> (pygame.Surface, pygame.Surface):
+        '''Return the surface of the cells & the one of the window, reused while their size is the same'''
+        if self._surf is None or self._surf.get_size() != (n_x, n_y):
+            self._surf = pygame.Surface((n_x, n_y))
+            self._screen_surf = pygame.Surface((n_x * self.CELL, n_y * self.CELL))
+            self._screen_surf.set_colorkey(C.WHITE)
+
+        return self._surf, self._screen_surf
+
+    def get_counts(self, screen_pos: np.ndarray, charges: np.ndarray, n_x: int, n_y: int) -> (np.ndarray, np.ndarray):
+        '''
+        Return the number of particules & of negative particules of each of the `n_x` * `n_y` cells,
+        flattened by (x, y): the cell (i, j) at `i * n_y + j`, the particules outside are ignored
+        '''
+        # surfarray arrays are indexed by (x, y)
+        cells = np.floor(screen_pos / self.CELL).astype(np.int64)
+        inside = (cells[:, 0] >= 0) & (cells[:, 0] < n_x) & (cells[:, 1] >= 0) & (cells[:, 1] < n_y)
+        flat = cells[:, 0] * n_y + cells[:, 1]
+
+        negative = np.asarray(charges) < 0
+        total = np.bincount(flat[inside], minlength=n_x * n_y)
+        n_negative = np.bincount(flat[inside & negative], minlength=n_x * n_y)
+
+        return total, n_negative
+
+    def display(self, screen_pos: np.ndarray, charges: np.ndarray):
+        '''
+        `screen_pos`: positions of the particules on the screen (scaled)  
+        `charges`: charges of the particules
+        '''
+        width, height = Interface.screen.get_size()
+        n_x = -(-width // self.CELL)
+        n_y = -(-height // self.CELL)
+
+        total, n_negative = self.get_counts(screen_pos, charges, n_x, n_y)
+
+        # only the occupied cells are colored: at most one per particule
+        occupied = np.flatnonzero(total)
+        if len(occupied) == 0:
+            return
+
+        total = total[occupied]
+        ratio = n_negative[occupied] / total
+
+        colors = (1 - ratio)[:, None] * Consts.C_POSITIVE + ratio[:, None] * Consts.C_NEGATIVE
+
+        shade = self.MIN_SHADE + (1 - self.MIN_SHADE) * np.log1p(total) / np.log1p(total.max())
+        colors = 255 - (255 - colors) * shade[:, None]
+
+        pixels = np.full((n_x * n_y, 3), 255, dtype=np.uint8)
+        pixels[occupied] = colors
+        pixels = pixels.reshape(n_x, n_y, 3)
+
+        surf, screen_surf = self._get_surfaces(n_x, n_y)
+        pygame.surfarray.blit_array(surf, pixels)
+        pygame.transform.scale(surf, screen_surf.get_size(), screen_surf)
+
+        Interface.screen.blit(screen_surf, (0, 0))
+
+def get_field_array(fields) -> np.ndarray:
+    '''Return the magnetic fields as an array (n, 5): x, y, intensity, dispersion, is uniform'''
+    array = np.zeros((len(fields), 5))
+    for i, field in enumerate(fields):
+        array[i] = (*field.origin, field.intensity, field.dispersion, field.is_uniform)
+    return array
+
+class FieldLayer:
+    '''
+    Magnetic fields, rendered once in a cached surface, blitted as the background
+    of the particules.
+
+    The fields are shaded by their intensity (`Consts.C_FIELD_POSITIVE`,
+    `Consts.C_FIELD_NEGATIVE`), the intensity of the non uniform fields falls off
+    linearly up to their dispersion, the fields overlapping are summed.  
+    The layer is rendered by cells of `CELL` pixels, then scaled to the window.
+    It is only rendered again when the fields change (see `invalidate`, `set_fields`),
+    the window is resized or the camera moves.
+    '''
+    CELL = 4 # scaled pixels
+    MIN_SHADE = 0.3 # shade of the weakest intensity, 1: the color of the strongest
+
+    def __init__(self):
+        self._fields = None
+        self._surf = None
+        self._key = None
+
+    def is_valid(self) -> bool:
+        '''Return if the fields are set, see `set_fields`'''
+        return self._fields is not None
+
+    def invalidate(self):
+        '''The fields have changed: they need to be set again'''
+        self._fields = None
+        self._key = None
+
+    def set_fields(self, fields: np.ndarray):
+        '''
+        Set the fields to display, as an array (n, 5), see `get_field_array`,  
+        the layer is kept if they are the same
+        '''
+        if self._fields is not None and np.array_equal(self._fields, fields):
+            return
+
+        self._fields = np.array(fields, dtype=np.float64)
+        self._key = None
+
+    def display(self, camera):
+        '''Display the fields through the camera (see `Camera`)'''
+        if self._fields is None:
+            return
+
+        key = (tuple(camera.origin), camera.zoom, Interface.screen.get_size())
+        if key != self._key:
+            self._key = key
+            self._surf = self._render(camera)
+
+        if self._surf is not None:
+            Interface.screen.blit(self._surf, (0, 0))
+
+    def _render(self, camera) -> pygame.Surface:
+        if len(self._fields) == 0:
+            return None
+
+        width, height = Interface.screen.get_size()
+        n_x = -(-width // self.CELL)
+        n_y = -(-height // self.CELL)
+
+        # simulation positions of the centers of the cells
+        xs = camera.screen_to_world(np.column_stack([(np.arange(n_x) + 0.5) * self.CELL, np.zeros(n_x)]))[:, 0]
+        ys = camera.screen_to_world(np.column_stack([np.zeros(n_y), (np.arange(n_y) + 0.5) * self.CELL]))[:, 1]
+
+        intensities = np.zeros((n_x, n_y))
+
+        for x, y, intensity, dispersion, is_uniform in self._fields.tolist():
+            # only the cells of the bounding box of the field
+            x0, x1 = np.searchsorted(xs, [x - dispersion, x + dispersion])
+            y0, y1 = np.searchsorted(ys, [y - dispersion, y + dispersion])
+            if x0 == x1 or y0 == y1:
+                continue
+
+            dist = np.hypot(xs[x0:x1, None] - x, ys[None, y0:y1] - y)
+
+            if is_uniform:
+                coef = dist < dispersion
+            else:
+                coef = np.maximum(dispersion - dist, 0) / dispersion
+
+            intensities[x0:x1, y0:y1] += coef * intensity
+
+        # the shades don't depend on the camera
+        max_intensity = np.abs(self._fields[:, 2]).max()
+        if max_intensity == 0:
+            return None
+
+        # only the cells in a field are colored
+        covered = np.flatnonzero(intensities)
+        values = intensities.ravel()[covered]
+
+        shade = self.MIN_SHADE + (1 - self.MIN_SHADE) * np.minimum(np.abs(values) / max_intensity, 1)
+        colors = np.where(values[:, None] >= 0, Consts.C_FIELD_POSITIVE, Consts.C_FIELD_NEGATIVE)
+
+        pixels = np.full((n_x * n_y, 3), 255, dtype=np.uint8)
+        pixels[covered] = 255 - (255 - colors) * shade[:, None]
+
+        surf = pygame.Surface((n_x, n_y))
+        pygame.surfarray.blit_array(surf, pixels.reshape(n_x, n_y, 3))
+
+        # the surface of the window is reused while its size is the same
+        dim = (n_x * self.CELL, n_y * self.CELL)
+        if self._surf is None or self._surf.get_size() != dim:
+            self._surf = pygame.Surface(dim)
+            self._surf.set_colorkey(C.WHITE)
+
+        pygame.transform.scale(surf, dim, self._surf)
+        return self._surf
+
+class PotentialHeatmap:
+    '''
+    Electric potential of the particules, displayed as a colormapped overlay.
+
+    The potential is computed natively on a grid of a node every `CELL` pixels
+    over the window (see `potential_grid`), only every `period` seconds,
+    or when the camera moves: in between, the last rendered surface is blitted.  
+    The positive potentials are shaded to `Consts.C_POSITIVE`, the negative ones
+    to `Consts.C_NEGATIVE`, relatively to the 99th percentile of the absolute potential.
+    '''
+    CELL = 16 # scaled pixels
+    ALPHA = 110
+
+    def __init__(self, period: float=Consts.POTENTIAL_PERIOD):
+        self.period = period
+        self.visible = False
+        self._surf = None
+        self._key = None
+        self._last_time = None
+
+    def toggle(self):
+        '''Show/hide the heatmap'''
+        self.visible = not self.visible
+        self._key = None
+
+    def update(self, positions: np.ndarray, charges: np.ndarray, k: float, camera):
+        '''
+        Compute the potential again if `period` has elapsed or the camera has moved,  
+        `positions`, `charges`: all the particules, not only the visible ones
+        '''
+        key = (tuple(camera.origin), camera.zoom, Interface.screen.get_size())
+        now = time.perf_counter()
+
+        if key == self._key and now - self._last_time < self.period:
+            return
+
+        self._key = key
+        self._last_time = now
+        self._surf = self._render(positions, charges, k, camera)
+
+    def display(self):
+        if self._surf is not None:
+            Interface.screen.blit(self._surf, (0, 0))
+
+    def _render(self, positions, charges, k, camera) -> pygame.Surface:
+        if len(positions) == 0:
+            return None
+
+        width, height = Interface.screen.get_size()
+        n_x = -(-width // self.CELL)
+        n_y = -(-height // self.CELL)
+
+        # the nodes are at the centers of the cells
+        min_x, min_y = camera.screen_to_world((self.CELL / 2, self.CELL / 2))
+        max_x, max_y = camera.screen_to_world(((n_x - 0.5) * self.CELL, (n_y - 0.5) * self.CELL))
+
+        potential = potential_grid(positions, charges, k, min_x, max_x, min_y, max_y, n_x, n_y)
+
+        scale = np.percentile(np.abs(potential), 99)
+        if not scale > 0:
+            return None
+
+        # surfarray arrays are indexed by (x, y)
+        values = np.clip(potential.T / scale, -1, 1)
+        colors = np.where(values[..., None] >= 0, Consts.C_POSITIVE, Consts.C_NEGATIVE)
+        colors = 255 - (255 - colors) * np.abs(values)[..., None]
+
+        surf = pygame.Surface((n_x, n_y))
+        pygame.surfarray.blit_array(surf, colors.astype(np.uint8))
+
+        surf = pygame.transform.smoothscale(surf, (n_x * self.CELL, n_y * self.CELL))
+        surf.set_alpha(self.ALPHA)
+        return surf
+
 class FieldUI(Form):
 
     def __init__(self, field: MagneticField, dynamic=False):
@@ -0,0 +1,160 @@
+from lib.plougame import Interface, Dimension, Font, C
+from lib.plougame.spec import Specifications as Spec
+import numpy as np
+import pygame, time, os
+
+def get_memory() -> int:
+    '''Return the memory used by the process (resident set size), in bytes'''
+    try:
+        with open('/proc/self/statm') as file:
+            return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        pass
+
+    try:
+        import resource
+        # peak usage, in KB on linux, in bytes on macOS
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    except ImportError:
+        return 0
+
+class HUD:
+    '''
+    Head-up display, displayed over the simulation:  
+    fps, simulation steps per second, duration of the phases of the frame,  
+    memory usage and a rolling graph of the duration of the frames.
+
+    The graph is rendered from a ring buffer, as an array blitted on a surface,  
+    the text is only rendered every `TEXT_PERIOD` frames.  
+    The phases are read from `Interface.timeline`, enabled when the HUD is shown.
+    '''
+    PHASES = ('update', 'events', 'draw')
+    GRAPH_DIM = (240, 80)
+    TEXT_PERIOD = 15
+    FONT_SIZE = 25
+    C_BACKGROUND = (30, 30, 30)
+    C_BAR = (90, 200, 90)
+    C_OVER = (220, 80, 80)
+    C_BUDGET = (230, 230, 230)
+
+    def __init__(self, pos=(20, 220)):
+        self.pos = pos
+        self.visible = False
+        self._own_timeline = False
+
+        # ring buffer of the frame durations (ms)
+        width, height = self.GRAPH_DIM
+        self._frame_ms = np.zeros(width, dtype=np.float32)
+        self._idx = 0
+        self._graph_surf = pygame.Surface(self.GRAPH_DIM)
+        self._columns = self._get_columns()
+
+        self._n_frames = 0
+        self._last_sample = None # (time, step)
+        self._steps_per_s = 0
+        self._text_surfs = []
+
+    def toggle(self):
+        '''Show/hide the HUD'''
+        self.visible = not self.visible
+
+        if self.visible and Interface.timeline is None:
+            Interface.enable_timeline(capacity=256)
+            self._own_timeline = True
+
+        elif not self.visible and self._own_timeline:
+            Interface.disable_timeline()
+            self._own_timeline = False
+
+        self._last_sample = None
+        self._n_frames = 0
+
+    def update(self, step: int):
+        '''
+        Record the current frame, `step` is the step of the simulation
+        '''
+        # work time of the last frame, without waiting for the fps
+        self._frame_ms[self._idx] = Interface.clock.get_rawtime()
+        self._idx = (self._idx + 1) % len(self._frame_ms)
+
+        if self._n_frames % self.TEXT_PERIOD == 0:
+            self._update_steps_per_s(step)
+            self._render_text()
+
+        self._n_frames += 1
+
+    def _update_steps_per_s(self, step: int):
+        now = time.perf_counter()
+
+        if self._last_sample is not None:
+            last_time, last_step = self._last_sample
+            self._steps_per_s = (step - last_step) / max(now - last_time, 1e-9)
+
+        self._last_sample = (now, step)
+
+    def _render_text(self):
+        phases = {}
+        if Interface.timeline is not None:
+            phases = Interface.timeline.get_frame()
+
+        split = " | ".join(f"{name} {phases.get(name, 0):.1f}" for name in self.PHASES)
+
+        lines = [
+            f"FPS {Interface.clock.get_fps():.1f}",
+            f"steps/s {self._steps_per_s:.0f}",
+            f"ms {split}",
+            f"memory {get_memory() / 2**20:.0f} MB",
+        ]
+
+        font = Font.f(self.FONT_SIZE)['font']
+        self._text_surfs = [font.render(line, True, C.WHITE) for line in lines]
+
+    def _get_columns(self) -> np.ndarray:
+        '''
+        Return every possible column of the graph, indexed by
+        the height of the bar & if the frame is over budget
+        '''
+        height = self.GRAPH_DIM[1]
+        rows = np.arange(height)
+
+        columns = np.zeros((height + 1, 2, height, 3), dtype=np.uint8)
+        columns[:] = self.C_BACKGROUND
+
+        for bar in range(height + 1):
+            columns[bar, 0, rows >= height - bar] = self.C_BAR
+            columns[bar, 1, rows >= height - bar] = self.C_OVER
+
+        # frame budget, at half height
+        columns[:, :, height // 2] = self.C_BUDGET
+        return columns
+
+    def _render_graph(self):
+        '''Render the ring buffer as bars, the oldest frame on the left'''
+        height = self.GRAPH_DIM[1]
+        budget = 1000 / Spec.FPS
+
+        # full height: twice the frame budget
+        frame_ms = np.roll(self._frame_ms, -self._idx)
+        heights = (np.minimum(frame_ms / (2 * budget), 1) * height).astype(np.intp)
+        over = (frame_ms > budget).astype(np.intp)
+
+        pygame.surfarray.blit_array(self._graph_surf, self._columns[heights, over])
+
+    def display(self):
+        if not self.visible:
+            return
+
+        x, y = Dimension.scale(self.pos).astype(int)
+        text_height = sum(surf.get_height() for surf in self._text_surfs)
+
+        background = pygame.Rect(x, y, self.GRAPH_DIM[0] + 20, self.GRAPH_DIM[1] + text_height + 30)
+        Interface.screen.fill(self.C_BACKGROUND, background)
+
+        x += 10
+        y += 10
+        for surf in self._text_surfs:
+            Interface.screen.blit(surf, (x, y))
+            y += surf.get_height()
+
+        self._render_graph()
+        Interface.screen.blit(self._graph_surf, (x, y + 10))
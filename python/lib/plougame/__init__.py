@@ -33,6 +33,7 @@ from .components import Cadre, TextBox, Button, InputText, ScrollList
 from .auxiliary import Dimension, Font, C
 from .formatter import Formatter
 from .spec import Specifications
+from .timeline import Timeline
 
 from .page import Page, SubPage
 from .app import Application
\ No newline at end of file
@@ -97,6 +97,9 @@ class Button(Form):
         self._font = font
         self._logic = None
 
+        # last rendered text: (text, color, font, surface)
+        self._rendered_text = None
+
     def pushed(self, events):
         '''Return True if the object was clicked'''
         if self.on_it():
@@ -131,6 +134,18 @@ class Button(Form):
         '''
         self._logic = func
 
+    def get_render_key(self) -> tuple:
+        '''
+        Return a key of what the instance looks like, see `Form.get_render_key`.
+        '''
+        return super().get_render_key() + (
+            self._text,
+            tuple(self.text_color),
+            self._font['font'],
+            self._centered,
+            self._highlighted and self.on_it(),
+        )
+
     def run(self, events, pressed):
         '''
         React to the user input, execute the given logic function if given.
@@ -185,9 +200,15 @@ class Button(Form):
         if not self._centered:
             x_marge = self._rs_marge_text
         
-        # create font
-        font_text = self._font['font'].render(text, True, self.text_color)
+        # create font, only when the text, its color or the font have changed
+        key = (text, tuple(self.text_color), self._font['font'])
+
+        if self._rendered_text is None or self._rendered_text[:3] != key:
+            font_text = self._font['font'].render(text, True, self.text_color)
+            self._rendered_text = key + (font_text,)
         
+        font_text = self._rendered_text[3]
+
         # display font
         pos = np.array([pos[0] + x_marge, pos[1] + y_marge], dtype=int)
 
@@ -357,7 +378,7 @@ class TextBox(Form):
             self._text = text
             self._lines = text.split('\n')
 
-        # set rendered text cache : TODO
+        # rendered text cache: (color, font, surface) of each line
         self._rendered_text = []
         for line in self._lines:
             self._rendered_text.append( None )
@@ -389,6 +410,18 @@ class TextBox(Form):
 
         self.set_dim(dim)
 
+    def get_render_key(self) -> tuple:
+        '''
+        Return a key of what the instance looks like, see `Form.get_render_key`.
+        '''
+        return super().get_render_key() + (
+            tuple(self._lines),
+            tuple(self._text_color),
+            tuple(tuple(color) for color in self._text_colors),
+            self._font['font'],
+            self._centered,
+        )
+
     def _display_lines_text(self, surface=None, pos=None):
         '''
         Display the text, can be on multiple lines.  
@@ -419,7 +452,14 @@ class TextBox(Form):
             if not self._centered:
                 x_marge = self._rs_marge_text
         
-            font_text = self._font['font'].render(line, True, colors[i])
+            # render the line only when its color or the font have changed
+            rendered = self._rendered_text[i]
+
+            if rendered is None or rendered[0] != tuple(colors[i]) or rendered[1] is not self._font['font']:
+                rendered = (tuple(colors[i]), self._font['font'], self._font['font'].render(line, True, colors[i]))
+                self._rendered_text[i] = rendered
+
+            font_text = rendered[2]
         
             surface.blit(font_text, np.array([pos[0] + x_marge, pos[1] + i * y_line + y_marge], dtype=int))
 
@@ -651,6 +691,10 @@ class InputText(Button):
 
         return False
     
+    def get_render_key(self):
+        '''Displayed each frame: the text is typed & the cursor blinks'''
+        return None
+
     def display_text_cursor(self, surface=None, pos=None):
         '''
         Display the cursor at the correct location.  
@@ -1124,6 +1168,10 @@ class ScrollList(Form):
         # add dif_pos_on_it to cursor -> it has rel pos
         self._scroll_cursor._dif_pos_on_it = self._unsc_pos.copy()
 
+    def get_render_key(self):
+        '''Displayed each frame: the lines are scrolled & can change'''
+        return None
+
     def display(self, pos=None):
         '''
         Display the scroll list.
@@ -54,6 +54,7 @@ class Form:
     `compile`: Return a pygame.Surface object of the instance.  
     `get_mask`: Return a pygame.mask.Mask object of the instance.  
     `copy`: Return a copy of the instance.  
+    `get_render_key`: Return a key that changes when the instance looks different.  
     '''
     screen = None
     _interface = None
@@ -359,6 +360,22 @@ class Form:
         if to_set_corners:
             self._set_corners()
 
+    def get_render_key(self) -> tuple:
+        '''
+        Return a key of what the instance looks like: the key changes when
+        the instance would be displayed differently (see `Page.set_layer`).  
+        The modifications of the surface in place aren't detected (use `set_surf`),
+        None: the instance must be displayed each frame.
+        '''
+        return (
+            self._surf['main'],
+            self._color,
+            self.marge_color,
+            self._rs_marge_width,
+            tuple(self._sc_pos),
+            tuple(self._sc_dim),
+        )
+
     def display(self, *, surface=None, pos=None, marge=False):
         '''
         Display the Form
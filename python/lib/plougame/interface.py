@@ -3,6 +3,8 @@ from pygame.locals import *
 from .form import Form
 from .auxiliary import Dimension, Font, C
 from .spec import Specifications as Spec
+from .timeline import Timeline
+from contextlib import nullcontext
 import time
 
 class Interface:
@@ -19,6 +21,9 @@ class Interface:
     ---
     `setup`: Initialize the module, create the window  
     `run`: Update the screen, get the inputs for current frame, check for quit events...  
+    `enable_timeline`: Record the duration of the phases of each frame  
+    `phase`: Context manager, record a phase of the frame when the timeline is enabled  
+    `export_timeline`: Write the timeline in a Chrome trace-event JSON file  
     '''
     clock = pygame.time.Clock()
     running = True
@@ -30,6 +35,9 @@ class Interface:
     stats_display = 0
     stats_ndisplay = 0
 
+    timeline = None # Timeline, when enabled
+    _no_phase = nullcontext()
+
     @classmethod
     def setup(cls, dim: (int, int), title: str, *, fullscreen=False,
             background_color=C.WHITE, flags=None, static=False):
@@ -124,6 +132,40 @@ class Interface:
         '''Set the current frame to be displayed'''
         cls._is_active_current_frame = True
 
+    @classmethod
+    def enable_timeline(cls, capacity=4096):
+        '''
+        Record the duration of the phases of each frame (see `Timeline`),  
+        only the last `capacity` phases are kept.  
+        The phases of `run` are recorded: `tick` (waiting for the fps), `inputs` and `display`,  
+        other phases can be added using `phase`.
+        '''
+        cls.timeline = Timeline(capacity)
+
+    @classmethod
+    def disable_timeline(cls):
+        '''Stop recording the timeline, discard it'''
+        cls.timeline = None
+
+    @classmethod
+    def phase(cls, name: str):
+        '''
+        Return a context manager recording the duration of the phase `name`
+        of the current frame, if the timeline is enabled.
+        
+        Example: `with Interface.phase('update'): ...`
+        '''
+        if cls.timeline is None:
+            return cls._no_phase
+        return cls.timeline.phase(name)
+
+    @classmethod
+    def export_timeline(cls, path: str):
+        '''Write the timeline in a Chrome trace-event JSON file'''
+        if cls.timeline is None:
+            raise RuntimeError("The timeline isn't enabled")
+        cls.timeline.export(path)
+
     @classmethod
     def run(cls, fill=True):
         '''
@@ -142,16 +184,22 @@ class Interface:
         Value to give to methods with argument: `events`, 
         obtained with `pygame.event.get`.
         '''
-        cls.clock.tick(Spec.FPS)
+        if cls.timeline is not None:
+            cls.timeline.new_frame()
+
+        with cls.phase('tick'):
+            cls.clock.tick(Spec.FPS)
 
-        pressed = pygame.key.get_pressed()
-        events = pygame.event.get()
+        with cls.phase('inputs'):
+            pressed = pygame.key.get_pressed()
+            events = pygame.event.get()
 
-        is_resize = cls._react_basic_inputs(pressed, events)
+            is_resize = cls._react_basic_inputs(pressed, events)
 
         if not cls._is_static:
             # dynamic interface
-            cls._display(fill=fill, update=(not is_resize))
+            with cls.phase('display'):
+                cls._display(fill=fill, update=(not is_resize))
 
             return pressed, events
         
@@ -162,7 +210,8 @@ class Interface:
             cls._is_active_current_frame = False
             cls.stats_display += 1
 
-            cls._display(fill=fill, update=(not is_resize))
+            with cls.phase('display'):
+                cls._display(fill=fill, update=(not is_resize))
             
         else:
             cls.stats_ndisplay += 1
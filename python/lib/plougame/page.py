@@ -4,6 +4,7 @@ from .components import TextBox, Button, InputText, ScrollList, Cadre
 from .interface import Interface
 from .formatter import Formatter
 from typing import List, Set, Dict, Tuple, Union
+import pygame
 
 
 class Page:
@@ -44,11 +45,16 @@ class Page:
     `set_out_state_func`: Set a function to be executed when getting out of the state  
     `change_page`: Set a call for an Application object to change the current page  
     `change_display_state`: Set if a component is displayed, independently of the active state  
+    `set_layer`: Set if components are displayed on the static (cached) or the dynamic layer  
     `display`: Display the instance.  
     '''
 
     formatter = Formatter()
 
+    LAYERS = ('static', 'dynamic')
+    # color of the transparent pixels of the static layer
+    KEY_COLOR = (3, 1, 2)
+
     def __init__(self, states: List[str], components: List[Tuple], active_states='none'):
         
         self._states = list(states)
@@ -69,6 +75,11 @@ class Page:
         self._inputs = {}
         self._scrolls = {}
 
+        # cached surfaces of the static components: one per group of overlapping components,
+        # {ids of the group: (render keys, surface, position)}
+        self._static_layers = {}
+        self._static_key = None
+
         if active_states == 'none':
             active_states = []
         elif active_states == 'all':
@@ -233,7 +244,8 @@ class Page:
         comp_info = {
             'object': obj,
             'active states': active_states,
-            'displayed': False
+            'displayed': False,
+            'layer': 'dynamic'
         }
         
         self._components[name] = comp_info
@@ -330,6 +342,39 @@ class Page:
 
         comp_info['displayed'] = is_displayed
 
+    def set_layer(self, names, layer):
+        '''
+        Set the layer on which the component(s) are displayed.  
+        The components of the static layer are composited once on cached surfaces
+        (one per group of overlapping components), displayed below the dynamic components:
+        a group is composited again only when one of its components changes
+        (text, color, highlight, ... see `Form.get_render_key`).  
+        By default, the components are on the dynamic layer: displayed each frame.
+
+        Arguments:
+        - names: str / list
+            The name(s) of the component(s)
+        - layer: str
+            Either `"static"` or `"dynamic"`
+        '''
+        if not layer in self.LAYERS:
+            raise ValueError(f"Invalid layer: '{layer}', must be one of {self.LAYERS}.")
+
+        if type(names) != list:
+            names = [names]
+
+        for name in names:
+            self._check_valid_name(name)
+            comp_info = self._components[name]
+
+            if layer == 'static' and (isinstance(comp_info['object'], SubPage) 
+                    or comp_info['object'].get_render_key() is None):
+                raise ValueError(f"The component '{name}' must be displayed on the dynamic layer.")
+
+            comp_info['layer'] = layer
+
+        self._static_key = None
+
     def get_text(self, name) -> str:
         '''
         Return the text of an InputText component.
@@ -385,13 +430,121 @@ class Page:
     def display(self):
         '''
         Display all components in the active state.  
-        Display all components that were manualy set to be displayed.
+        Display all components that were manualy set to be displayed.  
+        The static layer is displayed first, then the dynamic components.
         '''
-        for comp_info in self._components.values():
+        comps = self._get_active_comps()
 
-            if self._active_state in comp_info['active states'] or comp_info['displayed']:
+        statics = [info for info in comps if info['layer'] == 'static']
+
+        if statics:
+            self._display_static_layer(statics)
+
+        for comp_info in comps:
+            if comp_info['layer'] == 'dynamic':
                 comp_info['object'].display()
 
+    def _display_static_layer(self, statics):
+        '''
+        Display the static components, from the cached surfaces,
+        composite again the groups of components where one of them has changed.
+        '''
+        # in case of static interface, check if the surface need to be displayed
+        if Interface.is_static() and not Interface.is_frame_displayed():
+            return
+
+        screen = Interface.screen
+        key = self._get_static_key(statics)
+
+        if key != self._static_key:
+            layers = {}
+
+            for group in self._get_static_groups(statics):
+                ids = tuple(id(info) for info in group)
+                keys = tuple(info['object'].get_render_key() for info in group)
+
+                if ids in self._static_layers and self._static_layers[ids][0] == keys:
+                    layers[ids] = self._static_layers[ids]
+                else:
+                    layers[ids] = self._composite_static_group(group)
+
+            self._static_layers = layers
+            
+            # the components can change when displayed (highlight): get the key again
+            self._static_key = self._get_static_key(statics)
+
+        for keys, surface, pos in self._static_layers.values():
+            screen.blit(surface, pos)
+
+    def _get_static_key(self, statics):
+        '''
+        Return the key of what the static components look like.
+        '''
+        return (Interface.screen.get_size(),) + tuple(
+            (id(info), info['object'].get_render_key()) for info in statics
+        )
+
+    def _get_static_groups(self, statics):
+        '''
+        Return the static components grouped by overlapping rectangles (marges included),
+        in the order of display.
+        '''
+        rects = [self._get_static_rect(info['object']) for info in statics]
+
+        # union find over the overlapping rectangles
+        parents = list(range(len(statics)))
+
+        def find(i):
+            while parents[i] != i:
+                parents[i] = parents[parents[i]]
+                i = parents[i]
+            return i
+
+        for i in range(len(rects)):
+            for j in rects[i].collidelistall(rects[i+1:]):
+                parents[find(i + 1 + j)] = find(i)
+
+        groups = {}
+        for i, info in enumerate(statics):
+            groups.setdefault(find(i), []).append(info)
+
+        return list(groups.values())
+
+    def _get_static_rect(self, obj) -> pygame.Rect:
+        '''
+        Return the rectangle covered by a component, marges included.
+        '''
+        marge = obj._rs_marge_width
+        pos = obj.get_pos(scaled=True) - marge
+        dim = obj.get_dim(scaled=True) + 2 * marge
+        return pygame.Rect(int(pos[0]), int(pos[1]), int(dim[0]) + 1, int(dim[1]) + 1)
+
+    def _composite_static_group(self, group):
+        '''
+        Display a group of static components on a new surface, 
+        return their render keys, the surface & its position.
+        '''
+        rect = self._get_static_rect(group[0]['object']).unionall(
+            [self._get_static_rect(info['object']) for info in group[1:]]
+        )
+
+        # a new surface: the blending on a run-length encoded surface
+        # differs slightly from the blending on the screen
+        surface = pygame.Surface(rect.size, 0, Interface.screen)
+        surface.fill(self.KEY_COLOR)
+
+        for info in group:
+            obj = info['object']
+            pos = obj.get_pos(scaled=True).astype(int) - rect.topleft
+            obj.display(surface=surface, pos=pos)
+
+        # encoded on the first blit: the transparent pixels are skipped
+        surface.set_colorkey(self.KEY_COLOR, pygame.RLEACCEL)
+
+        keys = tuple(info['object'].get_render_key() for info in group)
+
+        return keys, surface, rect.topleft
+
     def _on_change_page(self):
         '''
         Executed when this page become the active page.
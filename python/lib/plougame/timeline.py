@@ -0,0 +1,128 @@
+import json
+import time
+import numpy as np
+from contextlib import contextmanager
+
+class Timeline:
+    '''
+    Record the duration of the phases of each frame in a ring buffer,  
+    only the last `capacity` phases are kept.
+
+    Can be exported in the Chrome trace-event format (`export`),  
+    to be viewed in a trace viewer (chrome://tracing, Perfetto...).
+
+    Methods
+    ---
+    `new_frame`: Start a new frame  
+    `phase`: Context manager, record the duration of a phase  
+    `add`: Record a phase, given its start/end times  
+    `get_events`: Return the recorded phases, in chronological order  
+    `get_frame`: Return the duration of each phase of a frame  
+    `export`: Write the recorded phases in a JSON file
+    '''
+    DTYPE = np.dtype([
+        ('frame', 'i8'),
+        ('phase', 'i4'),
+        ('start', 'i8'), # ns
+        ('end', 'i8'), # ns
+    ])
+
+    def __init__(self, capacity=4096):
+        self.capacity = capacity
+        self.frame = 0
+        self._events = np.zeros(capacity, dtype=self.DTYPE)
+        self._n_events = 0 # total number of recorded phases
+        self._phases = {} # name: id
+        self._names = [] # id: name
+
+    def new_frame(self):
+        '''Start a new frame'''
+        self.frame += 1
+
+    def _get_phase_id(self, name: str) -> int:
+        phase_id = self._phases.get(name)
+        if phase_id is None:
+            phase_id = len(self._names)
+            self._phases[name] = phase_id
+            self._names.append(name)
+        return phase_id
+
+    def add(self, name: str, start: int, end: int):
+        '''
+        Record a phase of the current frame,
+        `start` and `end` in ns, from `time.perf_counter_ns`
+        '''
+        self._events[self._n_events % self.capacity] = (
+            self.frame, self._get_phase_id(name), start, end
+        )
+        self._n_events += 1
+
+    @contextmanager
+    def phase(self, name: str):
+        '''Record the duration of the code executed in the context'''
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.add(name, start, time.perf_counter_ns())
+
+    def __len__(self):
+        return min(self._n_events, self.capacity)
+
+    def get_events(self) -> np.ndarray:
+        '''Return the recorded phases, in chronological order'''
+        if self._n_events <= self.capacity:
+            return self._events[:self._n_events].copy()
+
+        idx = self._n_events % self.capacity
+        return np.concatenate([self._events[idx:], self._events[:idx]])
+
+    def get_frame(self, frame=None) -> dict:
+        '''
+        Return the duration (ms) of each phase of `frame`,  
+        by default, of the previous frame (the last complete one)
+        '''
+        if frame is None:
+            frame = self.frame - 1
+
+        n = len(self)
+        events = self._events[:n]
+        events = events[events['frame'] == frame]
+
+        durations = {}
+        for phase, start, end in zip(events['phase'].tolist(), events['start'].tolist(), events['end'].tolist()):
+            name = self._names[phase]
+            durations[name] = durations.get(name, 0) + (end - start) / 1e6
+
+        return durations
+
+    def get_phase_names(self) -> list:
+        '''Return the names of the phases, indexed by the `phase` field of the events'''
+        return list(self._names)
+
+    def clear(self):
+        self._n_events = 0
+
+    def to_trace_events(self) -> dict:
+        '''Return the recorded phases in the Chrome trace-event format'''
+        events = self.get_events()
+        trace_events = []
+
+        for frame, phase, start, end in events.tolist():
+            trace_events.append({
+                'name': self._names[phase],
+                'cat': 'frame',
+                'ph': 'X',
+                'ts': start / 1000, # us
+                'dur': (end - start) / 1000,
+                'pid': 0,
+                'tid': 0,
+                'args': {'frame': frame},
+            })
+
+        return {'traceEvents': trace_events, 'displayTimeUnit': 'ms'}
+
+    def export(self, path: str):
+        '''Write the recorded phases in a Chrome trace-event JSON file'''
+        with open(path, 'w') as file:
+            json.dump(self.to_trace_events(), file)
@@ -2,15 +2,35 @@
 Physical simulation
 ======
 Written in C++
+
+The engine is compiled in three precisions:
+`System32`: float32 storage & accumulation (`System` is an alias)  
+`SystemMixed`: float32 storage, float64 force accumulation  
+`System64`: float64 storage & accumulation
 '''
-from typing import List, Optional
+from typing import List, Optional, Dict, Tuple
+import os
+import numpy as np
 
 from ._simulation import (
-    Particule as _Particule,
-    MagneticField as _MagneticField,
-    System as _System,
-    Constants as _Constants
+    Particule32 as _Particule32,
+    Particule64 as _Particule64,
+    MagneticField32 as _MagneticField32,
+    MagneticField64 as _MagneticField64,
+    System32 as _System32,
+    SystemMixed as _SystemMixed,
+    System64 as _System64,
+    Ensemble32 as _Ensemble32,
+    EnsembleMixed as _EnsembleMixed,
+    Ensemble64 as _Ensemble64,
+    SpatialIndex32 as _SpatialIndex32,
+    SpatialIndex64 as _SpatialIndex64,
+    potential_grid as _potential_grid,
+    Constants as _Constants,
+    ENGINE_VERSION
 )
+from .cache import ResultCache, system_entry
+from .trajectory import CODECS
 
 class Constants(_Constants):
     '''
@@ -24,9 +44,14 @@ class Constants(_Constants):
     k: float
     e: float
 
-class Particule(_Particule):
+class _ParticuleMixin:
+
+    def __init__(self, pos: List[float], q: float, m: float):
+        super().__init__(pos[0], pos[1], q, m)
+
+class Particule(_ParticuleMixin, _Particule32):
     '''
-    Particule object
+    Particule object (float32)
     ===
     Arguments
     ---
@@ -36,38 +61,62 @@ class Particule(_Particule):
     Attributes
     ---
     `'pos'`,`'q'`,`'m'` : see above  
-    `'a' list`: acceleration  
+    `'a' list`: acceleration applied during the last update,
+    overwritten by the next one (a value set isn't applied, set `v` instead)  
     `'v' list`: speed  
+    `'id' int`: id given by the system, -1 outside of a system  
     '''
     pos: List[float]
     v: List[float]
     a: List[float]
     q: float
     m: float
+    id: int
 
-    def __init__(self, pos: List[float], q: float, m: float):
-        super().__init__(pos[0], pos[1], q, m)
+class Particule64(_ParticuleMixin, _Particule64):
+    '''
+    Particule object (float64), see `Particule`
+    '''
+    pos: List[float]
+    v: List[float]
+    a: List[float]
+    q: float
+    m: float
+    id: int
+
+Particule32 = Particule
+
+class _MagneticFieldMixin:
+
+    def __init__(self, x: float, y: float, intensity: float, dispersion: float=None):
+        dispersion = -1 if dispersion is None else dispersion
+        super().__init__(x, y, intensity, dispersion)
 
-class MagneticField(_MagneticField):
+class MagneticField(_MagneticFieldMixin, _MagneticField32):
     '''
-    Magnetic field
+    Magnetic field (float32)
     ===
     Arguments
     ---
     `'x', 'y' float`: Origin of the field  
     `'intensity' float`: Inensity of the field  
-    `'dispersion' float`: Dispersion -> how much the field expand
+    `'dispersion' float`: Dispersion -> how much the field expand  
     '''
     origin: List[float]
     intensity: float
     dispersion: float
 
-    def __init__(self, x: float, y: float, intensity: float, dispersion: float=None):
-        dispersion = -1 if dispersion is None else dispersion
-        super().__init__(x, y, intensity, dispersion)
+class MagneticField64(_MagneticFieldMixin, _MagneticField64):
+    '''
+    Magnetic field (float64), see `MagneticField`
+    '''
+    origin: List[float]
+    intensity: float
+    dispersion: float
 
+MagneticField32 = MagneticField
 
-class System(_System):
+class _SystemMixin:
     '''
     Physical system
     ===
@@ -75,11 +124,20 @@ class System(_System):
     ---
     `'particules' list[Particule]`: the particules  
     `'dt' float`: time delta used to update the simulation state  
+    `'flag' int`: merging flag, `FLAG_SUM` or `FLAG_SUM_ONESIDE`  
     '''
     particules: List[Particule]
     magnetic_fields: List[MagneticField]
     constants: Constants
     n_particules: int
+    dtype: str
+    accumulator_dtype: str
+    dt: float
+    flag: int
+    step: int
+    time: float
+    is_recording: bool
+    limits: Optional[Tuple[float, float, float, float]]
     FLAG_SUM: int = 0
     FLAG_SUM_ONESIDE: int = 1
 
@@ -87,7 +145,7 @@ class System(_System):
         dt = -1 if dt is None else dt
         flag = 0 if flag is None else flag
         super().__init__(particules, dt, flag)
-    
+
     def update(self, dt: Optional[float]=None):
         '''
         Update the simulation state  
@@ -97,7 +155,62 @@ class System(_System):
         '''
         dt = -1 if dt is None else dt
         super().update(dt)
-    
+
+    def run(self, n_steps: int, dt: Optional[float]=None, cache: Optional['ResultCache']=None):
+        '''
+        Update the simulation state `n_steps` times in a native loop  
+        Arguments
+        ---
+        `'n_steps' int`: number of updates  
+        `'dt' float`: time delta used to update the simulation state  
+        `'cache' ResultCache`: if given, restore the final state from the cache
+        when the same run has already been done, else store it.
+        Not used while recording: every step must be written (& counted in `stats`)  
+        '''
+        if self.is_recording:
+            cache = None
+
+        if cache is not None:
+            key = cache.system_key(self, n_steps, dt)
+            entry = cache.get(key)
+
+            if entry is not None:
+                self.set_particules(
+                    entry['pos'], entry['q'], entry['m'], entry['v'], entry['a'], entry['ids']
+                )
+                self.step = int(entry['step'])
+                self.time = float(entry['time'])
+                return
+
+        super().run(n_steps, -1 if dt is None else dt)
+
+        if cache is not None:
+            cache.put(key, system_entry(self))
+
+    def summary(self) -> Dict:
+        '''
+        Return a summary of the system: `n_particules`, total `charge`,
+        total `mass`, `kinetic_energy` and `momentum`
+        '''
+        return super().summary()
+
+    def stats(self) -> Dict:
+        '''
+        Return the profiling counters accumulated since the last `reset_stats`:  
+        `steps`, `pair_interactions` & `field_interactions` evaluated,  
+        `merges` (pairs of nearby particules), `removals` (out of the limits),  
+        `index_builds` (spatial index built by a query, see `query_rect`),  
+        time spent per phase, in nanoseconds: `pairs_ns`, `fields_ns`,  
+        `integration_ns` (limits culling & integration) and `record_ns`
+        '''
+        return super().stats()
+
+    def reset_stats(self):
+        '''
+        Reset the profiling counters to zero
+        '''
+        super().reset_stats()
+
     def clear_elements(self):
         '''
         Clear all elements from the system (particules & magnetic fields).  
@@ -116,9 +229,285 @@ class System(_System):
         Add a magnetic field to the system
         '''
         super().add_magnetic_field(field)
-    
+
+    def add_particules(self, pos: np.ndarray, q: np.ndarray, m: np.ndarray,
+            v: Optional[np.ndarray]=None, a: Optional[np.ndarray]=None,
+            ids: Optional[np.ndarray]=None):
+        '''
+        Add particules to the system from arrays  
+        Arguments
+        ---
+        `'pos' array (n, 2)`: positions of the particules  
+        `'q' array (n,)`: charges of the particules  
+        `'m' array (n,)`: masses of the particules  
+        `'v' array (n, 2)`: speeds of the particules, by default 0  
+        `'a' array (n, 2)`: accelerations of the last update (see `accelerations`), by default 0,  
+        overwritten by the next update: they aren't applied, set `v` instead  
+        `'ids' array (n,)`: ids of the particules, by default new ids  
+        '''
+        super().add_particules(pos, q, m, v, a, ids)
+
+    def set_particules(self, pos: np.ndarray, q: np.ndarray, m: np.ndarray,
+            v: Optional[np.ndarray]=None, a: Optional[np.ndarray]=None,
+            ids: Optional[np.ndarray]=None):
+        '''
+        Replace the particules of the system by the ones of the arrays,
+        see `add_particules`
+        '''
+        super().set_particules(pos, q, m, v, a, ids)
+
+    def positions(self) -> np.ndarray:
+        '''Return the positions of the particules, array (n, 2)'''
+        return super().positions()
+
+    def velocities(self) -> np.ndarray:
+        '''Return the speeds of the particules, array (n, 2)'''
+        return super().velocities()
+
+    def accelerations(self) -> np.ndarray:
+        '''Return the accelerations of the particules, array (n, 2)'''
+        return super().accelerations()
+
+    def charges(self) -> np.ndarray:
+        '''Return the charges of the particules, array (n,)'''
+        return super().charges()
+
+    def masses(self) -> np.ndarray:
+        '''Return the masses of the particules, array (n,)'''
+        return super().masses()
+
+    def ids(self) -> np.ndarray:
+        '''
+        Return the ids of the particules, array (n,)  
+        Ids are persistent, merged particules get a new id.
+        '''
+        return super().ids()
+
+    def query_rect(self, min_x: float, max_x: float, min_y: float, max_y: float,
+            ids: bool=False) -> np.ndarray:
+        '''
+        Return the indices of the particules inside the rectangle (bounds included),
+        in increasing order, or their ids if `ids`  
+        The queries use a native grid index, rebuilt in O(n) at the first query
+        after the particules have changed (step, addition...).
+        Once `particules` has been accessed (modifiable references), every query
+        compares their positions to the index until the next update (O(n), no rebuild
+        unless one has moved): prefer the arrays (`positions`...).
+        '''
+        return super().query_rect(min_x, max_x, min_y, max_y, ids)
+
+    def query_radius(self, x: float, y: float, r: float, ids: bool=False) -> np.ndarray:
+        '''
+        Return the indices of the particules within a distance `r` of (x, y),
+        in increasing order, or their ids if `ids`, see `query_rect`
+        '''
+        return super().query_radius(x, y, r, ids)
+
+    def nearest(self, x: float, y: float, k: int=1, ids: bool=False) -> Tuple[np.ndarray, np.ndarray]:
+        '''
+        Return the indices (or ids if `ids`) of the `k` nearest particules of (x, y)
+        & their distances, by increasing distance, see `query_rect`
+        '''
+        return super().nearest(x, y, k, ids)
+
+    def potential_grid(self, min_x: float, max_x: float, min_y: float, max_y: float,
+            nx: int, ny: int, softening: float=-1) -> np.ndarray:
+        '''
+        Return the electric potential of the particules on a grid of `nx` * `ny` nodes,
+        from (min_x, min_y) to (max_x, max_y) included, as a (ny, nx) array,
+        see `potential_grid`
+        '''
+        return super().potential_grid(min_x, max_x, min_y, max_y, nx, ny, softening)
+
     def set_limits(self, min_x: float, max_x: float, min_y: float, max_y: float):
         '''
         Set the limits of the simulation
         '''
-        super().set_limits(min_x, max_x, min_y, max_y)
\ No newline at end of file
+        super().set_limits(min_x, max_x, min_y, max_y)
+
+    def save(self, path: str):
+        '''
+        Save the state of the system (particules, fields, constants & settings)
+        in a binary checkpoint file
+        '''
+        super().save(os.fspath(path))
+
+    def record(self, path: str, every: int=1, chunk_frames: int=64,
+            codec: str='raw', bits: int=16):
+        '''
+        Record the trajectory of the system in a file (see `TrajectoryReader`),
+        natively, as the system is updated.  
+        Arguments
+        ---
+        `'path' str`: the trajectory file, overwritten  
+        `'every' int`: a frame is recorded every `every` steps  
+        `'chunk_frames' int`: number of frames written to the disk at once  
+        `'codec' str`: one of `CODECS`, `'quantized'` requires the limits of the system  
+        `'bits' int`: quantization bits of the positions (`'quantized'` codec),  
+        the maximal error is (max - min) / (2^bits - 1) / 2 per axis
+        '''
+        if codec not in CODECS:
+            raise ValueError(f"Unknown codec: {codec}")
+        super().record(os.fspath(path), every, chunk_frames, CODECS[codec], bits)
+
+    def stop_recording(self):
+        '''
+        Stop recording the trajectory, write the remaining frames
+        '''
+        super().stop_recording()
+
+    @classmethod
+    def load(cls, path: str) -> 'System':
+        '''
+        Create a system from a checkpoint file (see `save`),
+        the checkpoint can be of any precision
+        '''
+        system = cls([])
+        super(_SystemMixin, system).load(os.fspath(path))
+        return system
+
+class System(_SystemMixin, _System32):
+    __doc__ = _SystemMixin.__doc__ + '''
+    Precision: float32 storage & accumulation
+    '''
+
+class SystemMixed(_SystemMixin, _SystemMixed):
+    __doc__ = _SystemMixin.__doc__ + '''
+    Precision: float32 storage, float64 force accumulation
+    '''
+
+class System64(_SystemMixin, _System64):
+    __doc__ = _SystemMixin.__doc__ + '''
+    Precision: float64 storage & accumulation
+    '''
+
+System32 = System
+
+
+class _EnsembleMixin:
+    '''
+    Ensemble of independent systems
+    ===
+    The systems are copied into the ensemble (stored contiguously)
+    and stepped together on a pool of threads.  
+    Indexing returns a copy of a system: changing it doesn't change the ensemble.
+    '''
+    n_systems: int
+    dtype: str
+    accumulator_dtype: str
+
+    def add_system(self, system: System):
+        '''
+        Add a copy of the system to the ensemble
+        '''
+        super().add_system(system)
+
+    def __getitem__(self, idx: int) -> System:
+        '''
+        Return a copy of the system at `idx`
+        '''
+        system = self._system_type([])
+        super().copy_system(idx, system)
+        return system
+
+    def run(self, n_steps: int, n_threads: Optional[int]=None, dt: Optional[float]=None) -> Dict[str, np.ndarray]:
+        '''
+        Update every system `n_steps` times  
+        Arguments
+        ---
+        `'n_steps' int`: number of updates  
+        `'n_threads' int`: number of threads, by default: number of cores  
+        `'dt' float`: time delta, by default: the dt of each system  
+        Return
+        ---
+        The summaries of the systems, as arrays (see `System.summary`)
+        '''
+        n_threads = 0 if n_threads is None else n_threads
+        dt = -1 if dt is None else dt
+        return super().run(n_steps, n_threads, dt)
+
+    def summaries(self) -> Dict[str, np.ndarray]:
+        '''
+        Return the summaries of the systems, as arrays (see `System.summary`)
+        '''
+        return super().summaries()
+
+class Ensemble(_EnsembleMixin, _Ensemble32):
+    __doc__ = _EnsembleMixin.__doc__
+    _system_type = System
+
+class EnsembleMixed(_EnsembleMixin, _EnsembleMixed):
+    __doc__ = _EnsembleMixin.__doc__
+    _system_type = SystemMixed
+
+class Ensemble64(_EnsembleMixin, _Ensemble64):
+    __doc__ = _EnsembleMixin.__doc__
+    _system_type = System64
+
+Ensemble32 = Ensemble
+
+
+class _SpatialIndexMixin:
+    '''
+    Spatial index of points
+    ===
+    Native uniform grid over an array of positions (see `System.query_rect`),
+    for repeated queries over points that aren't the particules of a system,
+    such as their positions on the screen.  
+    The index doesn't follow changes of the array: build a new one.
+    Arguments
+    ---
+    `'pos' array (n, 2)`: positions of the points  
+    '''
+    dtype: str
+
+    def query_rect(self, min_x: float, max_x: float, min_y: float, max_y: float) -> np.ndarray:
+        '''
+        Return the indices of the points inside the rectangle (bounds included),
+        in increasing order
+        '''
+        return super().query_rect(min_x, max_x, min_y, max_y)
+
+    def query_radius(self, x: float, y: float, r: float) -> np.ndarray:
+        '''
+        Return the indices of the points within a distance `r` of (x, y),
+        in increasing order
+        '''
+        return super().query_radius(x, y, r)
+
+    def nearest(self, x: float, y: float, k: int=1) -> Tuple[np.ndarray, np.ndarray]:
+        '''
+        Return the indices of the `k` nearest points of (x, y) & their distances,
+        by increasing distance
+        '''
+        return super().nearest(x, y, k)
+
+class SpatialIndex(_SpatialIndexMixin, _SpatialIndex32):
+    __doc__ = _SpatialIndexMixin.__doc__ + '''
+    Precision: float32
+    '''
+
+class SpatialIndex64(_SpatialIndexMixin, _SpatialIndex64):
+    __doc__ = _SpatialIndexMixin.__doc__ + '''
+    Precision: float64
+    '''
+
+SpatialIndex32 = SpatialIndex
+
+def potential_grid(pos: np.ndarray, q: np.ndarray, k: float, min_x: float, max_x: float,
+        min_y: float, max_y: float, nx: int, ny: int, softening: float=-1) -> np.ndarray:
+    '''
+    Return the electric potential `k * q / r` of charges on a grid of `nx` * `ny` nodes,
+    from (min_x, min_y) to (max_x, max_y) included, as a (ny, nx) array  
+    Computed natively by particle-mesh: the charges are deposited on a mesh
+    (cloud in cell) covering the grid & the charges, convolved with the kernel
+    by FFT, in O(n + M log M), M the size of the mesh (at most 512 nodes per axis).  
+    Arguments
+    ---
+    `'pos' array (n, 2)`: positions of the charges  
+    `'q' array (n,)`: charges  
+    `'k' float`: Coulomb constant, see `Constants`  
+    `'softening' float`: added to the distances, `sqrt(r^2 + softening^2)`,
+    -1: the spacing of the mesh  
+    '''
+    return _potential_grid(pos, q, k, min_x, max_x, min_y, max_y, nx, ny, softening)
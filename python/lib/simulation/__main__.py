@@ -0,0 +1,247 @@
+'''
+Headless simulation
+======
+Run a simulation without any display, from the `python` directory:
+
+    python -m lib.simulation scenario.json --steps 1000 --record run.traj
+    python -m lib.simulation --random 500 --fields 2 --seed 1 --steps 1000
+    python -m lib.simulation scenario.json --serve sim --speed 1
+    python -m lib.simulation scenario.json --stream 127.0.0.1:5000 --delta
+
+The scenario is either a JSON file (see `Scenario.save`), a checkpoint
+(see `System.save`) or randomly generated (see `Scenario.random`).
+The steps are run natively, by blocks of `--observe-every` steps, the
+observables of the system are sampled between the blocks.
+
+With `--serve`, the frames are written in a shared memory ring buffer
+(see `shared`) instead, until interrupted, for viewers to attach to it.
+With `--stream`, they are sent to the clients of a socket (see `stream`).
+'''
+from typing import Dict, List, Optional
+import argparse, asyncio, sys, time
+import numpy as np
+
+from . import ENGINE_VERSION
+from .scenario import Scenario, CHARGE_DISTRIBUTIONS
+from .sweep import PRECISIONS
+from .trajectory import CODECS
+from .shared import SharedFrameBuffer, serve
+from .stream import StreamServer
+
+CHECKPOINT_EXTENSIONS = ('.ckpt', '.chk', '.bin')
+
+def parse_args(args: Optional[List[str]]=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog='python -m lib.simulation',
+        description="Run a particules simulation headlessly.",
+    )
+    parser.add_argument('scenario', nargs='?',
+        help="JSON scenario or checkpoint file, if omitted: random scenario")
+    parser.add_argument('--steps', type=int,
+        help="number of steps, default: 1000, until interrupted with --serve")
+    parser.add_argument('--dt', type=float, help="time delta, overrides the scenario one")
+    parser.add_argument('--precision', choices=list(PRECISIONS), default='float32')
+
+    random = parser.add_argument_group("random scenario")
+    random.add_argument('--random', type=int, default=100, metavar='N',
+        help="number of particules")
+    random.add_argument('--fields', type=int, default=0, help="number of magnetic fields")
+    random.add_argument('--max-charge', type=float, default=5)
+    random.add_argument('--charge-distribution', choices=CHARGE_DISTRIBUTIONS, default='uniform')
+    random.add_argument('--seed', type=int, help="seed of the random generator")
+
+    output = parser.add_argument_group("outputs")
+    output.add_argument('--record', metavar='PATH', help="record the trajectory in a file")
+    output.add_argument('--every', type=int, default=1, help="steps between two recorded (or served) frames")
+    output.add_argument('--codec', choices=list(CODECS), default='raw')
+    output.add_argument('--observables', metavar='PATH',
+        help="save the sampled observables in a .npz file")
+    output.add_argument('--observe-every', type=int, default=100,
+        help="steps between two samples of the observables")
+    output.add_argument('--save', metavar='PATH', help="save the final state in a checkpoint")
+    output.add_argument('--quiet', action='store_true', help="only print the final figures")
+
+    server = parser.add_argument_group("server")
+    server.add_argument('--serve', metavar='NAME',
+        help="write the frames in the shared memory block NAME, for viewers (main.py --attach)")
+    server.add_argument('--stream', metavar='ADDRESS',
+        help="stream the frames to the clients of ADDRESS: host:port or unix:path")
+    server.add_argument('--delta', action='store_true',
+        help="quantize & delta-encode the streamed positions")
+    server.add_argument('--quantum', type=float, default=1e-3,
+        help="precision of the delta-encoded positions")
+    server.add_argument('--speed', type=float,
+        help="simulated seconds per second, default: as fast as possible")
+    server.add_argument('--slots', type=int, default=4, help="frames of the ring buffer")
+    server.add_argument('--capacity', type=int,
+        help="maximal number of particules, default: the initial one")
+
+    return parser.parse_args(args)
+
+def load_system(args: argparse.Namespace):
+    '''Create the system of the run'''
+    system_cls = PRECISIONS[args.precision][0]
+
+    if args.scenario is not None and args.scenario.endswith(CHECKPOINT_EXTENSIONS):
+        return system_cls.load(args.scenario)
+
+    if args.scenario is not None:
+        scenario = Scenario.load(args.scenario)
+    else:
+        scenario = Scenario.random(
+            args.random,
+            args.fields,
+            max_charge=args.max_charge,
+            charge_distribution=args.charge_distribution,
+            seed=args.seed,
+        )
+
+    if args.dt is not None:
+        scenario.dt = args.dt
+
+    return scenario.build(system_cls)
+
+def sample(system, observables: Dict[str, list]):
+    '''Append the observables of the current state'''
+    summary = system.summary()
+    observables['step'].append(system.step)
+    observables['time'].append(system.time)
+
+    for name, value in summary.items():
+        observables[name].append(value)
+
+def run_server(args: argparse.Namespace, system) -> int:
+    '''Step the system, publishing its frames in shared memory'''
+    buffer = SharedFrameBuffer.for_system(system, args.serve, args.capacity, args.slots)
+
+    if not args.quiet:
+        print(f"serving {system.n_particules} particules on '{buffer.name}', "
+            f"{buffer.n_slots} slots, ctrl-c to stop")
+
+    start = time.perf_counter()
+    start_step = system.step
+
+    try:
+        serve(system, buffer, speed=args.speed, steps=args.steps, every=args.every)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        buffer.close()
+
+    if args.record is not None:
+        system.stop_recording()
+
+    if args.save is not None:
+        system.save(args.save)
+
+    elapsed = max(time.perf_counter() - start, 1e-12)
+    print(f"{system.step - start_step} steps in {elapsed:.3f} s, "
+        f"{buffer.sequence + 1} frames served")
+
+    return 0
+
+async def run_stream(args: argparse.Namespace, system) -> StreamServer:
+    '''Step the system, streaming its frames to the clients of a socket'''
+    server = StreamServer(system, speed=args.speed, every=args.every,
+        delta=args.delta, quantum=args.quantum)
+    await server.start(args.stream)
+
+    if not args.quiet:
+        print(f"streaming {system.n_particules} particules on {server.address}, ctrl-c to stop")
+
+    try:
+        await server.run(args.steps)
+    finally:
+        await server.close()
+
+    return server
+
+def run_stream_server(args: argparse.Namespace, system) -> int:
+    start = time.perf_counter()
+    start_step = system.step
+
+    try:
+        server = asyncio.run(run_stream(args, system))
+        sequence = server.sequence
+    except KeyboardInterrupt:
+        sequence = None
+
+    if args.record is not None:
+        system.stop_recording()
+
+    if args.save is not None:
+        system.save(args.save)
+
+    elapsed = max(time.perf_counter() - start, 1e-12)
+    frames = "" if sequence is None else f", {sequence + 1} frames published"
+    print(f"{system.step - start_step} steps in {elapsed:.3f} s{frames}")
+
+    return 0
+
+def main(args: Optional[List[str]]=None) -> int:
+    args = parse_args(args)
+    system = load_system(args)
+
+    if args.record is not None:
+        system.record(args.record, every=args.every, codec=args.codec)
+
+    if args.serve is not None:
+        return run_server(args, system)
+
+    if args.stream is not None:
+        return run_stream_server(args, system)
+
+    if args.steps is None:
+        args.steps = 1000
+
+    observables = {name: [] for name in ('step', 'time', 'n_particules', 'charge',
+        'mass', 'kinetic_energy', 'momentum')}
+    sample(system, observables)
+
+    if not args.quiet:
+        print(f"engine v{ENGINE_VERSION}, {args.precision}, "
+            f"{system.n_particules} particules, {len(system.magnetic_fields)} fields, "
+            f"{args.steps} steps")
+
+    observe_every = max(1, args.observe_every)
+    particule_steps = 0
+    elapsed = 0.0
+    done = 0
+
+    while done < args.steps:
+        n_steps = min(observe_every, args.steps - done)
+        n_particules = system.n_particules
+
+        start = time.perf_counter()
+        system.run(n_steps, dt=args.dt)
+        elapsed += time.perf_counter() - start
+
+        # particules merged or lost during the block are counted on the whole block
+        particule_steps += n_particules * n_steps
+        done += n_steps
+        sample(system, observables)
+
+        if not args.quiet:
+            print(f"step {system.step:>8} | {system.n_particules:>8} particules | "
+                f"{done / elapsed:>10.1f} steps/s")
+
+    if args.record is not None:
+        system.stop_recording()
+
+    if args.observables is not None:
+        np.savez(args.observables, **{
+            name: np.array(values) for name, values in observables.items()
+        })
+
+    if args.save is not None:
+        system.save(args.save)
+
+    elapsed = max(elapsed, 1e-12)
+    print(f"{args.steps} steps in {elapsed:.3f} s: "
+        f"{args.steps / elapsed:.1f} steps/s, "
+        f"{particule_steps / elapsed:.4g} particule-steps/s")
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,214 @@
+'''
+Result cache
+======
+Content-addressed on-disk cache of simulation results.
+
+An entry is keyed by the hash of everything that determines a run:  
+particules, fields, constants, dt, merging flag, limits, precision,  
+integrator, number of steps and engine version.  
+It stores the observables and the final state of the run, as a `.npz` file.  
+Once the cache exceeds its size, the least recently used entries are evicted:
+the size is tracked from the entries stored by the instance, the directory is
+only scanned once, then on eviction.
+'''
+from typing import Dict, Optional
+import hashlib, os, tempfile
+import numpy as np
+
+from ._simulation import ENGINE_VERSION
+
+INTEGRATOR = 'semi-implicit-euler'
+
+class ResultCache:
+    '''
+    Result cache
+    ===
+    Arguments
+    ---
+    `'path' str`: directory of the cache, created if needed  
+    `'max_bytes' int`: maximal size of the cache, in bytes  
+    '''
+    EXTENSION = '.npz'
+
+    def __init__(self, path: str, max_bytes: int=1 << 30):
+        self.path = path
+        self.max_bytes = max_bytes
+        os.makedirs(path, exist_ok=True)
+
+        # estimate of the size, scanned on first put: doesn't see the entries
+        # stored by other processes until the next eviction
+        self._size = None
+
+    @staticmethod
+    def hash(**parts) -> str:
+        '''
+        Return the hash of the given parts (arrays, numbers, strings or None),  
+        independently of their order
+        '''
+        digest = hashlib.sha256()
+
+        for name in sorted(parts):
+            value = parts[name]
+            digest.update(name.encode())
+
+            if isinstance(value, np.ndarray):
+                value = np.ascontiguousarray(value)
+                digest.update(f"{value.dtype.str}{value.shape}".encode())
+                digest.update(value.tobytes())
+            else:
+                digest.update(repr(value).encode())
+
+        return digest.hexdigest()
+
+    @classmethod
+    def system_key(cls, system, n_steps: int, dt: Optional[float]=None) -> str:
+        '''
+        Return the key of running `n_steps` steps of `system` from its current state
+        '''
+        fields = np.array([
+            field.origin + [field.intensity, field.dispersion, field.is_uniform]
+            for field in system.magnetic_fields
+        ], dtype=np.float64).reshape(-1, 5)
+
+        return cls.hash(
+            pos=system.positions(),
+            v=system.velocities(),
+            q=system.charges(),
+            m=system.masses(),
+            ids=system.ids(),
+            step=system.step,
+            time=system.time,
+            fields=fields,
+            k=system.constants.k,
+            e=system.constants.e,
+            dt=system.dt if dt is None else float(np.dtype(system.dtype).type(dt)),
+            flag=system.flag,
+            limits=system.limits,
+            dtype=system.dtype,
+            accumulator_dtype=system.accumulator_dtype,
+            integrator=INTEGRATOR,
+            n_steps=n_steps,
+            engine_version=ENGINE_VERSION,
+        )
+
+    def _get_path(self, key: str) -> str:
+        return os.path.join(self.path, key + self.EXTENSION)
+
+    def __contains__(self, key: str) -> bool:
+        return os.path.exists(self._get_path(key))
+
+    def get(self, key: str) -> Optional[Dict[str, np.ndarray]]:
+        '''
+        Return the stored arrays of the entry, None if it doesn't exist
+        '''
+        path = self._get_path(key)
+        try:
+            with np.load(path) as data:
+                entry = {name: data[name] for name in data.files}
+        except (FileNotFoundError, OSError, ValueError):
+            return None
+
+        # mark as recently used
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+
+        return entry
+
+    def put(self, key: str, entry: Dict[str, np.ndarray]):
+        '''
+        Store the arrays of the entry, then evict old entries if needed
+        '''
+        if self._size is None:
+            self._size = self.size
+
+        path = self._get_path(key)
+        try:
+            replaced = os.stat(path).st_size
+        except FileNotFoundError:
+            replaced = 0
+
+        # write to a temporary file first: concurrent readers never see partial entries
+        fd, tmp_path = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                np.savez(file, **entry)
+                written = file.tell()
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+        self._size += written - replaced
+
+        if self._size > self.max_bytes:
+            self.evict()
+
+    def _get_entries(self):
+        '''Return the (mtime, size, path) of every entry'''
+        entries = []
+        for name in os.listdir(self.path):
+            if not name.endswith(self.EXTENSION):
+                continue
+            path = os.path.join(self.path, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    @property
+    def size(self) -> int:
+        '''Total size of the entries, in bytes'''
+        return sum(size for _, size, _ in self._get_entries())
+
+    def evict(self):
+        '''
+        Remove the least recently used entries until the cache fits in `max_bytes`
+        '''
+        entries = sorted(self._get_entries())
+        total = sum(size for _, size, _ in entries)
+
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+        self._size = total
+
+    def clear(self):
+        '''Remove all entries'''
+        for _, _, path in self._get_entries():
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+        self._size = 0
+
+def system_entry(system) -> Dict[str, np.ndarray]:
+    '''
+    Return the observables & the final state of a system as a cache entry
+    '''
+    summary = system.summary()
+    return {
+        'n_particules': np.array(summary['n_particules']),
+        'charge': np.array(summary['charge']),
+        'mass': np.array(summary['mass']),
+        'kinetic_energy': np.array(summary['kinetic_energy']),
+        'momentum': np.array(summary['momentum']),
+        'pos': system.positions(),
+        'v': system.velocities(),
+        'a': system.accelerations(),
+        'q': system.charges(),
+        'm': system.masses(),
+        'ids': system.ids(),
+        'step': np.array(system.step),
+        'time': np.array(system.time),
+    }
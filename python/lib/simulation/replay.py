@@ -0,0 +1,213 @@
+'''
+Replay
+======
+Real-time playback of a recorded trajectory (see `TrajectoryReader`).
+
+The frames are read by a background thread, ahead of the played one:
+the playback only waits for the disk (or the decoding of the chunks)
+after a seek far from the current frame.
+'''
+from typing import Optional
+import threading
+import numpy as np
+
+from .trajectory import TrajectoryReader, Frame
+
+class TrajectoryPlayer:
+    '''
+    Trajectory player
+    ===
+    Play a trajectory file at a given speed, the simulated time  
+    advances as the real time multiplied by the speed.  
+    Arguments
+    ---
+    `'path' str`: the trajectory file  
+    `'read_ahead' int`: number of frames read in advance  
+    Attributes
+    ---
+    `'reader' TrajectoryReader`: reader of the file  
+    `'time' float`: current simulated time  
+    `'speed' float`: playback speed  
+    `'paused' bool`: if the playback is paused  
+    '''
+    SPEEDS = (0.25, 0.5, 1, 2, 4, 8)
+
+    def __init__(self, path: str, read_ahead: int=32):
+        self.reader = TrajectoryReader(path)
+
+        if len(self.reader) == 0:
+            self.reader.close()
+            raise ValueError(f"Empty trajectory: {path}")
+
+        self.read_ahead = max(1, read_ahead)
+        self.speed = 1
+        self.paused = True
+        self.time = self.start_time
+        self._index = 0
+
+        # frames read by the thread: index: frame
+        self._buffer = {}
+        self._condition = threading.Condition()
+        self._closed = False
+
+        self._thread = threading.Thread(target=self._read_frames, daemon=True)
+        self._thread.start()
+
+    @property
+    def start_time(self) -> float:
+        return float(self.reader.times[0])
+
+    @property
+    def end_time(self) -> float:
+        return float(self.reader.times[-1])
+
+    @property
+    def index(self) -> int:
+        '''Index of the current frame'''
+        return self._index
+
+    @property
+    def progress(self) -> float:
+        '''Position of the playback in the trajectory, in [0, 1]'''
+        duration = self.end_time - self.start_time
+        if duration <= 0:
+            return 1.0
+        return (self.time - self.start_time) / duration
+
+    def play(self):
+        # restart from the beginning once the end is reached
+        if self._index == len(self.reader) - 1:
+            self.seek(self.start_time)
+        self.paused = False
+
+    def pause(self):
+        self.paused = True
+
+    def toggle(self):
+        '''Play if paused, pause otherwise'''
+        if self.paused:
+            self.play()
+        else:
+            self.pause()
+
+    def next_speed(self):
+        '''Set the speed to the next one of `SPEEDS`, cycle back to the slowest one'''
+        faster = [speed for speed in self.SPEEDS if speed > self.speed]
+        self.speed = faster[0] if len(faster) > 0 else self.SPEEDS[0]
+
+    def _set_index(self, idx: int):
+        if idx == self._index:
+            return
+
+        with self._condition:
+            self._index = idx
+            self._condition.notify_all()
+
+    def seek(self, time: float):
+        '''Move the playback to the simulated `time`'''
+        self.time = min(max(time, self.start_time), self.end_time)
+        self._set_index(self.reader.find_time(self.time))
+
+    def seek_progress(self, progress: float):
+        '''Move the playback to `progress` (in [0, 1]) of the trajectory'''
+        self.seek(self.start_time + progress * (self.end_time - self.start_time))
+
+    def step(self, n_frames: int=1):
+        '''Move the playback by `n_frames` frames (can be negative)'''
+        idx = min(max(self._index + n_frames, 0), len(self.reader) - 1)
+        self.time = float(self.reader.times[idx])
+        self._set_index(idx)
+
+    def advance(self, elapsed: float):
+        '''
+        Advance the playback by `elapsed` seconds of real time,
+        pause at the end of the trajectory
+        '''
+        if self.paused:
+            return
+
+        time = self.time + elapsed * self.speed
+
+        if time >= self.end_time:
+            self.pause()
+
+        self.seek(time)
+
+    def frame(self, timeout: Optional[float]=None) -> Optional[Frame]:
+        '''
+        Return the current frame, wait for it to be read if needed,
+        return None if the timeout expires
+        '''
+        with self._condition:
+            idx = self._index
+            self._condition.wait_for(
+                lambda: idx in self._buffer or self._closed,
+                timeout
+            )
+            return self._buffer.get(idx)
+
+    def _get_window(self) -> range:
+        '''Return the indexes of the frames to be buffered'''
+        return range(self._index, min(self._index + self.read_ahead, len(self.reader)))
+
+    def _get_next_index(self) -> Optional[int]:
+        '''
+        Drop the buffered frames out of the window,
+        return the next frame to read, None if the window is full
+        '''
+        window = self._get_window()
+
+        for idx in list(self._buffer):
+            if idx not in window:
+                del self._buffer[idx]
+
+        for idx in window:
+            if idx not in self._buffer:
+                return idx
+        return None
+
+    def _load(self, idx: int) -> Frame:
+        '''Read the frame, in memory: views of the file are copied'''
+        frame = self.reader.frame(idx)
+
+        if self.reader.codec != 'raw':
+            return frame
+
+        return Frame(
+            frame.step, frame.time, np.array(frame.ids), np.array(frame.pos),
+            np.array(frame.v), np.array(frame.q), np.array(frame.m)
+        )
+
+    def _read_frames(self):
+        '''Loop of the reading thread'''
+        while True:
+            with self._condition:
+                self._condition.wait_for(
+                    lambda: self._closed or self._get_next_index() is not None
+                )
+                if self._closed:
+                    return
+                idx = self._get_next_index()
+
+            frame = self._load(idx)
+
+            with self._condition:
+                if idx in self._get_window():
+                    self._buffer[idx] = frame
+                    self._condition.notify_all()
+
+    def close(self):
+        '''Stop the reading thread, release the file'''
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+        self._thread.join()
+        self._buffer.clear()
+        self.reader.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
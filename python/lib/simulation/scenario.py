@@ -0,0 +1,170 @@
+'''
+Scenario
+======
+Initial state of a system stored as arrays,
+cheap to transfer between processes and to build natively.
+'''
+from typing import Optional, Tuple
+import json, os
+import numpy as np
+
+from . import System, MagneticField
+
+# (min_x, max_x, min_y, max_y), same as the GUI
+DEFAULT_LIMITS = (-2, 34, 0, 18)
+
+CHARGE_DISTRIBUTIONS = ('uniform', 'positive', 'negative', 'binary')
+
+class Scenario:
+    '''
+    Scenario
+    ===
+    Arguments
+    ---
+    `'pos' array (n, 2)`: positions of the particules  
+    `'q' array (n,)`: charges of the particules  
+    `'m' array (n,)`: masses of the particules  
+    `'fields' array (k, 4)`: magnetic fields: x, y, intensity, dispersion  
+    `'dt' float`: time delta of the system  
+    `'k' float`: coulomb constant, by default the one of `Constants`  
+    `'flag' int`: merging flag of the system  
+    `'limits' tuple`: limits of the system (min_x, max_x, min_y, max_y), if any  
+    '''
+
+    def __init__(self, pos: np.ndarray, q: np.ndarray, m: np.ndarray,
+            fields: Optional[np.ndarray]=None, dt: float=0.1, k: Optional[float]=None,
+            flag: int=System.FLAG_SUM, limits: Optional[Tuple[float]]=None):
+
+        self.pos = np.ascontiguousarray(pos, dtype=np.float64).reshape(-1, 2)
+        self.q = np.ascontiguousarray(q, dtype=np.float64)
+        self.m = np.ascontiguousarray(m, dtype=np.float64)
+
+        if fields is None:
+            fields = np.zeros((0, 4))
+        self.fields = np.ascontiguousarray(fields, dtype=np.float64).reshape(-1, 4)
+
+        self.dt = dt
+        self.k = k
+        self.flag = flag
+        self.limits = None if limits is None else tuple(limits)
+
+    @property
+    def n_particules(self) -> int:
+        return len(self.q)
+
+    @property
+    def n_fields(self) -> int:
+        return len(self.fields)
+
+    def build(self, system_cls=System) -> System:
+        '''
+        Create a system (of type `system_cls`) in the state of the scenario
+        '''
+        system = system_cls([], dt=self.dt, flag=self.flag)
+
+        if self.k is not None:
+            system.constants.k = self.k
+
+        if self.limits is not None:
+            system.set_limits(*self.limits)
+
+        system.add_particules(self.pos, self.q, self.m)
+
+        for x, y, intensity, dispersion in self.fields:
+            system.add_magnetic_field(MagneticField(x, y, intensity, dispersion))
+
+        return system
+
+    def to_dict(self) -> dict:
+        '''Return the scenario as a JSON-serializable dict'''
+        return {
+            'pos': self.pos.tolist(),
+            'q': self.q.tolist(),
+            'm': self.m.tolist(),
+            'fields': self.fields.tolist(),
+            'dt': self.dt,
+            'k': self.k,
+            'flag': self.flag,
+            'limits': None if self.limits is None else list(self.limits),
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'Scenario':
+        '''
+        Create a scenario from a dict (see `to_dict`),  
+        only `pos`, `q` and `m` are required
+        '''
+        return cls(
+            data['pos'],
+            data['q'],
+            data['m'],
+            data.get('fields'),
+            dt=data.get('dt', 0.1),
+            k=data.get('k'),
+            flag=data.get('flag', System.FLAG_SUM),
+            limits=data.get('limits'),
+        )
+
+    def save(self, path: str):
+        '''Save the scenario in a JSON file'''
+        with open(os.fspath(path), 'w') as file:
+            json.dump(self.to_dict(), file)
+
+    @classmethod
+    def load(cls, path: str) -> 'Scenario':
+        '''Load a scenario from a JSON file (see `save`)'''
+        with open(os.fspath(path), 'r') as file:
+            return cls.from_dict(json.load(file))
+
+    @classmethod
+    def random(cls, n_particules: int, n_fields: int=0, *, max_charge: float=5,
+            charge_distribution: str='uniform', limits: Tuple[float]=DEFAULT_LIMITS,
+            dt: float=0.1, k: Optional[float]=None, flag: int=System.FLAG_SUM,
+            seed: Optional[int]=None) -> 'Scenario':
+        '''
+        Generate a random scenario, as done in the GUI:  
+        particules on distinct integer positions, mass equal to the absolute charge,  
+        fields of random intensity & dispersion.
+        Arguments
+        ---
+        `'charge_distribution' str`: one of `CHARGE_DISTRIBUTIONS`,  
+        the charges are drawn in `[-max_charge, max_charge]`  
+        `'seed' int`: seed of the random generator  
+        Raise a ValueError if there are more particules than integer positions in the limits.
+        '''
+        if charge_distribution not in CHARGE_DISTRIBUTIONS:
+            raise ValueError(f"Unknown charge distribution: {charge_distribution}")
+
+        rng = np.random.default_rng(seed)
+        min_x, max_x, min_y, max_y = (int(v) for v in limits)
+
+        # draw distinct integer positions
+        n_cells = (max_x - min_x) * (max_y - min_y)
+        if n_particules > n_cells:
+            raise ValueError(f"Can't place {n_particules} particules on {n_cells} distinct positions, "
+                "widen the limits")
+        cells = rng.choice(n_cells, size=n_particules, replace=False)
+        pos = np.stack([
+            min_x + cells % (max_x - min_x),
+            min_y + cells // (max_x - min_x),
+        ], axis=1).astype(np.float64)
+
+        if charge_distribution == 'uniform':
+            q = rng.uniform(-max_charge, max_charge, n_particules)
+        elif charge_distribution == 'positive':
+            q = rng.uniform(0, max_charge, n_particules)
+        elif charge_distribution == 'negative':
+            q = rng.uniform(-max_charge, 0, n_particules)
+        else:
+            q = rng.choice([-max_charge, max_charge], n_particules)
+
+        m = np.abs(q)
+
+        fields = np.stack([
+            rng.integers(min_x, max_x, n_fields),
+            rng.integers(min_y, max_y, n_fields),
+            rng.uniform(-5, 5, n_fields),
+            rng.uniform(1, 5, n_fields),
+        ], axis=1)
+
+        return cls(pos, q, m, fields, dt=dt, k=k, flag=flag, limits=limits)
@@ -0,0 +1,392 @@
+'''
+Shared memory
+======
+Hand the frames of a simulation over to other processes, through a
+ring buffer in a `multiprocessing.shared_memory` block.
+
+The simulation server writes each frame in the next slot of the ring,
+the viewers attach to the block by its name and read the last written
+frame in place (no copy, no pickling), they can attach and detach at
+any time without the server noticing.
+
+Each slot is guarded by a sequence number (seqlock): odd while the slot
+is written, even once the frame is complete, the readers check it before
+and after reading. A frame read in place stays valid until the writer
+comes back to its slot, `n_slots - 1` frames later (see `SharedFrame.is_valid`).
+
+    python -m lib.simulation scenario.json --serve sim --speed 1
+    python main.py --attach sim
+'''
+from multiprocessing import shared_memory
+from typing import Optional
+import mmap, os, time
+import numpy as np
+
+MAGIC = 0x314D485353544150 # b'PATSSHM1', little endian
+VERSION = 2
+
+HEADER_DTYPE = np.dtype([
+    ('magic', '<u8'),
+    ('version', '<u4'),
+    ('n_slots', '<u4'),
+    ('capacity', '<u8'),
+    ('max_fields', '<u4'),
+    ('float_size', '<u4'),
+    ('slot_size', '<u8'),
+    ('sequence', '<i8'), # last published frame, -1: none
+    ('writer_pid', '<i8'),
+    ('closed', '<u4'),
+], align=True)
+
+HEADER_SIZE = 64
+
+def _get_slot_dtype(capacity: int, max_fields: int, float_size: int) -> np.dtype:
+    real = f'<f{float_size}'
+    return np.dtype([
+        ('seq', '<i8'), # odd: being written
+        ('step', '<i8'),
+        ('time', '<f8'),
+        ('n_particules', '<i8'),
+        ('n_fields', '<i8'),
+        ('ids', '<i8', (capacity,)),
+        ('pos', real, (capacity, 2)),
+        ('q', real, (capacity,)),
+        ('m', real, (capacity,)),
+        ('fields', real, (max_fields, 5)), # x, y, intensity, dispersion, is uniform
+    ], align=True)
+
+class _ReadOnlyMapping:
+    '''
+    Read-only mapping of an existing block: a viewer can't corrupt
+    the frames of the server.  
+    The block isn't registered in the resource tracker,
+    which would unlink it when the viewer exits.
+    '''
+
+    def __init__(self, name: str):
+        import _posixshmem
+
+        fd = _posixshmem.shm_open('/' + name.lstrip('/'), os.O_RDONLY, mode=0)
+        try:
+            size = os.fstat(fd).st_size
+            self.buf = mmap.mmap(fd, size, prot=mmap.PROT_READ)
+        finally:
+            os.close(fd)
+
+    def close(self):
+        self.buf.close()
+
+def _attach(name: str):
+    '''Map an existing block, read-only when the platform allows it'''
+    try:
+        return _ReadOnlyMapping(name)
+    except ImportError: # windows: no posix shared memory
+        return shared_memory.SharedMemory(name)
+
+class SharedFrame:
+    '''
+    Frame read from a shared ring buffer
+    ===
+    Attributes
+    ---
+    `'sequence' int`: number of the frame, since the creation of the buffer  
+    `'step' int`: step of the system  
+    `'time' float`: simulated time  
+    `'ids' array (n,)`: ids of the particules  
+    `'pos' array (n, 2)`: positions of the particules  
+    `'q' array (n,)`: charges of the particules  
+    `'m' array (n,)`: masses of the particules  
+    `'fields' array (n_fields, 5)`: x, y, intensity, dispersion & is uniform of the magnetic fields  
+
+    The arrays are read-only views on the shared memory, unless copied.
+    '''
+    __slots__ = ('sequence', 'step', 'time', 'ids', 'pos', 'q', 'm', 'fields', '_slot')
+
+    @property
+    def n_particules(self) -> int:
+        return len(self.ids)
+
+    def is_valid(self) -> bool:
+        '''Return if the slot of the frame hasn't been overwritten since it was read'''
+        return self._slot is None or int(self._slot['seq']) == 2 * self.sequence + 2
+
+    def detach(self) -> bool:
+        '''
+        Copy the arrays out of the shared memory, for the frame to be kept
+        while the writer overwrites the ring, return False if its slot was
+        overwritten before the copy was complete: the arrays are torn
+        '''
+        if self._slot is None:
+            return True
+
+        for name in ('ids', 'pos', 'q', 'm', 'fields'):
+            setattr(self, name, getattr(self, name).copy())
+
+        valid = self.is_valid()
+        self._slot = None
+        return valid
+
+class SharedFrameBuffer:
+    '''
+    Writing end of a shared ring buffer of frames
+    ===
+    Arguments
+    ---
+    `'name' str`: name of the shared memory block, None: random name  
+    `'capacity' int`: maximal number of particules of a frame  
+    `'n_slots' int`: number of frames of the ring  
+    `'max_fields' int`: maximal number of magnetic fields  
+    `'dtype' str`: dtype of the positions, charges & masses: float32 or float64  
+
+    The block is unlinked by `close`, the readers keep their mapping until they close it.
+    '''
+
+    def __init__(self, name: Optional[str], capacity: int, n_slots: int=4,
+            max_fields: int=64, dtype: str='float32'):
+        if n_slots < 2:
+            raise ValueError("the ring needs at least 2 slots")
+
+        float_size = np.dtype(dtype).itemsize
+        if float_size not in (4, 8):
+            raise ValueError(f"unsupported dtype: {dtype}")
+
+        self.capacity = capacity
+        self.n_slots = n_slots
+        self.max_fields = max_fields
+        self.sequence = -1
+
+        slot_dtype = _get_slot_dtype(capacity, max_fields, float_size)
+        size = HEADER_SIZE + n_slots * slot_dtype.itemsize
+
+        self.shm = shared_memory.SharedMemory(name, create=True, size=size)
+        self.name = self.shm.name
+
+        self._header = np.ndarray((), dtype=HEADER_DTYPE, buffer=self.shm.buf)
+        self._slots = np.ndarray((n_slots,), dtype=slot_dtype, buffer=self.shm.buf, offset=HEADER_SIZE)
+
+        self._slots['seq'] = 0
+        self._header['magic'] = MAGIC
+        self._header['version'] = VERSION
+        self._header['n_slots'] = n_slots
+        self._header['capacity'] = capacity
+        self._header['max_fields'] = max_fields
+        self._header['float_size'] = float_size
+        self._header['slot_size'] = slot_dtype.itemsize
+        self._header['sequence'] = -1
+        self._header['writer_pid'] = os.getpid()
+        self._header['closed'] = 0
+
+    @classmethod
+    def for_system(cls, system, name: Optional[str]=None, capacity: Optional[int]=None,
+            n_slots: int=4) -> 'SharedFrameBuffer':
+        '''
+        Create a buffer fitting the system: its dtype, its number of particules
+        (merges only decrease it) & magnetic fields
+        '''
+        if capacity is None:
+            capacity = max(1, system.n_particules)
+
+        return cls(
+            name,
+            capacity,
+            n_slots=n_slots,
+            max_fields=max(64, len(system.magnetic_fields)),
+            dtype=system.positions().dtype,
+        )
+
+    def write(self, system) -> int:
+        '''
+        Publish the current state of the system, return the sequence number of the frame
+        '''
+        n_particules = system.n_particules
+        if n_particules > self.capacity:
+            raise ValueError(f"{n_particules} particules, the capacity is {self.capacity}")
+
+        fields = system.magnetic_fields[:self.max_fields]
+
+        sequence = self.sequence + 1
+        slot = self._slots[sequence % self.n_slots]
+
+        slot['seq'] = 2 * sequence + 1
+
+        slot['step'] = system.step
+        slot['time'] = system.time
+        slot['n_particules'] = n_particules
+        slot['n_fields'] = len(fields)
+        slot['ids'][:n_particules] = system.ids()
+        slot['pos'][:n_particules] = system.positions()
+        slot['q'][:n_particules] = system.charges()
+        slot['m'][:n_particules] = system.masses()
+
+        for i, field in enumerate(fields):
+            slot['fields'][i] = (*field.origin, field.intensity, field.dispersion, field.is_uniform)
+
+        slot['seq'] = 2 * sequence + 2
+        self._header['sequence'] = sequence
+        self.sequence = sequence
+
+        return sequence
+
+    def close(self):
+        '''Mark the buffer as closed & unlink the block'''
+        if self.shm is None:
+            return
+
+        self._header['closed'] = 1
+        del self._header, self._slots
+
+        self.shm.close()
+        self.shm.unlink()
+        self.shm = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class SharedFrameReader:
+    '''
+    Reading end of a shared ring buffer of frames
+    ===
+    Arguments
+    ---
+    `'name' str`: name of the shared memory block, see `SharedFrameBuffer`  
+    Attributes
+    ---
+    `'sequence' int`: sequence number of the last read frame, -1: none  
+    '''
+
+    def __init__(self, name: str):
+        self.name = name
+        self.shm = _attach(name)
+        self.sequence = -1
+
+        header = np.ndarray((), dtype=HEADER_DTYPE, buffer=self.shm.buf)
+
+        if int(header['magic']) != MAGIC:
+            self.shm.close()
+            raise ValueError(f"'{name}' isn't a frame buffer")
+
+        if int(header['version']) != VERSION:
+            self.shm.close()
+            raise ValueError(f"unsupported frame buffer version: {int(header['version'])}")
+
+        self.n_slots = int(header['n_slots'])
+        self.capacity = int(header['capacity'])
+        self.max_fields = int(header['max_fields'])
+
+        slot_dtype = _get_slot_dtype(self.capacity, self.max_fields, int(header['float_size']))
+
+        self._header = header
+        self._slots = np.ndarray((self.n_slots,), dtype=slot_dtype, buffer=self.shm.buf, offset=HEADER_SIZE)
+
+        # on windows, the mapping is writable
+        self._header.flags.writeable = False
+        self._slots.flags.writeable = False
+
+    @property
+    def closed(self) -> bool:
+        '''Return if the writer has closed the buffer'''
+        return bool(self._header['closed'])
+
+    @property
+    def latest(self) -> int:
+        '''Return the sequence number of the last published frame, -1: none'''
+        return int(self._header['sequence'])
+
+    def read(self, copy: bool=False, retries: int=10, new_only: bool=True) -> Optional[SharedFrame]:
+        '''
+        Return the last published frame, None if there is none or no new one
+        since the last call (or if the writer keeps overwriting it)  
+        `copy`: copy the arrays out of the shared memory,
+        otherwise they are views, valid while `frame.is_valid()`  
+        `new_only`: False: return the last frame even if it was already read
+        '''
+        for _ in range(retries):
+            sequence = self.latest
+            if sequence < 0 or (new_only and sequence == self.sequence):
+                return None
+
+            slot = self._slots[sequence % self.n_slots]
+            if int(slot['seq']) != 2 * sequence + 2:
+                # being overwritten: a newer frame is published
+                continue
+
+            n_particules = int(slot['n_particules'])
+            n_fields = int(slot['n_fields'])
+
+            frame = SharedFrame()
+            frame.sequence = sequence
+            frame.step = int(slot['step'])
+            frame.time = float(slot['time'])
+            frame.ids = slot['ids'][:n_particules]
+            frame.pos = slot['pos'][:n_particules]
+            frame.q = slot['q'][:n_particules]
+            frame.m = slot['m'][:n_particules]
+            frame.fields = slot['fields'][:n_fields]
+            frame._slot = slot
+
+            if copy and not frame.detach():
+                continue
+
+            if not frame.is_valid():
+                continue
+
+            self.sequence = sequence
+            return frame
+
+        return None
+
+    def close(self):
+        '''Detach from the buffer, the frames read in place can't be used anymore'''
+        if self.shm is None:
+            return
+
+        del self._header, self._slots
+        self.shm.close()
+        self.shm = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def serve(system, buffer: SharedFrameBuffer, speed: Optional[float]=None,
+        steps: Optional[int]=None, every: int=1, max_steps: int=1000):
+    '''
+    Step the system & write a frame in `buffer` every `every` steps,  
+    `speed`: simulated seconds per real second (positive), None: as fast as possible  
+    `steps`: number of steps, None: until interrupted
+    '''
+    if speed is not None and not speed > 0:
+        raise ValueError(f"The speed must be positive or None, not {speed}")
+
+    buffer.write(system)
+
+    start_time = time.perf_counter()
+    start_sim = system.time
+    done = 0
+
+    while steps is None or done < steps:
+        n_steps = every if steps is None else min(every, steps - done)
+
+        if speed is not None:
+            # steps due by the elapsed real time
+            late = (time.perf_counter() - start_time) * speed - (system.time - start_sim)
+            due = int(late / system.dt)
+
+            if due < 1:
+                time.sleep((system.dt - late) / speed)
+                continue
+
+            if due > max_steps:
+                # late time beyond max_steps is dropped
+                start_time += (due - max_steps) * system.dt / speed
+
+            n_steps = min(n_steps, due, max_steps)
+
+        system.run(n_steps)
+        done += n_steps
+        buffer.write(system)
@@ -0,0 +1,137 @@
+'''
+Stepper
+======
+Decouple the simulated time from the rendering.
+
+`FixedStepper` advances a system by fixed time steps, as many as the
+elapsed real time requires (accumulator), all run in a single native call.
+The rendered positions are interpolated between the last two steps,
+so the display stays smooth whatever the ratio between fps and steps.
+'''
+from typing import Optional, Tuple
+import time
+import numpy as np
+
+class FixedStepper:
+    '''
+    Fixed time step stepper
+    ===
+    Arguments
+    ---
+    `'system' System`: the system to advance, with its own `dt`  
+    `'speed' float`: simulated seconds per real second (positive),  
+    if None, run as many steps as fit in `budget` (maximal throughput)  
+    `'max_steps' int`: maximal number of steps per call to `advance`,  
+    the late time is dropped beyond it (the simulation slows down instead of freezing)  
+    `'budget' float`: real time (s) available for the steps of a call, when `speed` is None  
+    Attributes
+    ---
+    `'alpha' float`: position of the rendered state between the last two steps, in [0, 1]  
+    `'n_steps' int`: number of steps run by the last call to `advance`  
+    '''
+
+    def __init__(self, system, speed: Optional[float]=1.0, max_steps: int=1000,
+            budget: float=1/120):
+        if speed is not None and not speed > 0:
+            raise ValueError(f"The speed must be positive or None, not {speed}")
+
+        self.system = system
+        self.speed = speed
+        self.max_steps = max_steps
+        self.budget = budget
+
+        self.accumulator = 0.0
+        self.alpha = 1.0
+        self.n_steps = 0
+
+        # mean duration of a step, to fit the budget
+        self._step_time = None
+
+        # state before the last step: ids & positions
+        self._previous = None
+
+    def reset(self):
+        '''Drop the accumulated time & the interpolation state'''
+        self.accumulator = 0.0
+        self.alpha = 1.0
+        self._previous = None
+
+    def _get_n_steps(self, elapsed: float) -> int:
+        dt = self.system.dt
+
+        if self.speed is None:
+            if self._step_time is None:
+                return 1
+            return int(min(self.max_steps, max(1, self.budget / self._step_time)))
+
+        self.accumulator += elapsed * self.speed
+        n_steps = int(self.accumulator / dt)
+
+        if n_steps > self.max_steps:
+            n_steps = self.max_steps
+            self.accumulator = n_steps * dt
+
+        self.accumulator -= n_steps * dt
+        return n_steps
+
+    def advance(self, elapsed: float) -> int:
+        '''
+        Advance the system by the real time `elapsed` (s), return the number of steps run
+        '''
+        n_steps = self._get_n_steps(elapsed)
+        self.n_steps = n_steps
+
+        if n_steps > 0:
+            start = time.perf_counter()
+
+            if n_steps > 1:
+                self.system.run(n_steps - 1)
+
+            self._previous = (self.system.ids(), self.system.positions())
+            self.system.run(1)
+
+            step_time = (time.perf_counter() - start) / n_steps
+            if self._step_time is None:
+                self._step_time = step_time
+            else:
+                self._step_time += 0.1 * (step_time - self._step_time)
+
+        if self.speed is None:
+            self.alpha = 1.0
+        else:
+            self.alpha = min(self.accumulator / self.system.dt, 1.0)
+
+        return n_steps
+
+    def positions(self) -> np.ndarray:
+        '''
+        Return the positions of the particules of the system, interpolated between
+        the last two steps, particules that didn't exist in the previous step
+        (added or merged) are at their current position
+        '''
+        pos = self.system.positions()
+
+        if self._previous is None or self.alpha >= 1 or len(pos) == 0:
+            return pos
+
+        previous_ids, previous_pos = self._previous
+        if len(previous_ids) == 0:
+            return pos
+
+        ids = self.system.ids()
+
+        # match the particules by id
+        order = np.argsort(previous_ids)
+        idx = np.searchsorted(previous_ids, ids, sorter=order)
+        idx = order[np.minimum(idx, len(order) - 1)]
+        found = previous_ids[idx] == ids
+
+        # alpha: fraction of a step accumulated but not simulated yet
+        t = np.float32(self.alpha) if pos.dtype == np.float32 else self.alpha
+        interpolated = pos.copy()
+        interpolated[found] = previous_pos[idx[found]] + t * (pos[found] - previous_pos[idx[found]])
+        return interpolated
+
+    def get_state(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        '''Return the interpolated positions, the charges & the masses of the particules'''
+        return self.positions(), self.system.charges(), self.system.masses()
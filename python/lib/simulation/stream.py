@@ -0,0 +1,398 @@
+'''
+Stream
+======
+Stream the state of a running simulation to TCP or Unix-socket clients,
+with asyncio.
+
+The server steps the system (natively, in a thread: the event loop keeps
+serving the clients meanwhile) and sends a frame every `every` steps to
+each connected client. Each client has a single pending frame: a frame
+not sent yet when the next one is ready is dropped, so a slow client
+only receives fewer frames, it never stalls the simulation nor the other clients.
+
+    python -m lib.simulation scenario.json --stream 127.0.0.1:5000 --speed 1
+    python -m lib.simulation scenario.json --stream unix:/tmp/sim.sock
+
+Wire format, little endian: a header (`HEADER_DTYPE`) followed by
+`payload_size` bytes, zlib-compressed if `FLAG_ZLIB`:
+
+- `FLAG_IDS`: ids of the particules, int64 (n,), otherwise the ids
+are the ones of the previous frame
+- positions, (n, 2): float32, or int32 multiples of `quantum` if `FLAG_QUANTIZED`,
+differences with the previous frame (modulo 2^32) if `FLAG_DELTA`
+
+Without delta-encoding, each frame is encoded once for all the clients.
+With it, the positions are quantized and each client receives the
+differences with the last frame it has received.
+'''
+from typing import AsyncIterator, Optional
+import asyncio, time, zlib
+import numpy as np
+
+MAGIC = b'PSTR'
+VERSION = 1
+
+FLAG_IDS = 1
+FLAG_QUANTIZED = 2
+FLAG_DELTA = 4
+FLAG_ZLIB = 8
+
+HEADER_DTYPE = np.dtype([
+    ('magic', 'S4'),
+    ('version', '<u2'),
+    ('flags', '<u2'),
+    ('n', '<u8'),
+    ('sequence', '<i8'),
+    ('step', '<i8'),
+    ('time', '<f8'),
+    ('quantum', '<f8'),
+    ('payload_size', '<u8'),
+])
+
+INT32_RANGE = (np.iinfo(np.int32).min, np.iinfo(np.int32).max)
+
+def _encode(flags: int, frame: '_ServerFrame', payload: bytes, quantum: float) -> bytes:
+    if flags & FLAG_ZLIB:
+        payload = zlib.compress(payload, 1)
+
+    header = np.zeros((), dtype=HEADER_DTYPE)
+    header['magic'] = MAGIC
+    header['version'] = VERSION
+    header['flags'] = flags
+    header['n'] = len(frame.ids)
+    header['sequence'] = frame.sequence
+    header['step'] = frame.step
+    header['time'] = frame.time
+    header['quantum'] = quantum
+    header['payload_size'] = len(payload)
+
+    return header.tobytes() + payload
+
+class StreamFrame:
+    '''
+    Frame received from a stream server
+    ===
+    Attributes
+    ---
+    `'sequence' int`: number of the frame, the missing numbers have been dropped  
+    `'step' int`: step of the system  
+    `'time' float`: simulated time  
+    `'ids' array (n,)`: ids of the particules  
+    `'pos' array (n, 2)`: positions of the particules  
+    '''
+    __slots__ = ('sequence', 'step', 'time', 'ids', 'pos')
+
+    def __init__(self, sequence: int, step: int, time: float, ids: np.ndarray, pos: np.ndarray):
+        self.sequence = sequence
+        self.step = step
+        self.time = time
+        self.ids = ids
+        self.pos = pos
+
+    @property
+    def n_particules(self) -> int:
+        return len(self.ids)
+
+class FrameDecoder:
+    '''
+    Decode the frames of a stream, in order:  
+    the delta-encoded frames depend on the previous one
+    '''
+
+    def __init__(self):
+        self._ids = np.zeros(0, dtype=np.int64)
+        self._quantized = np.zeros((0, 2), dtype=np.int32)
+
+    def decode(self, header: bytes, payload: bytes) -> StreamFrame:
+        header = np.frombuffer(header, dtype=HEADER_DTYPE)[0]
+
+        if header['magic'] != MAGIC:
+            raise ValueError("Not a frame of a simulation stream")
+
+        if header['version'] > VERSION:
+            raise ValueError(f"Unsupported stream version: {header['version']}")
+
+        flags = int(header['flags'])
+        n = int(header['n'])
+
+        if flags & FLAG_ZLIB:
+            payload = zlib.decompress(payload)
+
+        offset = 0
+        if flags & FLAG_IDS:
+            self._ids = np.frombuffer(payload, dtype='<i8', count=n).copy()
+            offset = 8 * n
+        elif len(self._ids) != n:
+            raise ValueError("Delta frame without a matching previous frame")
+
+        if flags & FLAG_QUANTIZED:
+            values = np.frombuffer(payload, dtype='<i4', count=2 * n, offset=offset).reshape(n, 2)
+
+            if flags & FLAG_DELTA:
+                # wraps modulo 2^32, as the encoder
+                self._quantized = self._quantized + values
+            else:
+                self._quantized = values.copy()
+
+            pos = self._quantized * float(header['quantum'])
+        else:
+            pos = np.frombuffer(payload, dtype='<f4', count=2 * n, offset=offset).reshape(n, 2).copy()
+
+        return StreamFrame(
+            int(header['sequence']), int(header['step']), float(header['time']), self._ids, pos
+        )
+
+async def read_frames(reader: asyncio.StreamReader) -> AsyncIterator[StreamFrame]:
+    '''Yield the frames read from a stream server connection, until it's closed'''
+    decoder = FrameDecoder()
+
+    while True:
+        try:
+            header = await reader.readexactly(HEADER_DTYPE.itemsize)
+        except asyncio.IncompleteReadError:
+            return
+
+        size = int(np.frombuffer(header, dtype=HEADER_DTYPE)[0]['payload_size'])
+        payload = await reader.readexactly(size)
+        yield decoder.decode(header, payload)
+
+async def connect(address: str) -> AsyncIterator[StreamFrame]:
+    '''
+    Connect to a stream server, yield the received frames,  
+    `address`: 'host:port' or 'unix:path'
+    '''
+    if address.startswith('unix:'):
+        reader, writer = await asyncio.open_unix_connection(address[5:])
+    else:
+        host, port = address.rsplit(':', 1)
+        reader, writer = await asyncio.open_connection(host, int(port))
+
+    try:
+        async for frame in read_frames(reader):
+            yield frame
+    finally:
+        writer.close()
+
+class _ServerFrame:
+    '''Frame of the server, the encodings are computed once, when first needed'''
+
+    def __init__(self, sequence: int, system):
+        self.sequence = sequence
+        self.step = system.step
+        self.time = system.time
+        self.ids = system.ids()
+        self.pos = system.positions()
+        self._quantized = None
+        self._encoded = None
+
+    def get_quantized(self, quantum: float) -> np.ndarray:
+        if self._quantized is None:
+            quantized = np.rint(self.pos.astype(np.float64) / quantum)
+            np.clip(quantized, *INT32_RANGE, out=quantized)
+            self._quantized = quantized.astype(np.int32)
+        return self._quantized
+
+    def get_encoded(self) -> bytes:
+        '''Return the frame encoded as a key frame, with float32 positions'''
+        if self._encoded is None:
+            payload = self.ids.astype('<i8').tobytes() + self.pos.astype('<f4').tobytes()
+            self._encoded = _encode(FLAG_IDS, self, payload, 0.0)
+        return self._encoded
+
+class _Client:
+
+    def __init__(self, writer: asyncio.StreamWriter):
+        self.writer = writer
+        self.pending = None
+        self.ready = asyncio.Event()
+        self.sent = 0
+        self.dropped = 0
+
+        # last sent frame, for delta-encoding
+        self.ids = None
+        self.quantized = None
+
+    def push(self, frame: _ServerFrame):
+        '''Set the next frame to send, replacing the pending one'''
+        if self.pending is not None:
+            self.dropped += 1
+        self.pending = frame
+        self.ready.set()
+
+class StreamServer:
+    '''
+    Stream server
+    ===
+    Arguments
+    ---
+    `'system' System`: the system to step, only accessed by the server once running  
+    `'speed' float`: simulated seconds per real second (positive), None: as fast as possible  
+    `'every' int`: number of steps between two frames  
+    `'delta' bool`: quantize & delta-encode the positions  
+    `'quantum' float`: precision of the quantized positions  
+    `'max_steps' int`: maximal number of steps between two frames, when late  
+    Attributes
+    ---
+    `'sequence' int`: number of the last published frame  
+    `'address' str`: address the server listens on, once started  
+
+    Usage:
+
+        server = StreamServer(system, speed=1)
+        await server.start('127.0.0.1:5000')
+        await server.run()
+    '''
+
+    def __init__(self, system, speed: Optional[float]=None, every: int=1,
+            delta: bool=False, quantum: float=1e-3, max_steps: int=1000):
+        if speed is not None and not speed > 0:
+            raise ValueError(f"The speed must be positive or None, not {speed}")
+
+        self.system = system
+        self.speed = speed
+        self.every = every
+        self.delta = delta
+        self.quantum = quantum
+        self.max_steps = max_steps
+
+        self.sequence = -1
+        self.address = None
+        self.clients = []
+        self._frame = None
+        self._server = None
+        self._handlers = set()
+
+    async def start(self, address: str='127.0.0.1:0'):
+        '''
+        Listen on `address`: 'host:port' (port 0: any free port) or 'unix:path'
+        '''
+        if address.startswith('unix:'):
+            self._server = await asyncio.start_unix_server(self._handle_client, address[5:])
+            self.address = address
+        else:
+            host, port = address.rsplit(':', 1)
+            self._server = await asyncio.start_server(self._handle_client, host, int(port))
+            port = self._server.sockets[0].getsockname()[1]
+            self.address = f"{host}:{port}"
+
+        self._publish()
+
+    async def close(self):
+        '''Disconnect the clients & stop listening'''
+        for client in list(self.clients):
+            client.writer.close()
+
+        # the handlers end when their connection is closed
+        if len(self._handlers) > 0:
+            await asyncio.wait(self._handlers)
+
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    def _publish(self):
+        self.sequence += 1
+        self._frame = _ServerFrame(self.sequence, self.system)
+
+        for client in self.clients:
+            client.push(self._frame)
+
+    def _encode_for(self, client: _Client, frame: _ServerFrame) -> bytes:
+        if not self.delta:
+            return frame.get_encoded()
+
+        quantized = frame.get_quantized(self.quantum)
+        flags = FLAG_QUANTIZED | FLAG_ZLIB
+
+        if client.ids is not None and np.array_equal(client.ids, frame.ids):
+            # wraps modulo 2^32
+            payload = (quantized - client.quantized).tobytes()
+            flags |= FLAG_DELTA
+        else:
+            payload = frame.ids.astype('<i8').tobytes() + quantized.tobytes()
+            flags |= FLAG_IDS
+
+        client.ids = frame.ids
+        client.quantized = quantized
+        return _encode(flags, frame, payload, self.quantum)
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        client = _Client(writer)
+        self.clients.append(client)
+
+        handler = asyncio.current_task()
+        self._handlers.add(handler)
+
+        # the clients don't send anything: reading only detects the disconnection
+        closed = asyncio.ensure_future(reader.read())
+
+        if self._frame is not None:
+            client.push(self._frame)
+
+        ready = None
+
+        try:
+            while True:
+                ready = asyncio.ensure_future(client.ready.wait())
+                done, _ = await asyncio.wait({ready, closed}, return_when=asyncio.FIRST_COMPLETED)
+
+                if closed in done:
+                    break
+
+                client.ready.clear()
+                frame, client.pending = client.pending, None
+
+                writer.write(self._encode_for(client, frame))
+                # only this client waits for its socket to drain,
+                # the frames published meanwhile replace each other
+                await writer.drain()
+                client.sent += 1
+
+        except (ConnectionError, OSError):
+            pass
+
+        finally:
+            closed.cancel()
+            if ready is not None:
+                ready.cancel()
+
+            self.clients.remove(client)
+            self._handlers.discard(handler)
+            writer.close()
+
+    async def run(self, steps: Optional[int]=None):
+        '''
+        Step the system & publish its frames,  
+        `steps`: number of steps, None: until cancelled
+        '''
+        loop = asyncio.get_running_loop()
+        system = self.system
+
+        start_time = time.perf_counter()
+        start_sim = system.time
+        done = 0
+
+        while steps is None or done < steps:
+            n_steps = self.every if steps is None else min(self.every, steps - done)
+
+            if self.speed is not None:
+                # steps due by the elapsed real time
+                late = (time.perf_counter() - start_time) * self.speed - (system.time - start_sim)
+                due = int(late / system.dt)
+
+                if due < 1:
+                    await asyncio.sleep((system.dt - late) / self.speed)
+                    continue
+
+                if due > self.max_steps:
+                    # late time beyond max_steps is dropped
+                    start_time += (due - self.max_steps) * system.dt / self.speed
+
+                n_steps = min(n_steps, due, self.max_steps)
+
+            # the native steps release the GIL: the clients are served meanwhile
+            await loop.run_in_executor(None, system.run, n_steps)
+            done += n_steps
+
+            self._publish()
@@ -0,0 +1,176 @@
+'''
+Parameter sweep
+======
+Fan a grid of scenario parameters out over a pool of processes.
+
+The jobs are sent to the workers as record arrays of parameters,
+each worker generates its scenarios (see `Scenario.random`) and steps
+all of them in a single native `Ensemble` call: no particule is pickled
+and the startup cost is paid once per chunk of jobs.
+'''
+from concurrent.futures import ProcessPoolExecutor
+from itertools import product, repeat
+import os
+from typing import Dict, Optional, Sequence, Tuple
+import numpy as np
+
+from . import (
+    System, SystemMixed, System64,
+    Ensemble, EnsembleMixed, Ensemble64
+)
+from .cache import ResultCache, system_entry
+from .scenario import Scenario, DEFAULT_LIMITS
+
+# name: (dtype, default value)
+PARAMETERS = {
+    'n_particules': (np.int64, 100),
+    'n_fields': (np.int64, 0),
+    'charge_distribution': ('U16', 'uniform'),
+    'max_charge': (np.float64, 5.0),
+    'k': (np.float64, np.nan), # nan: default constant
+    'dt': (np.float64, 0.1),
+    'flag': (np.int64, System.FLAG_SUM),
+}
+
+PRECISIONS = {
+    'float32': (System, Ensemble),
+    'mixed': (SystemMixed, EnsembleMixed),
+    'float64': (System64, Ensemble64),
+}
+
+def make_jobs(grid: Dict[str, Sequence], repeats: int=1, seed: int=0) -> np.ndarray:
+    '''
+    Expand the grid into a record array of jobs, one per combination  
+    of parameters and repetition, each with its own seed.  
+    Missing parameters take their default value (see `PARAMETERS`).
+    '''
+    for name in grid:
+        if name not in PARAMETERS:
+            raise ValueError(f"Unknown parameter: {name}")
+
+    names = list(PARAMETERS)
+    values = [grid.get(name, [PARAMETERS[name][1]]) for name in names]
+    combinations = list(product(*values, range(repeats)))
+
+    dtype = [(name, PARAMETERS[name][0]) for name in names] + [('seed', np.int64)]
+    jobs = np.zeros(len(combinations), dtype=dtype)
+
+    for i, combination in enumerate(combinations):
+        jobs[i] = combination[:-1] + (seed + i,)
+
+    return jobs
+
+OBSERVABLES = ('n_particules', 'charge', 'mass', 'kinetic_energy', 'momentum')
+
+def run_jobs(jobs: np.ndarray, n_steps: int, precision: str='float32',
+        limits: Tuple[float]=DEFAULT_LIMITS, n_threads: int=1,
+        cache: Optional[ResultCache]=None) -> Dict[str, np.ndarray]:
+    '''
+    Generate & run the scenarios of the jobs in the current process,  
+    return the summaries of the final states (see `Ensemble.run`).  
+    Jobs found in the cache are not run.
+    '''
+    system_cls, ensemble_cls = PRECISIONS[precision]
+    ensemble = ensemble_cls()
+
+    entries = [None] * len(jobs)
+    keys = [None] * len(jobs)
+    pending = []
+
+    for i, job in enumerate(jobs):
+        k = float(job['k'])
+        scenario = Scenario.random(
+            int(job['n_particules']),
+            int(job['n_fields']),
+            max_charge=float(job['max_charge']),
+            charge_distribution=str(job['charge_distribution']),
+            limits=limits,
+            dt=float(job['dt']),
+            k=None if np.isnan(k) else k,
+            flag=int(job['flag']),
+            seed=int(job['seed']),
+        )
+        system = scenario.build(system_cls)
+
+        if cache is not None:
+            keys[i] = cache.system_key(system, n_steps)
+            entries[i] = cache.get(keys[i])
+
+            if entries[i] is not None:
+                continue
+
+        ensemble.add_system(system)
+        pending.append(i)
+
+    if len(pending) > 0:
+        ensemble.run(n_steps, n_threads)
+
+    for idx, i in enumerate(pending):
+        entries[i] = system_entry(ensemble[idx])
+
+        if cache is not None:
+            cache.put(keys[i], entries[i])
+
+    observables = {}
+    for name in OBSERVABLES:
+        observables[name] = np.array([entry[name] for entry in entries])
+    observables['momentum'] = observables['momentum'].reshape(-1, 2)
+
+    return observables
+
+def sweep(grid: Dict[str, Sequence], n_steps: int, *, repeats: int=1, seed: int=0,
+        precision: str='float32', limits: Tuple[float]=DEFAULT_LIMITS,
+        max_workers: Optional[int]=None, chunk_size: Optional[int]=None,
+        cache: Optional[ResultCache]=None) -> Dict[str, np.ndarray]:
+    '''
+    Run every combination of parameters of the grid for `n_steps` steps.  
+    Arguments
+    ---
+    `'grid' dict`: values taken by each parameter (see `PARAMETERS`)  
+    `'repeats' int`: number of random scenarios per combination  
+    `'seed' int`: seed of the first job, incremented for each job  
+    `'precision' str`: one of `PRECISIONS`  
+    `'max_workers' int`: number of processes, if 0, run in the current process  
+    `'chunk_size' int`: number of jobs sent at once to a worker  
+    `'cache' ResultCache`: if given, jobs already run are taken from the cache  
+    Return
+    ---
+    A columnar result, one row per job: one array per parameter (and `seed`)  
+    and per observable of the final state, prefixed by `final_`
+    '''
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown precision: {precision}")
+
+    jobs = make_jobs(grid, repeats, seed)
+
+    if max_workers == 0:
+        observables = run_jobs(jobs, n_steps, precision, limits, n_threads=0, cache=cache)
+    else:
+        if max_workers is None:
+            max_workers = os.cpu_count() or 1
+
+        if chunk_size is None:
+            chunk_size = max(1, len(jobs) // (4 * max_workers))
+
+        with ProcessPoolExecutor(max_workers) as pool:
+
+            chunks = [jobs[i:i+chunk_size] for i in range(0, len(jobs), chunk_size)]
+
+            results = list(pool.map(
+                run_jobs,
+                chunks,
+                repeat(n_steps),
+                repeat(precision),
+                repeat(limits),
+                repeat(1),
+                repeat(cache),
+            ))
+
+        observables = {
+            name: np.concatenate([result[name] for result in results])
+            for name in results[0]
+        }
+
+    columns = {name: jobs[name] for name in jobs.dtype.names}
+    columns.update({f"final_{name}": values for name, values in observables.items()})
+    return columns
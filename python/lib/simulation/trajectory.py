@@ -0,0 +1,457 @@
+'''
+Trajectory
+======
+Reader of the trajectory files recorded natively by `System.record`.
+
+The file is memory-mapped: the arrays of the frames are views
+of the file, no data is copied nor read before being accessed.
+Closed files end with an index of the frames, read without scanning the file,
+so any frame can be located directly by step or by time.
+
+With the `'quantized'` codec, the positions are quantized on the limits
+of the system and delta-encoded against the previous frame, each chunk is
+compressed with zlib: the chunks are decompressed & decoded as a whole,
+the last decoded chunks are kept in memory for sequential playback.
+'''
+from collections import OrderedDict
+from typing import List, Union
+import os, zlib
+import numpy as np
+
+MAGIC = b'PSIMTRAJ'
+CHUNK_MAGIC = b'CHNK'
+INDEX_MAGIC = b'INDX'
+TRAILER_MAGIC = b'PSIMIDX'
+VERSION = 2
+CODEC_RAW = 0
+CODEC_QUANTIZED = 1
+
+CODECS = {
+    'raw': CODEC_RAW,
+    'quantized': CODEC_QUANTIZED,
+}
+
+HEADER_DTYPE = np.dtype([
+    ('magic', 'S8'),
+    ('version', 'u4'),
+    ('header_size', 'u4'),
+    ('value_size', 'u4'),
+    ('codec', 'u4'),
+    ('every', 'u4'),
+    ('bits', 'u4'),
+    ('bounds', 'f8', (4,)),
+])
+
+CHUNK_DTYPE = np.dtype([
+    ('magic', 'S4'),
+    ('n_frames', 'u4'),
+    ('stored_size', 'u8'),
+    ('raw_size', 'u8'),
+])
+
+FRAME_DTYPE = np.dtype([
+    ('step', 'i8'),
+    ('time', 'f8'),
+    ('n', 'u8'),
+])
+
+INDEX_DTYPE = np.dtype([
+    ('magic', 'S4'),
+    ('reserved', 'u4'),
+    ('n_entries', 'u8'),
+])
+
+ENTRY_DTYPE = np.dtype([
+    ('step', 'i8'),
+    ('time', 'f8'),
+    ('n', 'u8'),
+    ('chunk_offset', 'u8'),
+    ('frame_offset', 'u8'),
+])
+
+TRAILER_DTYPE = np.dtype([
+    ('index_offset', 'u8'),
+    ('magic', 'S8'),
+])
+
+def _padded(size: int) -> int:
+    return (size + 7) // 8 * 8
+
+class Frame:
+    '''
+    Frame of a trajectory
+    ===
+    Attributes
+    ---
+    `'step' int`: step of the system  
+    `'time' float`: simulated time  
+    `'ids' array (n,)`: ids of the particules  
+    `'pos' array (n, 2)`: positions of the particules  
+    `'v' array (n, 2)`: speeds of the particules  
+    `'q' array (n,)`: charges of the particules  
+    `'m' array (n,)`: masses of the particules  
+    '''
+    __slots__ = ('step', 'time', 'ids', 'pos', 'v', 'q', 'm')
+
+    def __init__(self, step: int, time: float, ids: np.ndarray, pos: np.ndarray,
+            v: np.ndarray, q: np.ndarray, m: np.ndarray):
+        self.step = step
+        self.time = time
+        self.ids = ids
+        self.pos = pos
+        self.v = v
+        self.q = q
+        self.m = m
+
+    @property
+    def n_particules(self) -> int:
+        return len(self.ids)
+
+class TrajectoryReader:
+    '''
+    Trajectory reader
+    ===
+    Arguments
+    ---
+    `'path' str`: the trajectory file, may still be being recorded:  
+    only the frames written to the disk are read
+    Attributes
+    ---
+    `'steps' array`: step of each frame  
+    `'times' array`: simulated time of each frame  
+    `'counts' array`: number of particules of each frame  
+    `'every' int`: number of steps between two frames  
+    `'bounds' tuple`: limits of the system (min x, max x, min y, max y)  
+    `'codec' str`: one of `CODECS`  
+    `'max_error' array (2,)`: maximal error of the positions on each axis,  
+    for the particules inside the limits  
+    '''
+    N_CACHED_CHUNKS = 4
+
+    def __init__(self, path: str):
+        self.path = os.fspath(path)
+        self._data = np.memmap(self.path, dtype=np.uint8, mode='r')
+
+        if len(self._data) < HEADER_DTYPE.itemsize:
+            raise ValueError(f"Not a trajectory file: {self.path}")
+
+        header = self._data[:HEADER_DTYPE.itemsize].view(HEADER_DTYPE)[0]
+
+        if header['magic'] != MAGIC:
+            raise ValueError(f"Not a trajectory file: {self.path}")
+
+        if header['version'] > VERSION:
+            raise ValueError(f"Unsupported trajectory version: {header['version']}")
+
+        if header['codec'] not in CODECS.values():
+            raise ValueError(f"Unsupported trajectory codec: {header['codec']}")
+
+        self.dtype = np.dtype(f"f{header['value_size']}")
+        self.every = int(header['every'])
+        self.bounds = tuple(header['bounds'])
+        self._header_size = int(header['header_size'])
+        self._codec = int(header['codec'])
+        self._chunks = OrderedDict() # chunk offset: decoded frames
+
+        if self._codec == CODEC_QUANTIZED:
+            levels = (1 << int(header['bits'])) - 1
+            self._origin = np.array(self.bounds[::2], dtype=np.float64)
+            self._quantum = (np.array(self.bounds[1::2], dtype=np.float64) - self._origin) / levels
+        else:
+            self._quantum = np.zeros(2)
+
+        if not self._read_index():
+            self._scan()
+
+    @property
+    def codec(self) -> str:
+        return next(name for name, codec in CODECS.items() if codec == self._codec)
+
+    @property
+    def max_error(self) -> np.ndarray:
+        return self._quantum / 2
+
+    def _get_frame_size(self, n: int) -> int:
+        '''Return the size in bytes of a frame of n particules'''
+        value_size = self.dtype.itemsize
+        pos_size = 4 if self._codec == CODEC_QUANTIZED else value_size
+        return (
+            FRAME_DTYPE.itemsize
+            + 8 * n
+            + 2 * n * pos_size
+            + 2 * n * value_size
+            + 2 * _padded(n * value_size)
+        )
+
+    def _read_index(self) -> bool:
+        '''
+        Read the index at the end of the file, return if there is one
+        '''
+        size = len(self._data)
+
+        if size < self._header_size + INDEX_DTYPE.itemsize + TRAILER_DTYPE.itemsize:
+            return False
+
+        trailer = self._data[size-TRAILER_DTYPE.itemsize:].view(TRAILER_DTYPE)[0]
+
+        if trailer['magic'] != TRAILER_MAGIC:
+            return False
+
+        offset = int(trailer['index_offset'])
+        index = self._data[offset:offset+INDEX_DTYPE.itemsize].view(INDEX_DTYPE)[0]
+
+        if index['magic'] != INDEX_MAGIC:
+            return False
+
+        offset += INDEX_DTYPE.itemsize
+        entries = self._view(offset, int(index['n_entries']), ENTRY_DTYPE, (-1,))
+
+        self.steps = entries['step']
+        self.times = entries['time']
+        self.counts = entries['n'].astype(np.int64)
+        self._chunk_offsets = entries['chunk_offset'].astype(np.int64)
+        self._frame_offsets = entries['frame_offset'].astype(np.int64)
+        return True
+
+    def _scan(self):
+        '''
+        Scan the headers of the chunks & frames to locate every frame,
+        used when the file has no index (still being recorded)
+        '''
+        steps, times, counts, chunk_offsets, frame_offsets = [], [], [], [], []
+
+        offset = self._header_size
+        size = len(self._data)
+
+        while offset + CHUNK_DTYPE.itemsize <= size:
+            chunk = self._data[offset:offset+CHUNK_DTYPE.itemsize].view(CHUNK_DTYPE)[0]
+            start = offset + CHUNK_DTYPE.itemsize
+            end = start + int(chunk['stored_size'])
+
+            # partially written chunk
+            if chunk['magic'] != CHUNK_MAGIC or end > size:
+                break
+
+            payload = self._get_payload(offset)
+
+            frame_offset = 0
+            for _ in range(chunk['n_frames']):
+                frame = payload[frame_offset:frame_offset+FRAME_DTYPE.itemsize].view(FRAME_DTYPE)[0]
+                steps.append(frame['step'])
+                times.append(frame['time'])
+                counts.append(frame['n'])
+                chunk_offsets.append(offset)
+                frame_offsets.append(frame_offset)
+                frame_offset += self._get_frame_size(int(frame['n']))
+
+            offset = start + _padded(int(chunk['stored_size']))
+
+        self.steps = np.array(steps, dtype=np.int64)
+        self.times = np.array(times, dtype=np.float64)
+        self.counts = np.array(counts, dtype=np.int64)
+        self._chunk_offsets = np.array(chunk_offsets, dtype=np.int64)
+        self._frame_offsets = np.array(frame_offsets, dtype=np.int64)
+
+    def _get_payload(self, offset: int) -> np.ndarray:
+        '''
+        Return the raw payload of the chunk at offset (in the file),
+        a view of the file unless it is compressed
+        '''
+        chunk = self._data[offset:offset+CHUNK_DTYPE.itemsize].view(CHUNK_DTYPE)[0]
+        start = offset + CHUNK_DTYPE.itemsize
+        payload = self._data[start:start+int(chunk['stored_size'])]
+
+        if self._codec == CODEC_RAW:
+            return payload
+
+        return np.frombuffer(zlib.decompress(payload), dtype=np.uint8)
+
+    def __len__(self) -> int:
+        return len(self._frame_offsets)
+
+    def __getitem__(self, idx: Union[int, slice]) -> Union[Frame, List[Frame]]:
+        if isinstance(idx, slice):
+            return [self.frame(i) for i in range(*idx.indices(len(self)))]
+        return self.frame(idx)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.frame(i)
+
+    def _view(self, offset: int, n: int, dtype: np.dtype, shape, data=None) -> np.ndarray:
+        '''Return a view of n values of the file (or of data), starting at offset'''
+        if data is None:
+            data = self._data
+        return data[offset:offset + n * dtype.itemsize].view(dtype).reshape(shape)
+
+    def _read_frame(self, data: np.ndarray, offset: int, n: int, pos_dtype: np.dtype):
+        '''
+        Return the views of the blocks (ids, pos, v, q, m) of the frame at offset
+        '''
+        value_size = self.dtype.itemsize
+        offset += FRAME_DTYPE.itemsize
+
+        ids = self._view(offset, n, np.dtype(np.int64), (n,), data)
+        offset += 8 * n
+        pos = self._view(offset, 2*n, pos_dtype, (n, 2), data)
+        offset += 2 * n * pos_dtype.itemsize
+        v = self._view(offset, 2*n, self.dtype, (n, 2), data)
+        offset += 2 * n * value_size
+        q = self._view(offset, n, self.dtype, (n,), data)
+        offset += _padded(n * value_size)
+        m = self._view(offset, n, self.dtype, (n,), data)
+
+        return ids, pos, v, q, m
+
+    def _decode_chunk(self, chunk_offset: int) -> List[Frame]:
+        '''
+        Decompress & decode all the frames of a quantized chunk,
+        keep the last decoded chunks in memory
+        '''
+        frames = self._chunks.get(chunk_offset)
+        if frames is not None:
+            self._chunks.move_to_end(chunk_offset)
+            return frames
+
+        payload = self._get_payload(chunk_offset)
+        chunk = self._data[chunk_offset:chunk_offset+CHUNK_DTYPE.itemsize].view(CHUNK_DTYPE)[0]
+
+        frames = []
+        previous_ids, previous_pos = None, None
+        offset = 0
+
+        for _ in range(chunk['n_frames']):
+            header = payload[offset:offset+FRAME_DTYPE.itemsize].view(FRAME_DTYPE)[0]
+            n = int(header['n'])
+            id_deltas, pos, v, q, m = self._read_frame(payload, offset, n, np.dtype(np.int32))
+
+            ids = np.cumsum(id_deltas)
+            pos = pos.copy()
+
+            # positions of the particules already in the previous frame are deltas,
+            # computed modulo 2^32 (as the writer)
+            if previous_ids is not None and len(previous_ids) > 0:
+                if np.array_equal(ids, previous_ids):
+                    pos += previous_pos
+                else:
+                    order = np.argsort(previous_ids, kind='stable')
+                    sorted_ids = previous_ids[order]
+                    idx = np.minimum(np.searchsorted(sorted_ids, ids), len(sorted_ids) - 1)
+                    found = sorted_ids[idx] == ids
+                    pos[found] += previous_pos[order[idx[found]]]
+
+            frames.append(Frame(
+                int(header['step']),
+                float(header['time']),
+                ids,
+                self._origin + pos * self._quantum,
+                v, q, m,
+            ))
+
+            previous_ids, previous_pos = ids, pos
+            offset += self._get_frame_size(n)
+
+        self._chunks[chunk_offset] = frames
+        while len(self._chunks) > self.N_CACHED_CHUNKS:
+            self._chunks.popitem(last=False)
+
+        return frames
+
+    def frame(self, idx: int) -> Frame:
+        '''
+        Return the frame at index `idx`, with the raw codec, its arrays are views of the file
+        '''
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError("frame index out of range")
+
+        chunk_offset = int(self._chunk_offsets[idx])
+
+        if self._codec == CODEC_QUANTIZED:
+            # index of the frame in its chunk
+            first = int(np.searchsorted(self._chunk_offsets, chunk_offset))
+            return self._decode_chunk(chunk_offset)[idx - first]
+
+        offset = chunk_offset + CHUNK_DTYPE.itemsize + int(self._frame_offsets[idx])
+        ids, pos, v, q, m = self._read_frame(self._data, offset, int(self.counts[idx]), self.dtype)
+
+        return Frame(int(self.steps[idx]), float(self.times[idx]), ids, pos, v, q, m)
+
+    def find_step(self, step: int) -> int:
+        '''
+        Return the index of the last frame recorded at or before `step`,  
+        computed from the spacing of the frames (`every`): O(1), unless the frames
+        aren't regularly spaced (restarted recording): binary search
+        '''
+        if len(self) == 0:
+            raise IndexError("empty trajectory")
+
+        guess = (step - int(self.steps[0])) // self.every
+        return self._locate(self.steps, step, guess)
+
+    def find_time(self, time: float) -> int:
+        '''
+        Return the index of the last frame recorded at or before `time`,  
+        computed from the spacing of the frames (`every` steps of the recorded dt):
+        O(1), unless the frames aren't regularly spaced: binary search
+        '''
+        if len(self) == 0:
+            raise IndexError("empty trajectory")
+
+        steps = int(self.steps[-1] - self.steps[0])
+        duration = float(self.times[-1] - self.times[0])
+
+        if steps > 0 and duration > 0:
+            dt = duration / steps
+            guess = int(np.floor((time - self.times[0]) / (dt * self.every)))
+        else:
+            guess = 0
+
+        return self._locate(self.times, time, guess)
+
+    @staticmethod
+    def _locate(values: np.ndarray, value, guess: int) -> int:
+        '''
+        Return the index of the last of the sorted `values` at or before `value` (0 if none),  
+        the guessed index & its neighbours (rounding) are checked first, then binary search
+        '''
+        n = len(values)
+        guess = min(max(guess, 0), n - 1)
+
+        for idx in (guess, guess - 1, guess + 1):
+            if 0 <= idx < n \
+                    and (idx == 0 or values[idx] <= value) \
+                    and (idx == n - 1 or values[idx + 1] > value):
+                return idx
+
+        idx = int(np.searchsorted(values, value, side='right')) - 1
+        return max(0, idx)
+
+    def at_step(self, step: int) -> Frame:
+        '''Return the last frame recorded at or before `step`'''
+        return self.frame(self.find_step(step))
+
+    def at_time(self, time: float) -> Frame:
+        '''Return the last frame recorded at or before `time`'''
+        return self.frame(self.find_time(time))
+
+    def positions(self, start: int=0, stop: int=None) -> List[np.ndarray]:
+        '''
+        Return the positions of the frames in [start, stop[, as views of the file
+        '''
+        return [frame.pos for frame in self[start:stop]]
+
+    def close(self):
+        '''
+        Release the memory map of the reader,
+        it is unmapped once the returned views are deleted
+        '''
+        self._data = None
+        self._chunks.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,182 @@
+'''
+Worker
+======
+Step a system continuously on a background thread.
+
+The native steps release the GIL: the thread calling the worker
+(typically the GUI one) keeps running while the physics is computed.
+
+After each batch of steps, the worker publishes a snapshot of the state
+(ids, positions, charges, masses) by replacing a single reference.
+A published snapshot is never modified: readers take the latest one
+without any lock while the worker fills the next one, so at most three
+are alive at once (published, being read, being written).
+Modifications of the system must be done in `worker.edit()`.
+'''
+from contextlib import contextmanager
+from typing import Optional
+import threading, time
+import numpy as np
+
+class Snapshot:
+    '''
+    State of the system after a step
+    ===
+    Attributes
+    ---
+    `'step' int`: step of the system  
+    `'time' float`: simulated time  
+    `'ids' array (n,)`: ids of the particules  
+    `'pos' array (n, 2)`: positions of the particules  
+    `'q' array (n,)`: charges of the particules  
+    `'m' array (n,)`: masses of the particules  
+    '''
+    __slots__ = ('step', 'time', 'ids', 'pos', 'q', 'm')
+
+    def __init__(self, system):
+        self.step = system.step
+        self.time = system.time
+        self.ids = system.ids()
+        self.pos = system.positions()
+        self.q = system.charges()
+        self.m = system.masses()
+
+        for array in (self.ids, self.pos, self.q, self.m):
+            array.flags.writeable = False
+
+    @property
+    def n_particules(self) -> int:
+        return len(self.ids)
+
+class SimulationWorker:
+    '''
+    Simulation worker
+    ===
+    Arguments
+    ---
+    `'system' System`: the stepped system, only accessed by the worker once started  
+    `'speed' float`: simulated seconds per real second (positive),  
+    if None, step as fast as possible  
+    `'max_steps' int`: maximal number of steps of a batch (see `FixedStepper`)  
+    `'batch_time' float`: duration (s) of a batch when `speed` is None,  
+    edits wait at most about this long  
+    Attributes
+    ---
+    `'snapshot' Snapshot`: latest published state, read without lock  
+    `'steps_per_s' float`: steps per second the worker can run (measured step time)  
+    '''
+
+    def __init__(self, system, speed: Optional[float]=1.0, max_steps: int=1000,
+            batch_time: float=0.005):
+        if speed is not None and not speed > 0:
+            raise ValueError(f"The speed must be positive or None, not {speed}")
+
+        self.system = system
+        self.speed = speed
+        self.max_steps = max_steps
+        self.batch_time = batch_time
+        self.steps_per_s = 0.0
+
+        self._lock = threading.Lock()
+        self._running = threading.Event()
+        self._stopped = False
+        self._thread = None
+
+        self._accumulator = 0.0
+        self._last_time = None
+        self._step_time = None
+
+        self.snapshot = Snapshot(system)
+
+    @property
+    def paused(self) -> bool:
+        return not self._running.is_set()
+
+    def start(self):
+        '''Start stepping the system'''
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, daemon=True)
+            self._thread.start()
+
+        self._last_time = None
+        self._running.set()
+
+    def pause(self):
+        '''Stop stepping the system, until `start` is called'''
+        self._running.clear()
+
+    def stop(self):
+        '''Stop the thread'''
+        self._stopped = True
+        self._running.set()
+
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+        self._running.clear()
+        self._stopped = False
+
+    @contextmanager
+    def edit(self):
+        '''
+        Context in which the system can be modified,  
+        a new snapshot is published afterwards
+        '''
+        with self._lock:
+            yield self.system
+            self.snapshot = Snapshot(self.system)
+
+    def _get_n_steps(self) -> int:
+        '''Return the number of steps of the next batch'''
+        if self.speed is None:
+            if self._step_time is None:
+                return 1
+            return int(min(self.max_steps, max(1, self.batch_time / self._step_time)))
+
+        now = time.perf_counter()
+        if self._last_time is not None:
+            self._accumulator += (now - self._last_time) * self.speed
+        self._last_time = now
+
+        dt = self.system.dt
+        n_steps = int(self._accumulator / dt)
+
+        # late time beyond max_steps is dropped
+        if n_steps > self.max_steps:
+            n_steps = self.max_steps
+            self._accumulator = n_steps * dt
+
+        self._accumulator -= n_steps * dt
+        return n_steps
+
+    def _loop(self):
+        while True:
+            self._running.wait()
+            if self._stopped:
+                return
+
+            n_steps = self._get_n_steps()
+
+            if n_steps == 0:
+                # wait for the next step to be due
+                time.sleep((self.system.dt - self._accumulator) / self.speed)
+                continue
+
+            start = time.perf_counter()
+
+            with self._lock:
+                # releases the GIL
+                self.system.run(n_steps)
+                snapshot = Snapshot(self.system)
+
+            # publish: a single reference assignment, atomic for the readers
+            self.snapshot = snapshot
+
+            step_time = (time.perf_counter() - start) / n_steps
+            if self._step_time is None:
+                self._step_time = step_time
+            else:
+                self._step_time += 0.1 * (step_time - self._step_time)
+
+            self.steps_per_s = 1 / max(self._step_time, 1e-9)
@@ -1,8 +1,25 @@
+import argparse
+
+parser = argparse.ArgumentParser(description="Particules simulation")
+parser.add_argument('trajectory', nargs='?', help="replay a recorded trajectory")
+parser.add_argument('--speed', default='1',
+    help="simulated seconds per second, 'max': as many steps as the frames allow")
+parser.add_argument('--trace', metavar='PATH',
+    help="record the phases of the frames, write them as a Chrome trace at exit")
+parser.add_argument('--threaded', action='store_true',
+    help="step the simulation on a background thread, independently of the frames")
+parser.add_argument('--attach', metavar='NAME',
+    help="view a simulation server: python -m lib.simulation --serve NAME")
+args = parser.parse_args()
+
 from lib.plougame import Interface, Specifications
 
 Interface.setup((3200, 1600), "Simulation")
 FPS = 60
 
+if args.trace is not None:
+    Interface.enable_timeline()
+
 from lib.simulation import System, Particule, MagneticField
 import numpy as np
 import pygame, time
@@ -19,14 +36,39 @@ system.set_limits(
     Consts.MAX_Y
 )
 
-app = App(system)
+app = App(
+    system,
+    speed=None if args.speed == 'max' else float(args.speed),
+    threaded=args.threaded,
+    attach=args.attach,
+)
+
+# the served simulation is displayed live
+if args.attach is not None:
+    app.change_pause_state()
+
+# replay a recorded trajectory: python main.py run.traj
+if args.trajectory is not None:
+    app.start_replay(args.trajectory)
 
 while Interface.running:
     
     pressed, events = Interface.run()
 
-    if not app.paused:
-        app.update_system()
+    with Interface.phase('update'):
+        if not app.paused:
+            app.update_system()
     
-    app.react_events(pressed, events)
-    app.display()
\ No newline at end of file
+    with Interface.phase('events'):
+        app.react_events(pressed, events)
+
+    with Interface.phase('draw'):
+        app.display()
+
+if app.worker is not None:
+    app.worker.stop()
+
+app.detach()
+
+if args.trace is not None:
+    Interface.export_timeline(args.trace)
\ No newline at end of file
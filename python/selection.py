@@ -0,0 +1,108 @@
+from lib.plougame import Interface
+from lib.simulation import SpatialIndex
+import numpy as np
+import pygame
+
+class Selection:
+    '''
+    Selection of particules, by click or box on the screen.
+
+    The selected particules are stored by id: the selection follows them
+    from step to step, merged or removed particules leave it.  
+    The picking queries the spatial index of the system, maintained lazily
+    (see `System.query_rect`), in simulation coordinates. The frames without
+    a system (worker, replay, server) are indexed on each click/box (O(n), native).
+
+    Methods
+    ---
+    `start_drag`: Start a click or a box, at a screen position  
+    `end_drag`: End the click/box, select the particules under it  
+    `get_mask`: Return which particules are selected  
+    `display`: Highlight the selected particules, display the box being dragged
+    '''
+    CLICK_DISTANCE = 6 # px, below: click, above: box
+    MAX_HIGHLIGHTS = 5000
+    C_HIGHLIGHT = (255, 200, 0)
+    C_BOX = (80, 80, 80)
+
+    def __init__(self):
+        self.ids = np.empty(0, dtype=np.int64)
+        self._drag_start = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def clear(self):
+        self.ids = np.empty(0, dtype=np.int64)
+        self._drag_start = None
+
+    @property
+    def is_dragging(self) -> bool:
+        return self._drag_start is not None
+
+    def start_drag(self, pos):
+        self._drag_start = tuple(pos)
+
+    def cancel_drag(self):
+        self._drag_start = None
+
+    def end_drag(self, pos, camera, radius: float, system=None, ids: np.ndarray=None,
+            positions: np.ndarray=None, add: bool=False):
+        '''
+        End the click/box at the screen position `pos`,  
+        `camera`: the camera of the display (see `Camera`)  
+        `radius`: maximal distance (px) of a clicked particule  
+        `system`: the displayed system, queried through its index, or None:  
+        `ids`, `positions`: ids & simulation positions of the displayed particules  
+        `add`: add to the current selection instead of replacing it
+        '''
+        is_click = max(abs(pos[0] - self._drag_start[0]), abs(pos[1] - self._drag_start[1])) < self.CLICK_DISTANCE
+
+        (x0, y0), (x1, y1) = camera.screen_to_world([self._drag_start, pos])
+        rect = (min(x0, x1), max(x0, x1), min(y0, y1), max(y0, y1))
+        radius = radius / camera.get_scale()
+        self._drag_start = None
+
+        if system is not None:
+            if is_click:
+                found, distances = system.nearest(x1, y1, 1, ids=True)
+                selected = found[distances <= radius]
+            else:
+                selected = system.query_rect(*rect, ids=True)
+
+        elif len(ids) == 0:
+            selected = np.empty(0, dtype=np.int64)
+        else:
+            index = SpatialIndex(positions)
+
+            if is_click:
+                indices, distances = index.nearest(x1, y1, 1)
+                selected = ids[indices[distances <= radius]]
+            else:
+                selected = ids[index.query_rect(*rect)]
+
+        if add:
+            self.ids = np.union1d(self.ids, selected)
+        else:
+            self.ids = np.unique(selected)
+
+    def get_mask(self, ids: np.ndarray) -> np.ndarray:
+        '''Return which of the particules of `ids` are selected'''
+        if len(self.ids) == 0:
+            return np.zeros(len(ids), dtype=bool)
+        return np.isin(ids, self.ids, assume_unique=True)
+
+    def display(self, ids: np.ndarray, screen_pos: np.ndarray, radius: float):
+        '''
+        Circle the selected particules, at most `MAX_HIGHLIGHTS`
+        '''
+        if len(self.ids) > 0 and len(ids) > 0:
+            selected = screen_pos[self.get_mask(ids)][:self.MAX_HIGHLIGHTS]
+
+            for x, y in selected.tolist():
+                pygame.draw.circle(Interface.screen, self.C_HIGHLIGHT, (x, y), radius, 2)
+
+        if self._drag_start is not None:
+            (x0, y0), (x1, y1) = self._drag_start, pygame.mouse.get_pos()
+            rect = pygame.Rect(min(x0, x1), min(y0, y1), abs(x1 - x0), abs(y1 - y0))
+            pygame.draw.rect(Interface.screen, self.C_BOX, rect, 1)
@@ -1,5 +1,25 @@
 import unittest
 import lib.simulation._simulation as simul
+from lib.simulation.scenario import Scenario
+from lib.simulation.sweep import sweep
+from lib.simulation import System, System64, Ensemble, Ensemble64, ResultCache, SpatialIndex, potential_grid
+from lib.simulation.trajectory import TrajectoryReader
+from lib.simulation.replay import TrajectoryPlayer
+from lib.simulation.stepper import FixedStepper
+from lib.simulation.worker import SimulationWorker
+from lib.simulation.shared import SharedFrameBuffer, SharedFrameReader, serve
+from lib.simulation.stream import StreamServer, read_frames
+from lib.simulation.__main__ import main as run_headless
+from lib.plougame import Interface, Dimension, Page, C
+import lib.plougame.components as cmps
+from camera import Camera
+from selection import Selection
+from gui import DensityRaster, FieldLayer, PotentialHeatmap
+from app import App
+from config import Consts
+import asyncio, os, tempfile, time, pygame
+from unittest import mock
+import numpy as np
 
 class TestSimul(unittest.TestCase):
 
@@ -79,5 +99,873 @@ class TestSimul(unittest.TestCase):
         p = system.particules[0]
         self.assertEqual(p.pos, [0,0])
 
+        # the acceleration is the one of the last update: a value set isn't applied
+        p.a = [5, 0]
+        system.update()
+        p = system.particules[0]
+        self.assertEqual(p.v, [0, 0])
+        self.assertEqual(p.a, [0, 0])
+
+        # same for the arrays: the accelerations are restored, then overwritten
+        system.set_particules(np.zeros((1, 2)), np.ones(1), np.ones(1), a=np.array([[5, 0]]))
+        self.assertEqual(system.accelerations().tolist(), [[5, 0]])
+        system.update()
+        self.assertEqual(system.velocities().tolist(), [[0, 0]])
+        self.assertEqual(system.accelerations().tolist(), [[0, 0]])
+
+    def test_precision(self):
+
+        particules = [
+            simul.Particule(0,0,1,1),
+            simul.Particule(0,1,1,1),
+        ]
+
+        self.assertIs(simul.System, simul.System32)
+
+        for cls in (simul.System32, simul.SystemMixed, simul.System64):
+            # float32 particules are converted to the system precision
+            system = cls(particules, 1)
+            system.constants.k = 1
+            system.update()
+
+            y_coords = sorted(p.pos[1] for p in system.particules)
+            self.assertAlmostEqual(y_coords[0], -1, places=5)
+            self.assertAlmostEqual(y_coords[1], 2, places=5)
+
+        self.assertEqual(simul.SystemMixed.dtype, "float32")
+        self.assertEqual(simul.SystemMixed.accumulator_dtype, "float64")
+
+        # float64 keeps precision beyond float32
+        p = simul.Particule64(0.1, 0, 1, 1)
+        self.assertEqual(p.pos[0], 0.1)
+
+    def test_ensemble(self):
+
+        ensemble = simul.Ensemble()
+
+        for i in range(5):
+            system = simul.System([
+                simul.Particule(0,0,1,1),
+                simul.Particule(0,1,1,1),
+            ], 1)
+            system.constants.k = 1
+            ensemble.add_system(system)
+
+        self.assertEqual(len(ensemble), 5)
+
+        summaries = ensemble.run(1, 2)
+        ensemble_pos = ensemble[0].particules[0].pos
+
+        self.assertEqual(list(summaries['n_particules']), [2] * 5)
+        self.assertAlmostEqual(summaries['kinetic_energy'][0], 1, places=5)
+
+        # same result as stepping the system alone
+        system.run(1)
+        self.assertEqual(ensemble[4].particules[0].pos, system.particules[0].pos)
+        self.assertEqual(system.summary()['n_particules'], 2)
+
+        # a system held in python is a copy: it outlives the growth & the clearing of the ensemble
+        first = ensemble[0]
+        for i in range(100):
+            ensemble.add_system(system)
+        ensemble.clear_systems()
+        self.assertEqual(first.n_particules, 2)
+        self.assertEqual(first.particules[0].pos, ensemble_pos)
+
+        # the python ensembles return the python systems
+        for ensemble_type, system_type in ((Ensemble, System), (Ensemble64, System64)):
+            ensemble = ensemble_type()
+            ensemble.add_system(system_type([], 0.1))
+            copy = ensemble[-1]
+            self.assertIsInstance(copy, system_type)
+            self.assertEqual(copy.dt, ensemble[0].dt)
+            copy.add_particules(np.zeros((3, 2)), np.ones(3), np.ones(3))
+            self.assertEqual(ensemble[0].n_particules, 0)
+
+    def test_stats(self):
+
+        system = System([
+            simul.Particule(0,0,1,1),
+            simul.Particule(0,1,1,1),
+            simul.Particule(0,5,1,1),
+        ], 1)
+        system.add_magnetic_field(simul.MagneticField(0, 0, 1, 1))
+        system.run(2)
+
+        stats = system.stats()
+        self.assertEqual(stats['steps'], 2)
+        self.assertEqual(stats['pair_interactions'], 6)
+        self.assertEqual(stats['field_interactions'], 6)
+        self.assertGreater(stats['pairs_ns'], 0)
+
+        system.reset_stats()
+        self.assertEqual(system.stats()['pair_interactions'], 0)
+
+    def test_sweep(self):
+
+        scenario = Scenario.random(50, 2, seed=1)
+        system = scenario.build()
+
+        self.assertEqual(system.n_particules, 50)
+        self.assertEqual(len(system.magnetic_fields), 2)
+
+        with self.assertRaises(ValueError):
+            Scenario.random(101, limits=(0, 10, 0, 10))
+
+        grid = {'n_particules': [10, 20], 'k': [1, 2]}
+
+        serial = sweep(grid, 5, repeats=2, max_workers=0)
+        parallel = sweep(grid, 5, repeats=2, max_workers=2)
+
+        self.assertEqual(len(serial['seed']), 8)
+        self.assertEqual(list(serial['n_particules'][:4]), [10, 10, 10, 10])
+        self.assertTrue(all(serial['final_n_particules'] <= serial['n_particules']))
+
+        for name in serial:
+            self.assertTrue((serial[name] == parallel[name]).all())
+
+    def test_cache(self):
+
+        with tempfile.TemporaryDirectory() as path:
+            cache = ResultCache(path)
+
+            scenario = Scenario.random(30, 2, seed=3, k=1)
+
+            system = scenario.build()
+            key = cache.system_key(system, 10)
+            system.run(10, cache=cache)
+
+            self.assertIn(key, cache)
+
+            # same run -> restored from the cache
+            cached = scenario.build()
+            cached.run(10, cache=cache)
+            self.assertTrue((cached.positions() == system.positions()).all())
+            self.assertTrue((cached.velocities() == system.velocities()).all())
+
+            # invalid arrays: the particules are kept
+            with self.assertRaises(ValueError):
+                cached.set_particules(np.zeros((5, 2)), np.ones(5), np.ones(4))
+            self.assertTrue((cached.positions() == system.positions()).all())
+
+            # different run -> different key
+            self.assertNotEqual(key, cache.system_key(scenario.build(), 11))
+            self.assertNotEqual(key, cache.system_key(scenario.build(), 10, dt=0.2))
+
+            # sweep jobs are cached
+            grid = {'n_particules': [10, 20]}
+            first = sweep(grid, 5, max_workers=0, cache=cache)
+            second = sweep(grid, 5, max_workers=0, cache=cache)
+            self.assertTrue((first['final_kinetic_energy'] == second['final_kinetic_energy']).all())
+
+            # eviction, once the tracked size exceeds max_bytes: the oldest entry
+            self.assertEqual(cache._size, cache.size)
+            n_entries = len(os.listdir(path))
+            cache.max_bytes = cache.size + 1
+            system.run(1, cache=cache)
+            self.assertNotIn(key, cache)
+            self.assertEqual(len(os.listdir(path)), n_entries)
+            self.assertEqual(cache._size, cache.size)
+            cache.max_bytes = 0
+            cache.evict()
+            self.assertEqual(cache.size, 0)
+
+            # a recording system steps & records, even if the run is cached
+            system = scenario.build()
+            system.run(10, cache=cache)
+            recorded = scenario.build()
+            recorded.record(os.path.join(path, 'run.traj'))
+            recorded.run(10, cache=cache)
+            recorded.stop_recording()
+            self.assertEqual(recorded.stats()['steps'], 10)
+            self.assertEqual(len(TrajectoryReader(os.path.join(path, 'run.traj'))), 11)
+
+    def test_checkpoint(self):
+
+        system = Scenario.random(40, 3, seed=5, k=1).build()
+        system.run(3)
+
+        with tempfile.TemporaryDirectory() as path:
+            path = path + '/system.ckpt'
+            system.save(path)
+
+            restored = System.load(path)
+
+            self.assertIsInstance(restored, System)
+            self.assertEqual(restored.n_particules, system.n_particules)
+            self.assertTrue((restored.positions() == system.positions()).all())
+            self.assertTrue((restored.velocities() == system.velocities()).all())
+            self.assertTrue((restored.charges() == system.charges()).all())
+            self.assertEqual(restored.limits, system.limits)
+            self.assertEqual(restored.dt, system.dt)
+            self.assertEqual(restored.constants.k, 1)
+            self.assertEqual(len(restored.magnetic_fields), 3)
+            self.assertTrue((restored.ids() == system.ids()).all())
+            self.assertEqual(restored.step, 3)
+
+            # the restored system evolves as the original one
+            system.run(2)
+            restored.run(2)
+            self.assertTrue((restored.positions() == system.positions()).all())
+
+            # loading in another precision
+            restored = System64.load(path)
+            self.assertEqual(restored.n_particules, system.n_particules)
+            self.assertTrue(np.allclose(restored.positions(), System.load(path).positions()))
+
+            # truncated files are rejected before any allocation
+            with open(path, 'rb') as file:
+                data = file.read()
+
+            for size in (30, 60, 90, len(data) - 1):
+                with open(path, 'wb') as file:
+                    file.write(data[:size])
+                with self.assertRaises(RuntimeError):
+                    System.load(path)
+
+            with open(path, 'wb') as file:
+                file.write(b'not a checkpoint')
+
+            with self.assertRaises(RuntimeError):
+                System.load(path)
+
+    def test_trajectory(self):
+
+        system = Scenario.random(40, 0, seed=7, k=1, dt=0.01).build()
+
+        with tempfile.TemporaryDirectory() as path:
+            path = path + '/run.traj'
+            system.record(path, every=2, chunk_frames=4)
+            system.run(10)
+
+            # only complete chunks are visible while recording
+            self.assertEqual(len(TrajectoryReader(path)), 4)
+
+            system.stop_recording()
+            reader = TrajectoryReader(path)
+
+            self.assertEqual(list(reader.steps), [0, 2, 4, 6, 8, 10])
+            self.assertAlmostEqual(reader.times[-1], 0.1, places=5)
+
+            frame = reader[-1]
+            self.assertTrue((frame.pos == system.positions()).all())
+            self.assertTrue((frame.v == system.velocities()).all())
+            self.assertTrue((frame.ids == system.ids()).all())
+            self.assertTrue((frame.q == system.charges()).all())
+
+            # views of the file
+            self.assertIsInstance(frame.pos.base, np.memmap)
+            self.assertEqual(len(reader.positions(1, 4)), 3)
+
+    def test_trajectory_index(self):
+
+        system = Scenario.random(20, 0, seed=8, k=1, dt=0.5).build()
+
+        with tempfile.TemporaryDirectory() as path:
+            path = path + '/run.traj'
+            system.record(path, every=3, chunk_frames=2)
+            system.run(30)
+
+            # no index yet: frames located by scanning
+            scanned = TrajectoryReader(path)
+
+            system.stop_recording()
+            reader = TrajectoryReader(path)
+
+            self.assertEqual(len(reader), 11)
+            self.assertTrue((reader.steps[:len(scanned)] == scanned.steps).all())
+
+            self.assertEqual(reader.find_step(9), 3)
+            self.assertEqual(reader.find_step(10), 3)
+            self.assertEqual(reader.find_time(4.6), 3)
+            self.assertEqual(reader.at_time(15).step, 30)
+            self.assertTrue((reader.at_step(30).pos == system.positions()).all())
+
+            # regular frames: computed from the spacing, no search, same result as a search
+            with mock.patch('numpy.searchsorted', side_effect=AssertionError):
+                for value in np.linspace(-1, 35, 200):
+                    expected = max(0, int(np.count_nonzero(reader.steps <= int(value))) - 1)
+                    self.assertEqual(reader.find_step(int(value)), expected)
+                    expected = max(0, int(np.count_nonzero(reader.times <= value / 2)) - 1)
+                    self.assertEqual(reader.find_time(value / 2), expected)
+
+        # irregular frames (restarted recording): binary search
+        steps = np.array([0, 3, 6, 20, 21, 40])
+        for value in range(-2, 45):
+            expected = max(0, int(np.count_nonzero(steps <= value)) - 1)
+            self.assertEqual(TrajectoryReader._locate(steps, value, (value - 0) // 3), expected)
+
+    def test_trajectory_quantized(self):
+
+        system = Scenario.random(50, 0, seed=9, max_charge=1, dt=0.05).build()
+
+        with self.assertRaises(ValueError):
+            System([], 0.1, System.FLAG_SUM).record('unused.traj', codec='quantized')
+
+        with tempfile.TemporaryDirectory() as path:
+            path = path + '/run.traj'
+
+            system.record(path, chunk_frames=4, codec='quantized', bits=12)
+            frames = [(system.ids().copy(), system.positions().copy())]
+            for _ in range(10):
+                system.update()
+                frames.append((system.ids().copy(), system.positions().copy()))
+            system.stop_recording()
+
+            reader = TrajectoryReader(path)
+            self.assertEqual(reader.codec, 'quantized')
+            self.assertEqual(len(reader), 11)
+            self.assertTrue((reader.max_error == [36 / 4095 / 2, 18 / 4095 / 2]).all())
+
+            low, high = np.array(reader.bounds[::2]), np.array(reader.bounds[1::2])
+
+            for frame, (ids, pos) in zip(reader, frames):
+                self.assertTrue((frame.ids == ids).all())
+
+                # the error is only bounded inside the limits
+                inside = ((pos >= low) & (pos <= high)).all(axis=1)
+                error = np.abs(frame.pos - pos)[inside]
+                self.assertTrue((error <= reader.max_error + 1e-9).all())
+
+            self.assertTrue((reader[3].ids == reader.at_step(3).ids).all())
+
+    def test_replay(self):
+
+        system = Scenario.random(20, 0, seed=10, k=1, dt=0.5).build()
+
+        with tempfile.TemporaryDirectory() as path:
+            path = path + '/run.traj'
+            system.record(path)
+            system.run(20)
+            system.stop_recording()
+
+            with TrajectoryPlayer(path, read_ahead=4) as player:
+                self.assertEqual(player.end_time, 10)
+                self.assertEqual(player.frame().step, 0)
+
+                # paused: the time doesn't advance
+                player.advance(1)
+                self.assertEqual(player.index, 0)
+
+                player.play()
+                player.speed = 2
+                player.advance(1.6)
+                self.assertEqual(player.index, 6)
+                self.assertEqual(player.frame().step, 6)
+
+                player.seek_progress(0.5)
+                self.assertEqual(player.frame().step, 10)
+
+                player.step(-3)
+                self.assertEqual(player.frame().step, 7)
+
+                # stops at the end
+                player.advance(100)
+                self.assertTrue(player.paused)
+                self.assertTrue((player.frame().pos == system.positions()).all())
+
+    def test_stepper(self):
+
+        system = System([
+            simul.Particule(0,0,1,1),
+            simul.Particule(0,1,1,1),
+        ], 0.1)
+        system.constants.k = 1
+        stepper = FixedStepper(system, speed=1)
+
+        # 0.25 s -> 2 steps, half a step left
+        self.assertEqual(stepper.advance(0.25), 2)
+        self.assertEqual(system.step, 2)
+        self.assertAlmostEqual(stepper.alpha, 0.5, places=5)
+
+        # rendered between the last two steps
+        pos = stepper.positions()
+        previous = stepper._previous[1][np.argsort(stepper._previous[0])]
+        current = system.positions()[np.argsort(system.ids())]
+        expected = (previous + current) / 2
+        self.assertTrue(np.allclose(pos[np.argsort(system.ids())], expected))
+
+        # the accumulated time is kept
+        self.assertEqual(stepper.advance(0.06), 1)
+
+        # late time beyond max_steps is dropped
+        self.assertEqual(stepper.advance(1000), stepper.max_steps)
+        self.assertEqual(stepper.accumulator, 0)
+
+        for speed in (0, -1):
+            with self.assertRaises(ValueError):
+                FixedStepper(system, speed=speed)
+
+    def test_worker(self):
+
+        system = System([
+            simul.Particule(0,0,1,1),
+            simul.Particule(0,1,1,1),
+        ], 0.01)
+        system.constants.k = 1
+
+        for speed in (0, -1):
+            with self.assertRaises(ValueError):
+                SimulationWorker(system, speed=speed)
+
+        worker = SimulationWorker(system, speed=None)
+
+        worker.start()
+        deadline = time.time() + 5
+        while worker.snapshot.step < 10 and time.time() < deadline:
+            time.sleep(0.01)
+
+        snapshot = worker.snapshot
+        self.assertGreaterEqual(snapshot.step, 10)
+        self.assertFalse(snapshot.pos.flags.writeable)
+
+        # the edits are published right away
+        with worker.edit() as edited:
+            edited.add_particule(simul.Particule(5,5,1,1))
+        self.assertEqual(worker.snapshot.n_particules, 3)
+
+        # a published snapshot isn't modified by the next steps
+        self.assertEqual(len(snapshot.ids), 2)
+
+        worker.stop()
+        self.assertTrue(worker.paused)
+        step = system.step
+        time.sleep(0.05)
+        self.assertEqual(system.step, step)
+
+    def test_shared_frames(self):
+
+        system = Scenario.random(50, 2, seed=5, k=1).build(System)
+        system.add_magnetic_field(simul.MagneticField(1, 2, 3, 4, False))
+        buffer = SharedFrameBuffer.for_system(system, n_slots=3)
+        reader = SharedFrameReader(buffer.name)
+
+        self.assertIsNone(reader.read())
+
+        serve(system, buffer, steps=4, every=2)
+
+        with self.assertRaises(ValueError):
+            serve(system, buffer, speed=0, steps=4)
+        self.assertEqual(buffer.sequence, 2)
+
+        frame = reader.read()
+        self.assertEqual(frame.step, system.step)
+        self.assertTrue(np.array_equal(frame.pos, system.positions()))
+        self.assertTrue(np.array_equal(frame.ids, system.ids()))
+        self.assertEqual(len(frame.fields), 3)
+        self.assertTrue(np.array_equal(frame.fields[:, 4], [f.is_uniform for f in system.magnetic_fields]))
+        self.assertFalse(frame.pos.flags.writeable)
+
+        # no new frame
+        self.assertIsNone(reader.read())
+
+        # the slot of the frame is overwritten after n_slots frames
+        copied = None
+        for i in range(3):
+            self.assertTrue(frame.is_valid())
+            buffer.write(system)
+            if i == 0:
+                copied = reader.read(copy=True)
+        self.assertFalse(frame.is_valid())
+        self.assertTrue(copied.is_valid())
+
+        # copied too late: torn, the last frame is read again
+        self.assertFalse(frame.detach())
+        self.assertEqual(reader.read().sequence, buffer.sequence)
+        self.assertIsNone(reader.read())
+        self.assertEqual(reader.read(new_only=False).sequence, buffer.sequence)
+
+        with self.assertRaises(ValueError):
+            for i in range(buffer.capacity + 1):
+                system.add_particule(simul.Particule(i,0,1,1))
+            buffer.write(system)
+
+        del frame
+        buffer.close()
+        self.assertTrue(reader.closed)
+        reader.close()
+
+    def test_stream(self):
+
+        def get_system(n):
+            return System([simul.Particule(i % 50, i // 50, (-1)**i, 1) for i in range(n)], 0.01)
+
+        with self.assertRaises(ValueError):
+            StreamServer(get_system(2), speed=0)
+
+        async def receive(reader, sequence):
+            async for frame in read_frames(reader):
+                if frame.sequence == sequence:
+                    return frame
+
+        async def run_delta():
+            system = get_system(20)
+            system.constants.k = 1e-3
+            server = StreamServer(system, delta=True, quantum=1e-4)
+            await server.start()
+
+            host, port = server.address.split(':')
+            reader, writer = await asyncio.open_connection(host, int(port))
+
+            await server.run(steps=10)
+            frame = await asyncio.wait_for(receive(reader, server.sequence), 5)
+
+            writer.close()
+            await server.close()
+            return system, frame
+
+        system, frame = asyncio.run(run_delta())
+        self.assertEqual(frame.step, 10)
+        self.assertTrue(np.array_equal(frame.ids, system.ids()))
+        self.assertLessEqual(np.abs(frame.pos - system.positions()).max(), 1e-4)
+
+        async def run_backpressure():
+            server = StreamServer(get_system(2000))
+            await server.start()
+
+            host, port = server.address.split(':')
+            reader, writer = await asyncio.open_connection(host, int(port))
+
+            # the client doesn't read: the frames pile up until the socket is full
+            for i in range(200):
+                server._publish()
+                await asyncio.sleep(0)
+
+            client = server.clients[0]
+            frame = await asyncio.wait_for(receive(reader, server.sequence), 5)
+
+            writer.close()
+            await server.close()
+            return server, client, frame
+
+        server, client, frame = asyncio.run(run_backpressure())
+        self.assertGreater(client.dropped, 0)
+        self.assertEqual(frame.sequence, 200)
+
+    def test_spatial_queries(self):
+
+        rng = np.random.default_rng(4)
+        pos = rng.uniform(-100, 100, (5000, 2))
+        system = System64([], 0.1)
+        system.add_particules(pos, np.ones(5000), np.ones(5000))
+
+        inside = (pos[:, 0] >= -10) & (pos[:, 0] <= 30) & (pos[:, 1] >= 5) & (pos[:, 1] <= 20)
+        self.assertTrue(np.array_equal(system.query_rect(-10, 30, 5, 20), np.nonzero(inside)[0]))
+
+        distances = np.hypot(pos[:, 0] - 12, pos[:, 1] + 7)
+        self.assertTrue(np.array_equal(system.query_radius(12, -7, 15), np.nonzero(distances <= 15)[0]))
+
+        # far outside of the particules
+        indices, found = system.nearest(500, 3, k=10)
+        distances = np.hypot(pos[:, 0] - 500, pos[:, 1] - 3)
+        self.assertTrue(np.array_equal(indices, np.argsort(distances)[:10]))
+        self.assertTrue(np.allclose(found, np.sort(distances)[:10]))
+
+        ids = system.ids()
+        self.assertTrue(np.array_equal(system.query_radius(0, 0, 20, ids=True), ids[system.query_radius(0, 0, 20)]))
+
+        # the index follows the changes of the particules
+        system.add_particule(simul.Particule64(0.5, 0.5, 1, 1))
+        self.assertEqual(system.nearest(0.5, 0.5)[0][0], 5000)
+        self.assertEqual(len(System([], 0.1).nearest(0, 0, 3)[0]), 0)
+
+        # particules modified by reference, even after a query
+        p = system.particules[0]
+        self.assertNotIn(0, system.query_radius(1000, 1000, 1))
+        p.pos = [1000, 1000]
+        self.assertEqual(list(system.query_radius(1000, 1000, 1)), [0])
+        system.particules[1].pos = [-1000, 1000]
+        self.assertEqual(system.nearest(-1000, 1000)[0][0], 1)
+
+        # the index is built again only when they have moved
+        builds = system.stats()['index_builds']
+        system.particules[2].q = 5
+        system.query_rect(0, 1, 0, 1)
+        system.query_radius(0, 0, 1)
+        self.assertEqual(system.stats()['index_builds'], builds)
+
+        # standalone index, over any positions, same default precision as the systems
+        self.assertEqual(SpatialIndex.dtype, System.dtype)
+        index = SpatialIndex(pos * 3)
+        self.assertTrue(np.array_equal(index.query_rect(-30, 90, 15, 60), np.nonzero(inside)[0]))
+
+    def test_potential_grid(self):
+
+        rng = np.random.default_rng(5)
+        pos = rng.uniform(0, 10, (50, 2))
+        q = rng.uniform(-1, 1, 50)
+        system = System64([], 0.1)
+        system.constants.k = 2
+        system.add_particules(pos, q, np.ones(50))
+
+        potential = system.potential_grid(0, 10, 0, 20, 51, 101, softening=0)
+        self.assertEqual(potential.shape, (101, 51))
+        self.assertTrue(np.allclose(potential, potential_grid(pos, q, 2, 0, 10, 0, 20, 51, 101, softening=0)))
+
+        # direct sum, away from the charges
+        x, y = np.meshgrid(np.linspace(0, 10, 51), np.linspace(0, 20, 101))
+        distances = np.hypot(x[..., None] - pos[:, 0], y[..., None] - pos[:, 1])
+        direct = (2 * q / distances).sum(axis=-1)
+        far = distances.min(axis=-1) > 1
+        self.assertLess(np.abs(potential - direct)[far].max(), 1e-2 * np.abs(direct[far]).max())
+
+        with self.assertRaises(ValueError):
+            potential_grid(pos, q, 2, 0, 10, 0, 10, 0, 10)
+
+    def test_headless(self):
+
+        with tempfile.TemporaryDirectory() as path:
+            Scenario.random(30, 1, seed=11, k=1).save(path + '/scenario.json')
+
+            run_headless([
+                path + '/scenario.json', '--steps', '20', '--observe-every', '5', '--quiet',
+                '--record', path + '/run.traj', '--observables', path + '/obs.npz',
+                '--save', path + '/final.ckpt',
+            ])
+
+            observables = np.load(path + '/obs.npz')
+            self.assertEqual(list(observables['step']), [0, 5, 10, 15, 20])
+            self.assertEqual(len(TrajectoryReader(path + '/run.traj')), 21)
+
+            # same run as the scenario built directly
+            system = Scenario.load(path + '/scenario.json').build()
+            system.run(20)
+            self.assertTrue((System.load(path + '/final.ckpt').positions() == system.positions()).all())
+
+class TestGui(unittest.TestCase):
+    '''Logic of the display, on a hidden window'''
+
+    @classmethod
+    def setUpClass(cls):
+        os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+        Interface.setup((3200, 1600), "Simulation")
+
+    def test_camera(self):
+
+        camera = Camera()
+        width, height = Interface.screen.get_size()
+
+        # default view: the fixed mapping of the scale factor
+        self.assertTrue(np.allclose(camera.world_to_screen([[1, 2]]), Dimension.scale([[1, 2]]) * Consts.SCALE_FACTOR))
+
+        camera.zoom_at((width / 3, height / 4), 3)
+        camera.pan((20, -10))
+
+        rng = np.random.default_rng(12)
+        pos = rng.uniform(-50, 50, (100, 2))
+        self.assertTrue(np.allclose(camera.screen_to_world(camera.world_to_screen(pos)), pos))
+
+        # the point under the mouse stays in place
+        under = camera.screen_to_world((200, 100))
+        camera.zoom_at((200, 100), -2)
+        self.assertTrue(np.allclose(camera.world_to_screen(under), (200, 100)))
+
+        camera.zoom_at((0, 0), 1000)
+        self.assertEqual(camera.zoom, Camera.MAX_ZOOM)
+        camera.reset()
+
+        # culling: exactly the positions in the window (+ margin)
+        pos = rng.uniform(-20, 60, (2000, 2))
+        screen = camera.world_to_screen(pos)
+        for margin in (0, 50):
+            inside = (screen[:, 0] >= -margin) & (screen[:, 0] <= width + margin) \
+                & (screen[:, 1] >= -margin) & (screen[:, 1] <= height + margin)
+            self.assertTrue(np.array_equal(camera.get_visible_mask(pos, margin), inside))
+
+        camera.follow(pos[:10])
+        self.assertTrue(np.allclose(camera.world_to_screen(pos[:10].mean(axis=0)), (width / 2, height / 2)))
+
+    def test_density_raster(self):
+
+        raster = DensityRaster()
+        cell = DensityRaster.CELL
+
+        # 3 particules in the cell (1, 2), 1 negative, 1 in (0, 0), the others outside
+        screen_pos = np.array([
+            [1.2 * cell, 2.1 * cell], [1.9 * cell, 2.9 * cell], [1.5 * cell, 2.5 * cell],
+            [0.5 * cell, 0.5 * cell], [-1, 5], [5, 4 * cell], [100 * cell, 0],
+        ])
+        charges = np.array([1, -1, 1, -1, -1, 1, 1])
+        total, n_negative = raster.get_counts(screen_pos, charges, 4, 4)
+
+        self.assertEqual(total.sum(), 4)
+        self.assertEqual((total[1 * 4 + 2], n_negative[1 * 4 + 2]), (3, 1))
+        self.assertEqual((total[0], n_negative[0]), (1, 1))
+
+        # only the occupied cells are drawn, the others are transparent
+        Interface.screen.fill(C.WHITE)
+        raster.display(screen_pos, charges)
+        self.assertNotEqual(tuple(Interface.screen.get_at((int(1.5 * cell), int(2.5 * cell))))[:3], C.WHITE)
+        self.assertEqual(tuple(Interface.screen.get_at((int(3.5 * cell), int(3.5 * cell))))[:3], C.WHITE)
+
+    def test_field_layer(self):
+
+        layer = FieldLayer()
+        camera = Camera()
+        fields = np.array([[5, 5, 2, 3, 1], [10, 4, -1, 2, 0]], dtype=np.float64)
+
+        with mock.patch.object(layer, '_render', wraps=layer._render) as render:
+            layer.display(camera)
+            self.assertEqual(render.call_count, 0)
+
+            # rendered once, again only when the fields, the camera or the window change
+            layer.set_fields(fields)
+            layer.display(camera)
+            layer.display(camera)
+            layer.set_fields(fields.copy())
+            layer.display(camera)
+            self.assertEqual(render.call_count, 1)
+
+            camera.pan((10, 0))
+            layer.display(camera)
+            self.assertEqual(render.call_count, 2)
+
+            fields[0, 2] = 4
+            layer.set_fields(fields)
+            layer.display(camera)
+            self.assertEqual(render.call_count, 3)
+
+            layer.invalidate()
+            self.assertFalse(layer.is_valid())
+            layer.display(camera)
+            self.assertEqual(render.call_count, 3)
+
+        # the fields are drawn at their position, the rest is transparent
+        camera.reset()
+        layer.set_fields(fields)
+        Interface.screen.fill(C.WHITE)
+        layer.display(camera)
+        center = camera.world_to_screen((5, 5)).astype(int)
+        self.assertNotEqual(tuple(Interface.screen.get_at(center))[:3], C.WHITE)
+        self.assertEqual(tuple(Interface.screen.get_at((1, 1)))[:3], C.WHITE)
+
+    def test_potential_heatmap(self):
+
+        heatmap = PotentialHeatmap(period=60)
+        camera = Camera()
+        positions = np.array([[5, 5], [20, 10]], dtype=np.float64)
+        charges = np.array([1, -1], dtype=np.float64)
+
+        # computed again only when the camera moves, until the period elapses
+        with mock.patch.object(heatmap, '_render', wraps=heatmap._render) as render:
+            heatmap.update(positions, charges, 1, camera)
+            heatmap.update(positions, charges, 1, camera)
+            self.assertEqual(render.call_count, 1)
+
+            camera.pan((10, 0))
+            heatmap.update(positions, charges, 1, camera)
+            self.assertEqual(render.call_count, 2)
+
+        # shaded to the sign of the charge next to it
+        camera.reset()
+        heatmap.toggle()
+        heatmap.update(positions, charges, 1, camera)
+        Interface.screen.fill(C.WHITE)
+        heatmap.display()
+        r, g, b = tuple(Interface.screen.get_at(camera.world_to_screen((5, 5)).astype(int)))[:3]
+        self.assertTrue(r > b and g < 255)
+        r, g, b = tuple(Interface.screen.get_at(camera.world_to_screen((20, 10)).astype(int)))[:3]
+        self.assertTrue(b > r and g < 255)
+
+        # the coulomb constant of the live system, none of a replay or a viewer
+        system = System([], 0.1)
+        system.constants.k = 3
+        app = App(system)
+        app.potential.toggle()
+        ids = np.arange(2)
+
+        with mock.patch.object(app.potential, 'update') as update:
+            app.display_particules(ids, positions, charges, np.ones(2))
+            self.assertEqual(update.call_args.args[2], 3)
+
+            app.player = mock.Mock()
+            app.display_particules(ids, positions, charges, np.ones(2))
+            app.player = None
+            app.viewer = mock.Mock()
+            app.display_particules(ids, positions, charges, np.ones(2))
+            self.assertEqual(update.call_count, 1)
+
+    def test_static_layer(self):
+
+        # 2 overlapping boxes, 1 apart: composited on 2 surfaces
+        page = Page(['base'], [
+            ('box1', cmps.TextBox([200, 100], [100, 100], C.WHITE, text='a')),
+            ('box2', cmps.TextBox([200, 100], [250, 150], C.WHITE, text='b')),
+            ('box3', cmps.TextBox([200, 100], [1000, 600], C.WHITE, text='c')),
+            ('input', cmps.InputText([200, 100], [1000, 100], C.WHITE)),
+        ], active_states='all')
+        page.set_layer(['box1', 'box2', 'box3'], 'static')
+
+        with mock.patch.object(page, '_composite_static_group', wraps=page._composite_static_group) as composite:
+            page.display()
+            page.display()
+            self.assertEqual(composite.call_count, 2)
+            self.assertEqual(len(page._static_layers), 2)
+
+            # only the group of the changed component, once
+            page.set_text('box3', 'd')
+            page.display()
+            page.display()
+            self.assertEqual(composite.call_count, 3)
+
+            page.set_text('box3', 'd')
+            page.set_color('box1', C.GREY)
+            page.display()
+            self.assertEqual(composite.call_count, 4)
+            self.assertEqual(len(composite.call_args.args[0]), 2)
+
+        # the cached surface is drawn at the component's position
+        Interface.screen.fill(C.BLACK)
+        page.display()
+        x, y = page.get_component('box3').get_pos(scaled=True).astype(int)
+        self.assertEqual(tuple(Interface.screen.get_at((x + 5, y + 5)))[:3], C.WHITE)
+
+        with self.assertRaises(ValueError):
+            page.set_layer('input', 'static')
+        with self.assertRaises(ValueError):
+            page.set_layer('box1', 'cached')
+
+    def test_selection(self):
+
+        rng = np.random.default_rng(8)
+        pos = rng.uniform(0, 20, (500, 2))
+        system = System64([], 0.1)
+        system.add_particules(pos, np.ones(500), np.ones(500))
+        ids = system.ids()
+
+        camera = Camera()
+        camera.zoom_at((100, 100), 2)
+        selection = Selection()
+        screen = camera.world_to_screen(pos)
+
+        def drag(start, end, **kwargs):
+            selection.start_drag(start)
+            selection.end_drag(end, camera, 5, **kwargs)
+            return selection.ids
+
+        # click on a particule, through the index of the system, built once
+        builds = system.stats()['index_builds']
+        for i in (3, 7):
+            self.assertEqual(list(drag(screen[i], screen[i] + 1, system=system)), [ids[i]])
+        self.assertEqual(system.stats()['index_builds'], builds + 1)
+        self.assertEqual(len(drag((-100, -100), (-100, -101), system=system)), 0)
+
+        # box, same result from the displayed particules without a system
+        box = ((200, 150), (600, 450))
+        inside = (screen[:, 0] >= 200) & (screen[:, 0] <= 600) & (screen[:, 1] >= 150) & (screen[:, 1] <= 450)
+        self.assertTrue(np.array_equal(drag(*box, system=system), ids[inside]))
+        self.assertTrue(np.array_equal(drag(*box, ids=ids, positions=pos), ids[inside]))
+        self.assertEqual(list(drag(screen[3], screen[3], ids=ids, positions=pos, add=True)), sorted({ids[3], *ids[inside]}))
+
+    def test_app_layout(self):
+
+        app = App(System([], 0.1))
+        bar = app.get_component('replay-bar')
+        rect = lambda obj: pygame.Rect(*obj.get_pos(scaled=True), *obj.get_dim(scaled=True))
+
+        # the buttons of the replay state don't cover the bar
+        for name in ('button-start', 'button-hud', 'button-speed'):
+            self.assertFalse(rect(bar).colliderect(rect(app.get_component(name))), name)
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,314 @@
+# include <algorithm>
+# include <cstdint>
+# include <cstring>
+# include <fstream>
+# include <memory>
+# include <stdexcept>
+# include "system.hpp"
+
+/*
+Checkpoint format (native endianness)
+---
+header:     magic "PSIMCKPT", uint32 version, uint32 sizeof(T), uint32 sizeof(A),
+            uint32 engine version
+constants:  double k, double e, float merge distance threshold
+system:     T dt, int32 merging flag, uint8 has limits, T limits[4],
+            int64 step, double time, int64 next id (version >= 2)
+sizes:      uint64 number of particules n, uint64 number of fields k
+particules: one contiguous block per array, in storage precision:
+            pos (n*2), v (n*2), a (n*2), q (n), m (n), ids (n int64, version >= 2)
+fields:     origin (k*2), intensity (k), dispersion (k), is uniform (k, uint8)
+*/
+
+namespace {
+
+const char MAGIC[8] = {'P', 'S', 'I', 'M', 'C', 'K', 'P', 'T'};
+const uint32_t VERSION = 2;
+
+template<typename V>
+void write(std::ofstream &file, const V &value) {
+    file.write(reinterpret_cast<const char*>(&value), sizeof(V));
+}
+
+template<typename V>
+void writeBlock(std::ofstream &file, const std::vector<V> &block) {
+    file.write(reinterpret_cast<const char*>(block.data()), block.size() * sizeof(V));
+}
+
+template<typename V>
+V read(std::ifstream &file) {
+    V value{};
+    file.read(reinterpret_cast<char*>(&value), sizeof(V));
+    return value;
+}
+
+/*
+Read a value stored with the given size (float or double) as a V.
+*/
+template<typename V>
+V readStored(std::ifstream &file, uint32_t storedSize) {
+    if (storedSize == sizeof(float)) {
+        return static_cast<V>(read<float>(file));
+    }
+    return static_cast<V>(read<double>(file));
+}
+
+/*
+Columns of the particules & fields, pointing into the payload read at once,
+the values being stored as S (float or double).
+*/
+template<typename S>
+struct Payload {
+    const S *pos, *v, *a, *q, *m;
+    const int64_t *ids; // nullptr before version 2
+    const S *origin, *intensity, *dispersion;
+    const uint8_t *isUniform;
+
+    Payload(const char *data, uint64_t n, uint64_t k, bool hasIds) {
+        const S *values = reinterpret_cast<const S*>(data);
+        pos = values;
+        v = pos + 2*n;
+        a = v + 2*n;
+        q = a + 2*n;
+        m = q + n;
+        const char *end = reinterpret_cast<const char*>(m + n);
+
+        ids = hasIds ? reinterpret_cast<const int64_t*>(end) : nullptr;
+        if (hasIds) {
+            end += n * sizeof(int64_t);
+        }
+
+        origin = reinterpret_cast<const S*>(end);
+        intensity = origin + 2*k;
+        dispersion = intensity + k;
+        isUniform = reinterpret_cast<const uint8_t*>(dispersion + k);
+    }
+};
+
+}
+
+template<typename T, typename A>
+void System<T, A>::save(const std::string &path) const {
+    std::ofstream file(path, std::ios::binary | std::ios::trunc);
+
+    if (!file) {
+        throw std::runtime_error("can't open checkpoint file: " + path);
+    }
+
+    // header
+    file.write(MAGIC, sizeof(MAGIC));
+    write<uint32_t>(file, VERSION);
+    write<uint32_t>(file, sizeof(T));
+    write<uint32_t>(file, sizeof(A));
+    write<uint32_t>(file, ENGINE_VERSION);
+
+    // constants
+    write<double>(file, physic.constants.getK());
+    write<double>(file, physic.constants.getE());
+    write<float>(file, physic.constants.mergeDistanceThreshold);
+
+    // system
+    write<T>(file, dt);
+    write<int32_t>(file, mergingFlag);
+    write<uint8_t>(file, isLimits);
+    write<T>(file, isLimits ? minX : 0);
+    write<T>(file, isLimits ? maxX : 0);
+    write<T>(file, isLimits ? minY : 0);
+    write<T>(file, isLimits ? maxY : 0);
+    write<int64_t>(file, step);
+    write<double>(file, time);
+    write<int64_t>(file, nextId);
+
+    uint64_t n = particules.size();
+    uint64_t k = magneticFields.size();
+    write<uint64_t>(file, n);
+    write<uint64_t>(file, k);
+
+    // particules
+    std::vector<T> pos(2*n), v(2*n), a(2*n), q(n), m(n);
+    std::vector<int64_t> ids(n);
+
+    for (uint64_t i=0; i<n; i++) {
+        const Particule<T> &p = particules[i];
+        pos[2*i] = p.pos.x;
+        pos[2*i+1] = p.pos.y;
+        v[2*i] = p.v.x;
+        v[2*i+1] = p.v.y;
+        a[2*i] = p.a.x;
+        a[2*i+1] = p.a.y;
+        q[i] = p.q;
+        m[i] = p.m;
+        ids[i] = p.id;
+    }
+    writeBlock(file, pos);
+    writeBlock(file, v);
+    writeBlock(file, a);
+    writeBlock(file, q);
+    writeBlock(file, m);
+    writeBlock(file, ids);
+
+    // fields
+    std::vector<T> origin(2*k), intensity(k), dispersion(k);
+    std::vector<uint8_t> isUniform(k);
+
+    for (uint64_t i=0; i<k; i++) {
+        const MagneticField<T> &field = magneticFields[i];
+        origin[2*i] = field.origin.x;
+        origin[2*i+1] = field.origin.y;
+        intensity[i] = field.intensity;
+        dispersion[i] = field.dispersion;
+        isUniform[i] = field.isUniform;
+    }
+    writeBlock(file, origin);
+    writeBlock(file, intensity);
+    writeBlock(file, dispersion);
+    writeBlock(file, isUniform);
+
+    if (!file) {
+        throw std::runtime_error("failed to write checkpoint file: " + path);
+    }
+}
+
+template<typename T, typename A>
+void System<T, A>::load(const std::string &path) {
+    std::ifstream file(path, std::ios::binary | std::ios::ate);
+
+    if (!file) {
+        throw std::runtime_error("can't open checkpoint file: " + path);
+    }
+    std::streamoff fileSize = file.tellg();
+    file.seekg(0);
+
+    // header
+    char magic[sizeof(MAGIC)];
+    file.read(magic, sizeof(MAGIC));
+
+    if (!file || std::memcmp(magic, MAGIC, sizeof(MAGIC)) != 0) {
+        throw std::runtime_error("not a checkpoint file: " + path);
+    }
+
+    uint32_t version = read<uint32_t>(file);
+    uint32_t storedSize = read<uint32_t>(file);
+    read<uint32_t>(file); // accumulation precision of the saved system
+    read<uint32_t>(file); // engine version
+
+    if (!file) {
+        throw std::runtime_error("truncated checkpoint file: " + path);
+    }
+    if (version > VERSION) {
+        throw std::runtime_error("unsupported checkpoint version: " + std::to_string(version));
+    }
+    if (storedSize != sizeof(float) && storedSize != sizeof(double)) {
+        throw std::runtime_error("unsupported checkpoint precision");
+    }
+
+    // constants
+    double savedK = read<double>(file);
+    double savedE = read<double>(file);
+    float mergeDistance = read<float>(file);
+
+    // system
+    T savedDt = readStored<T>(file, storedSize);
+    int32_t flag = read<int32_t>(file);
+    bool hasLimits = read<uint8_t>(file);
+    T limits[4];
+    for (int i=0; i<4; i++) {
+        limits[i] = readStored<T>(file, storedSize);
+    }
+
+    int64_t savedStep = 0, savedNextId = 0;
+    double savedTime = 0;
+    if (version >= 2) {
+        savedStep = read<int64_t>(file);
+        savedTime = read<double>(file);
+        savedNextId = read<int64_t>(file);
+    }
+
+    uint64_t n = read<uint64_t>(file);
+    uint64_t k = read<uint64_t>(file);
+
+    if (!file) {
+        throw std::runtime_error("truncated checkpoint file: " + path);
+    }
+
+    // the counts must fit in the rest of the file, before anything is allocated
+    uint64_t remaining = fileSize - file.tellg();
+    uint64_t particuleSize = 8 * storedSize + (version >= 2 ? sizeof(int64_t) : 0);
+    uint64_t fieldSize = 4 * storedSize + 1;
+
+    if (n > remaining / particuleSize || k > (remaining - n * particuleSize) / fieldSize) {
+        throw std::runtime_error("truncated checkpoint file: " + path);
+    }
+
+    // the whole payload at once, then each particule built in place
+    uint64_t payloadSize = n * particuleSize + k * fieldSize;
+    // not zeroed: it is entirely overwritten by the read
+    std::unique_ptr<char[]> buffer(new char[payloadSize]);
+    const char *data = buffer.get();
+    file.read(buffer.get(), payloadSize);
+
+    if (!file) {
+        throw std::runtime_error("truncated checkpoint file: " + path);
+    }
+
+    physic.constants.setK(savedK);
+    physic.constants.setE(savedE);
+    physic.constants.mergeDistanceThreshold = mergeDistance;
+    dt = savedDt;
+    mergingFlag = flag;
+    isLimits = hasLimits;
+    minX = limits[0];
+    maxX = limits[1];
+    minY = limits[2];
+    maxY = limits[3];
+    step = savedStep;
+    time = savedTime;
+    nextId = savedNextId;
+
+    if (storedSize == sizeof(float)) {
+        loadPayload(Payload<float>(data, n, k, version >= 2), n, k);
+    } else {
+        loadPayload(Payload<double>(data, n, k, version >= 2), n, k);
+    }
+}
+
+template<typename T, typename A>
+template<typename P>
+void System<T, A>::loadPayload(const P &payload, uint64_t n, uint64_t k) {
+    particules.clear();
+    particules.reserve(n);
+
+    for (uint64_t i=0; i<n; i++) {
+        particules.emplace_back(
+            static_cast<T>(payload.pos[2*i]), static_cast<T>(payload.pos[2*i+1]),
+            static_cast<T>(payload.q[i]), static_cast<T>(payload.m[i])
+        );
+        Particule<T> &p = particules.back();
+        p.v = Vect2D<T>(payload.v[2*i], payload.v[2*i+1]);
+        p.a = Vect2D<T>(payload.a[2*i], payload.a[2*i+1]);
+
+        if (payload.ids != nullptr) {
+            p.id = payload.ids[i];
+            nextId = std::max(nextId, p.id + 1);
+        } else {
+            p.id = nextId++;
+        }
+    }
+    index.invalidate();
+
+    magneticFields.clear();
+    magneticFields.reserve(k);
+    for (uint64_t i=0; i<k; i++) {
+        magneticFields.push_back(MagneticField<T>(
+            payload.origin[2*i], payload.origin[2*i+1],
+            payload.intensity[i], payload.dispersion[i], payload.isUniform[i]
+        ));
+    }
+}
+
+template void System<float, float>::save(const std::string &path) const;
+template void System<float, double>::save(const std::string &path) const;
+template void System<double, double>::save(const std::string &path) const;
+template void System<float, float>::load(const std::string &path);
+template void System<float, double>::load(const std::string &path);
+template void System<double, double>::load(const std::string &path);
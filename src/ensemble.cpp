@@ -0,0 +1,72 @@
+# include <algorithm>
+# include <atomic>
+# include <stdexcept>
+# include <thread>
+# include "ensemble.hpp"
+
+template<typename T, typename A>
+const System<T, A>& Ensemble<T, A>::getSystem(int idx) const {
+    if (idx < 0) {
+        idx += systems.size();
+    }
+    if (idx < 0 || idx >= systems.size()) {
+        throw std::out_of_range("system index out of range");
+    }
+    return systems[idx];
+}
+
+template<typename T, typename A>
+void Ensemble<T, A>::addSystem(const System<T, A> &system) {
+    systems.push_back(system);
+
+    // the copy must not write in the trajectory of the original system
+    systems.back().detachRecorder();
+}
+
+template<typename T, typename A>
+void Ensemble<T, A>::run(int nSteps, int nThreads, T dt) {
+
+    if (nThreads <= 0) {
+        nThreads = std::max(1u, std::thread::hardware_concurrency());
+    }
+    nThreads = std::min(nThreads, getNumberSystems());
+
+    // each worker picks the next system to step, until none are left
+    std::atomic<int> next(0);
+    auto worker = [&]() {
+        int idx;
+        while ((idx = next.fetch_add(1)) < getNumberSystems()) {
+            systems[idx].run(nSteps, dt);
+        }
+    };
+
+    if (nThreads <= 1) {
+        worker();
+        return;
+    }
+
+    std::vector<std::thread> threads;
+    threads.reserve(nThreads);
+
+    for (int i=0; i<nThreads; i++) {
+        threads.emplace_back(worker);
+    }
+    for (int i=0; i<nThreads; i++) {
+        threads[i].join();
+    }
+}
+
+template<typename T, typename A>
+std::vector<Summary> Ensemble<T, A>::summaries() const {
+    std::vector<Summary> summaries;
+    summaries.reserve(systems.size());
+
+    for (int i=0; i<systems.size(); i++) {
+        summaries.push_back(systems[i].summary());
+    }
+    return summaries;
+}
+
+template class Ensemble<float, float>;
+template class Ensemble<float, double>;
+template class Ensemble<double, double>;
@@ -1,12 +1,399 @@
 # include <pybind11/pybind11.h>
 # include <pybind11/stl.h>
+# include <pybind11/numpy.h>
+# include <optional>
+# include <stdexcept>
 # include <vector>
+# include "ensemble.hpp"
 # include "system.hpp"
 # include "partcule.hpp"
 # include "physic.hpp"
+# include "potential.hpp"
+# include "spatial.hpp"
 
 namespace py = pybind11;
 
+// contiguous array, converted to the requested type if needed
+template<typename T>
+using Array = py::array_t<T, py::array::c_style | py::array::forcecast>;
+
+/*
+Convert a summary into a dict.
+*/
+py::dict summaryToDict(const Summary &summary) {
+    py::dict dict;
+    dict["n_particules"] = summary.nParticules;
+    dict["charge"] = summary.charge;
+    dict["mass"] = summary.mass;
+    dict["kinetic_energy"] = summary.kineticEnergy;
+    dict["momentum"] = py::make_tuple(summary.momentumX, summary.momentumY);
+    return dict;
+}
+
+/*
+Convert the profiling counters into a dict, times in nanoseconds.
+*/
+py::dict statsToDict(const Stats &stats) {
+    py::dict dict;
+    dict["steps"] = stats.steps;
+    dict["pair_interactions"] = stats.pairInteractions;
+    dict["field_interactions"] = stats.fieldInteractions;
+    dict["merges"] = stats.merges;
+    dict["removals"] = stats.removals;
+    dict["index_builds"] = stats.indexBuilds;
+    dict["pairs_ns"] = stats.pairsNs;
+    dict["fields_ns"] = stats.fieldsNs;
+    dict["integration_ns"] = stats.integrationNs;
+    dict["record_ns"] = stats.recordNs;
+    return dict;
+}
+
+/*
+Convert a list of summaries into a dict of arrays, one entry per summary.
+*/
+py::dict summariesToArrays(const std::vector<Summary> &summaries) {
+    int n = summaries.size();
+    py::array_t<int> nParticules(n);
+    py::array_t<double> charge(n), mass(n), kineticEnergy(n);
+    py::array_t<double> momentum({n, 2});
+
+    auto rN = nParticules.mutable_unchecked<1>();
+    auto rQ = charge.mutable_unchecked<1>();
+    auto rM = mass.mutable_unchecked<1>();
+    auto rE = kineticEnergy.mutable_unchecked<1>();
+    auto rP = momentum.mutable_unchecked<2>();
+
+    for (int i=0; i<n; i++) {
+        rN(i) = summaries[i].nParticules;
+        rQ(i) = summaries[i].charge;
+        rM(i) = summaries[i].mass;
+        rE(i) = summaries[i].kineticEnergy;
+        rP(i, 0) = summaries[i].momentumX;
+        rP(i, 1) = summaries[i].momentumY;
+    }
+
+    py::dict dict;
+    dict["n_particules"] = nParticules;
+    dict["charge"] = charge;
+    dict["mass"] = mass;
+    dict["kinetic_energy"] = kineticEnergy;
+    dict["momentum"] = momentum;
+    return dict;
+}
+
+/*
+Return a (n, 2) array of a vector attribute of the particules.
+*/
+template<typename T, typename A>
+py::array_t<T> vectorsArray(const System<T, A> &system, Vect2D<T> Particule<T>::*member) {
+    int n = system.particules.size();
+    py::array_t<T> array({n, 2});
+    auto r = array.template mutable_unchecked<2>();
+
+    for (int i=0; i<n; i++) {
+        const Vect2D<T> &vect = system.particules[i].*member;
+        r(i, 0) = vect.x;
+        r(i, 1) = vect.y;
+    }
+    return array;
+}
+
+/*
+Return a (n,) array of a scalar attribute of the particules.
+*/
+template<typename T, typename A>
+py::array_t<T> scalarsArray(const System<T, A> &system, T Particule<T>::*member) {
+    int n = system.particules.size();
+    py::array_t<T> array(n);
+    auto r = array.template mutable_unchecked<1>();
+
+    for (int i=0; i<n; i++) {
+        r(i) = system.particules[i].*member;
+    }
+    return array;
+}
+
+/*
+Return the result of a spatial query as an array: the indices of the particules,
+or their ids.
+*/
+template<typename T, typename A>
+py::array_t<int64_t> queryArray(const System<T, A> &system, const std::vector<int64_t> &indices, bool ids) {
+    int n = indices.size();
+    py::array_t<int64_t> array(n);
+    auto r = array.mutable_unchecked<1>();
+
+    for (int i=0; i<n; i++) {
+        r(i) = ids ? system.particules[indices[i]].id : indices[i];
+    }
+    return array;
+}
+
+/*
+Return the potential computed on a grid as a (ny, nx) array.
+*/
+py::array_t<double> potentialArray(const PotentialGrid &grid, const std::vector<double> &potential) {
+    return py::array_t<double>({grid.ny, grid.nx}, potential.data());
+}
+
+/*
+Check the shapes of the arrays of particules, v, a & ids being optional,
+return the number of particules.
+*/
+template<typename T>
+int checkParticulesArrays(const Array<T> &pos, const Array<T> &q, const Array<T> &m,
+        const std::optional<Array<T>> &v, const std::optional<Array<T>> &a,
+        const std::optional<Array<int64_t>> &ids) {
+
+    if (pos.ndim() != 2 || pos.shape(1) != 2) {
+        throw std::invalid_argument("pos must be of shape (n, 2)");
+    }
+    int n = pos.shape(0);
+
+    if (q.size() != n || m.size() != n) {
+        throw std::invalid_argument("pos, q and m must have the same length");
+    }
+    if ((v && v->size() != 2*n) || (a && a->size() != 2*n)) {
+        throw std::invalid_argument("v and a must be of shape (n, 2)");
+    }
+    if (ids && ids->size() != n) {
+        throw std::invalid_argument("pos and ids must have the same length");
+    }
+    return n;
+}
+
+/*
+Add particules from arrays, v, a & ids being optional,
+a being overwritten by the next update (restored state, not applied).
+*/
+template<typename T, typename A>
+void addParticulesArrays(System<T, A> &system, Array<T> pos, Array<T> q, Array<T> m,
+        std::optional<Array<T>> v, std::optional<Array<T>> a, std::optional<Array<int64_t>> ids) {
+
+    int n = checkParticulesArrays(pos, q, m, v, a, ids);
+
+    system.addParticules(
+        n, pos.data(), q.data(), m.data(),
+        v ? v->data() : nullptr,
+        a ? a->data() : nullptr,
+        ids ? ids->data() : nullptr
+    );
+}
+
+/*
+Bind Particule<T>, U being the other precision (implicitly convertible).
+*/
+template<typename T, typename U>
+void bindParticule(py::module &m, const char *name, const char *dtype) {
+    py::class_<Particule<T>> cls(
+        m, name
+    );
+    cls.def(py::init<T, T, T, T>())
+    .def(py::init<const Particule<U>&>())
+    .def_readwrite("q", &Particule<T>::q)
+    .def_readwrite("m", &Particule<T>::m)
+    .def_readonly("id", &Particule<T>::id)
+    .def_property("pos", &Particule<T>::getListPos, &Particule<T>::setListPos)
+    .def_property("v", &Particule<T>::getListV, &Particule<T>::setListV)
+    .def_property("a", &Particule<T>::getListA, &Particule<T>::setListA,
+        "Acceleration applied during the last update, overwritten by the next one: "
+        "a value set here isn't applied by the system.")
+    ;
+    cls.attr("dtype") = dtype;
+}
+
+/*
+Bind MagneticField<T>, U being the other precision (implicitly convertible).
+*/
+template<typename T, typename U>
+void bindMagneticField(py::module &m, const char *name, const char *dtype) {
+    py::class_<MagneticField<T>> cls(
+        m, name
+    );
+    cls.def(py::init<T, T, T, T, bool>(), py::arg("x"), py::arg("y"), py::arg("intensity"), py::arg("dispersion") = -1, py::arg("isUniform") = true)
+    .def(py::init<const MagneticField<U>&>())
+    .def_readwrite("intensity", &MagneticField<T>::intensity)
+    .def_readwrite("dispersion", &MagneticField<T>::dispersion)
+    .def_readwrite("is_uniform", &MagneticField<T>::isUniform)
+    .def_property_readonly("origin", &MagneticField<T>::getListOrigin)
+    ;
+    cls.attr("dtype") = dtype;
+}
+
+/*
+Bind System<T, A>: storage precision T, accumulation precision A.
+*/
+template<typename T, typename A>
+void bindSystem(py::module &m, const char *name, const char *dtype, const char *accDtype) {
+    py::class_<System<T, A>> cls(
+        m, name
+    );
+    cls.def(py::init<std::vector<Particule<T>>&, T, int>(), py::arg("particules"), py::arg("dt") = -1, py::arg("flag") = 0)
+    .def_property_readonly("particules", &System<T, A>::exposeParticules,
+        py::return_value_policy::reference_internal,
+        "The particules, by reference: until the next update, the queries check their positions.")
+    .def_readonly("magnetic_fields", &System<T, A>::magneticFields)
+    .def_readonly("FLAG_SUM", &System<T, A>::FLAG_SUM)
+    .def_readonly("FLAG_SUM_ONESIDE", &System<T, A>::FLAG_SUM_ONESIDE)
+    .def_property_readonly("constants", &System<T, A>::constants)
+    .def_property_readonly("n_particules", &System<T, A>::getNumberParticules)
+    .def("set_limits", &System<T, A>::setLimits)
+    .def("update", &System<T, A>::updateState, py::arg("dt") = -1, "Update the simulation state.")
+    .def("run", &System<T, A>::run, py::arg("n_steps"), py::arg("dt") = -1,
+        py::call_guard<py::gil_scoped_release>(), "Update the simulation state n_steps times.")
+    .def("summary", [](const System<T, A> &self) { return summaryToDict(self.summary()); })
+    .def("stats", [](const System<T, A> &self) { return statsToDict(self.stats()); },
+        "Return the profiling counters accumulated since the last reset.")
+    .def("reset_stats", &System<T, A>::resetStats)
+    .def("clear_elements", &System<T, A>::clearElements)
+    .def("add_particule", &System<T, A>::addParticule)
+    .def("add_magnetic_field", &System<T, A>::addMagneticField)
+    .def("add_particules", &addParticulesArrays<T, A>,
+        py::arg("pos"), py::arg("q"), py::arg("m"),
+        py::arg("v") = py::none(), py::arg("a") = py::none(), py::arg("ids") = py::none(),
+        "Add particules from arrays, a is overwritten by the next update.")
+    .def("set_particules", [](System<T, A> &self, Array<T> pos, Array<T> q, Array<T> m,
+            std::optional<Array<T>> v, std::optional<Array<T>> a, std::optional<Array<int64_t>> ids) {
+        // checked first: the particules are kept if the arrays are invalid
+        checkParticulesArrays(pos, q, m, v, a, ids);
+        self.particules.clear();
+        addParticulesArrays(self, pos, q, m, v, a, ids);
+    }, py::arg("pos"), py::arg("q"), py::arg("m"),
+    py::arg("v") = py::none(), py::arg("a") = py::none(), py::arg("ids") = py::none(),
+    "Replace the particules by the ones of the arrays, a is overwritten by the next update.")
+    .def("positions", [](const System<T, A> &self) { return vectorsArray(self, &Particule<T>::pos); })
+    .def("velocities", [](const System<T, A> &self) { return vectorsArray(self, &Particule<T>::v); })
+    .def("accelerations", [](const System<T, A> &self) { return vectorsArray(self, &Particule<T>::a); })
+    .def("charges", [](const System<T, A> &self) { return scalarsArray(self, &Particule<T>::q); })
+    .def("masses", [](const System<T, A> &self) { return scalarsArray(self, &Particule<T>::m); })
+    .def("ids", [](const System<T, A> &self) {
+        py::array_t<int64_t> ids(self.particules.size());
+        auto r = ids.mutable_unchecked<1>();
+        for (int i=0; i<self.particules.size(); i++) {
+            r(i) = self.particules[i].id;
+        }
+        return ids;
+    })
+    .def("query_rect", [](const System<T, A> &self, double minX, double maxX, double minY, double maxY, bool ids) {
+        return queryArray(self, self.queryRect(minX, maxX, minY, maxY), ids);
+    }, py::arg("min_x"), py::arg("max_x"), py::arg("min_y"), py::arg("max_y"), py::arg("ids") = false,
+    "Return the particules inside a rectangle.")
+    .def("query_radius", [](const System<T, A> &self, double x, double y, double r, bool ids) {
+        return queryArray(self, self.queryRadius(x, y, r), ids);
+    }, py::arg("x"), py::arg("y"), py::arg("r"), py::arg("ids") = false,
+    "Return the particules within a distance of a point.")
+    .def("nearest", [](const System<T, A> &self, double x, double y, int k, bool ids) {
+        std::vector<int64_t> indices;
+        std::vector<double> distances;
+        self.nearest(x, y, k, indices, distances);
+        return py::make_tuple(queryArray(self, indices, ids), py::array_t<double>(distances.size(), distances.data()));
+    }, py::arg("x"), py::arg("y"), py::arg("k") = 1, py::arg("ids") = false,
+    "Return the k nearest particules of a point & their distances.")
+    .def("potential_grid", [](const System<T, A> &self, double minX, double maxX, double minY, double maxY,
+            int nx, int ny, double softening) {
+        PotentialGrid grid(minX, maxX, minY, maxY, nx, ny, softening);
+        std::vector<double> potential;
+        {
+            py::gil_scoped_release release;
+            potential = grid.compute(self.particules, self.constants().getK());
+        }
+        return potentialArray(grid, potential);
+    }, py::arg("min_x"), py::arg("max_x"), py::arg("min_y"), py::arg("max_y"),
+    py::arg("nx"), py::arg("ny"), py::arg("softening") = -1,
+    "Return the electric potential of the particules on a grid, as a (ny, nx) array.")
+    .def_property("step", &System<T, A>::getStep, &System<T, A>::setStep)
+    .def_property("time", &System<T, A>::getTime, &System<T, A>::setTime)
+    .def_property_readonly("dt", &System<T, A>::getDt)
+    .def_property_readonly("flag", &System<T, A>::getMergingFlag)
+    .def_property_readonly("limits", [](const System<T, A> &self) -> py::object {
+        if (!self.hasLimits()) {
+            return py::none();
+        }
+        return py::tuple(py::cast(self.getLimits()));
+    })
+    .def("save", &System<T, A>::save, py::arg("path"),
+        py::call_guard<py::gil_scoped_release>(), "Save the state of the system in a binary file.")
+    .def("load", &System<T, A>::load, py::arg("path"),
+        py::call_guard<py::gil_scoped_release>(), "Replace the state of the system by the one saved in the file.")
+    .def("record", &System<T, A>::record, py::arg("path"), py::arg("every") = 1, py::arg("chunk_frames") = 64,
+        py::arg("codec") = 0, py::arg("bits") = 16, "Record the trajectory in a file, every n steps.")
+    .def("stop_recording", &System<T, A>::stopRecording, py::call_guard<py::gil_scoped_release>())
+    .def_property_readonly("is_recording", &System<T, A>::isRecording)
+    .def("print", &System<T, A>::print)
+    ;
+    cls.attr("dtype") = dtype;
+    cls.attr("accumulator_dtype") = accDtype;
+}
+
+/*
+Bind SpatialIndex<T>, built over an array of positions.
+*/
+template<typename T>
+void bindSpatialIndex(py::module &m, const char *name, const char *dtype) {
+    auto toArray = [](const std::vector<int64_t> &indices) {
+        return py::array_t<int64_t>(indices.size(), indices.data());
+    };
+
+    py::class_<SpatialIndex<T>> cls(
+        m, name
+    );
+    cls.def(py::init([](Array<T> pos) {
+        if (pos.ndim() != 2 || pos.shape(1) != 2) {
+            throw std::invalid_argument("pos must be of shape (n, 2)");
+        }
+        SpatialIndex<T> index;
+        index.build(pos.shape(0), pos.data());
+        return index;
+    }), py::arg("pos"))
+    .def("__len__", &SpatialIndex<T>::size)
+    .def("query_rect", [toArray](const SpatialIndex<T> &self, double minX, double maxX, double minY, double maxY) {
+        return toArray(self.queryRect(minX, maxX, minY, maxY));
+    }, py::arg("min_x"), py::arg("max_x"), py::arg("min_y"), py::arg("max_y"))
+    .def("query_radius", [toArray](const SpatialIndex<T> &self, double x, double y, double r) {
+        return toArray(self.queryRadius(x, y, r));
+    }, py::arg("x"), py::arg("y"), py::arg("r"))
+    .def("nearest", [toArray](const SpatialIndex<T> &self, double x, double y, int k) {
+        std::vector<int64_t> indices;
+        std::vector<double> distances;
+        self.nearest(x, y, k, indices, distances);
+        return py::make_tuple(toArray(indices), py::array_t<double>(distances.size(), distances.data()));
+    }, py::arg("x"), py::arg("y"), py::arg("k") = 1)
+    ;
+    cls.attr("dtype") = dtype;
+}
+
+/*
+Bind Ensemble<T, A>, the systems being bound as System<T, A>.
+*/
+template<typename T, typename A>
+void bindEnsemble(py::module &m, const char *name, const char *dtype, const char *accDtype) {
+    py::class_<Ensemble<T, A>> cls(
+        m, name
+    );
+    cls.def(py::init<>())
+    .def_property_readonly("n_systems", &Ensemble<T, A>::getNumberSystems)
+    .def("__len__", &Ensemble<T, A>::getNumberSystems)
+    .def("__getitem__", [](const Ensemble<T, A> &self, int idx) { return self.getSystem(idx); },
+        "Return a copy of the system at idx.")
+    .def("copy_system", [](const Ensemble<T, A> &self, int idx, System<T, A> &system) {
+        system = self.getSystem(idx);
+    }, py::arg("idx"), py::arg("system"), "Copy the system at idx into system.")
+    .def("add_system", &Ensemble<T, A>::addSystem)
+    .def("clear_systems", &Ensemble<T, A>::clearSystems)
+    .def("run", [](Ensemble<T, A> &self, int nSteps, int nThreads, T dt) {
+        {
+            py::gil_scoped_release release;
+            self.run(nSteps, nThreads, dt);
+        }
+        return summariesToArrays(self.summaries());
+    }, py::arg("n_steps"), py::arg("n_threads") = 0, py::arg("dt") = -1,
+    "Update every system n_steps times, return the summaries.")
+    .def("summaries", [](const Ensemble<T, A> &self) { return summariesToArrays(self.summaries()); })
+    ;
+    cls.attr("dtype") = dtype;
+    cls.attr("accumulator_dtype") = accDtype;
+}
+
 PYBIND11_MODULE(_simulation, m) {
 
     py::class_<Constants>(
@@ -21,42 +408,53 @@ PYBIND11_MODULE(_simulation, m) {
     .def_readonly("charge_electron", &Constants::chargeElectron) 
     ;
 
-    py::class_<Particule>(
-        m, "Particule"
-    )
-    .def(py::init<float, float, float, float>())
-    .def_readwrite("q", &Particule::q)
-    .def_readwrite("m", &Particule::m)
-    .def_property("pos", &Particule::getListPos, &Particule::setListPos)
-    .def_property("v", &Particule::getListV, &Particule::setListV)
-    .def_property("a", &Particule::getListA, &Particule::setListA)
-    ;
+    bindParticule<float, double>(m, "Particule32", "float32");
+    bindParticule<double, float>(m, "Particule64", "float64");
+    py::implicitly_convertible<Particule<float>, Particule<double>>();
+    py::implicitly_convertible<Particule<double>, Particule<float>>();
 
-    py::class_<MagneticField>(
-        m, "MagneticField"
-    )
-    .def(py::init<float, float, float, float, bool>(), py::arg("x"), py::arg("y"), py::arg("intensity"), py::arg("dispersion") = -1, py::arg("isUniform") = true)
-    .def_readwrite("intensity", &MagneticField::intensity)
-    .def_readwrite("dispersion", &MagneticField::dispersion)
-    .def_readwrite("is_uniform", &MagneticField::isUniform)
-    .def_property_readonly("origin", &MagneticField::getListOrigin)
-    ;
+    bindMagneticField<float, double>(m, "MagneticField32", "float32");
+    bindMagneticField<double, float>(m, "MagneticField64", "float64");
+    py::implicitly_convertible<MagneticField<float>, MagneticField<double>>();
+    py::implicitly_convertible<MagneticField<double>, MagneticField<float>>();
 
-    py::class_<System>(
-        m, "System"
-    )
-    .def(py::init<std::vector<Particule>&, float, int>(), py::arg("particules"), py::arg("dt") = -1, py::arg("flag") = 0)
-    .def_readonly("particules", &System::particules)
-    .def_readonly("magnetic_fields", &System::magneticFields)
-    .def_readonly("FLAG_SUM", &System::FLAG_SUM)
-    .def_readonly("FLAG_SUM_ONESIDE", &System::FLAG_SUM_ONESIDE)
-    .def_property_readonly("constants", &System::constants)
-    .def_property_readonly("n_particules", &System::getNumberParticules)
-    .def("set_limits", &System::setLimits)
-    .def("update", &System::updateState, py::arg("dt") = -1, "Update the simulation state.")
-    .def("clear_elements", &System::clearElements)
-    .def("add_particule", &System::addParticule)
-    .def("add_magnetic_field", &System::addMagneticField)
-    .def("print", &System::print)
-    ;
-}
\ No newline at end of file
+    bindSystem<float, float>(m, "System32", "float32", "float32");
+    bindSystem<float, double>(m, "SystemMixed", "float32", "float64");
+    bindSystem<double, double>(m, "System64", "float64", "float64");
+
+    bindSpatialIndex<float>(m, "SpatialIndex32", "float32");
+    bindSpatialIndex<double>(m, "SpatialIndex64", "float64");
+
+    m.def("potential_grid", [](Array<double> pos, Array<double> q, double k, double minX, double maxX,
+            double minY, double maxY, int nx, int ny, double softening) {
+        if (pos.ndim() != 2 || pos.shape(1) != 2) {
+            throw std::invalid_argument("pos must be of shape (n, 2)");
+        }
+        int n = pos.shape(0);
+        if (q.size() != n) {
+            throw std::invalid_argument("pos and q must have the same length");
+        }
+
+        PotentialGrid grid(minX, maxX, minY, maxY, nx, ny, softening);
+        std::vector<double> potential;
+        {
+            py::gil_scoped_release release;
+            potential = grid.compute(n, pos.data(), q.data(), k);
+        }
+        return potentialArray(grid, potential);
+    }, py::arg("pos"), py::arg("q"), py::arg("k"), py::arg("min_x"), py::arg("max_x"),
+    py::arg("min_y"), py::arg("max_y"), py::arg("nx"), py::arg("ny"), py::arg("softening") = -1,
+    "Return the electric potential of charges on a grid, as a (ny, nx) array.");
+
+    bindEnsemble<float, float>(m, "Ensemble32", "float32", "float32");
+    bindEnsemble<float, double>(m, "EnsembleMixed", "float32", "float64");
+    bindEnsemble<double, double>(m, "Ensemble64", "float64", "float64");
+
+    m.attr("ENGINE_VERSION") = ENGINE_VERSION;
+
+    // default precision
+    m.attr("Particule") = m.attr("Particule32");
+    m.attr("MagneticField") = m.attr("MagneticField32");
+    m.attr("System") = m.attr("System32");
+    m.attr("Ensemble") = m.attr("Ensemble32");
+}
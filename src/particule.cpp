@@ -2,37 +2,36 @@
 # include "partcule.hpp"
 # include "physic.hpp"
 
-Particule::Particule(Vect2D<float> &pos, float q, float m) {
+template<typename T>
+Particule<T>::Particule(const Vect2D<T> &pos, T q, T m) {
     this->pos = pos;
     this->q = q;
     this->m = m;
-    this->v = Vect2D<float>(0,0);
-    this->a = Vect2D<float>(0,0);
+    this->v = Vect2D<T>(0,0);
+    this->a = Vect2D<T>(0,0);
     this->isDead = false;
 }
 
-Particule::Particule(float x, float y, float q, float m) {
-    this->pos = Vect2D<float>(x, y);
+template<typename T>
+Particule<T>::Particule(T x, T y, T q, T m) {
+    this->pos = Vect2D<T>(x, y);
     this->q = q;
     this->m = m;
-    this->v = Vect2D<float>(0,0);
-    this->a = Vect2D<float>(0,0);
+    this->v = Vect2D<T>(0,0);
+    this->a = Vect2D<T>(0,0);
     this->isDead = false;
 }
 
-void Particule::applyForce(Vect2D<float> force) {
-    this->a = this->a + force / m;
-}
-
-void Particule::updateState(float dt) {
+template<typename T>
+void Particule<T>::updateState(T dt) {
     this->v = this->v + this->a * dt;
     this->pos = this->pos + this->v * dt;
-
-    // reset acceleration
-    this->a.x = 0;
-    this->a.y = 0;
 }
 
-void Particule::print(){
+template<typename T>
+void Particule<T>::print(){
     std::cout << "Particule (" << this->pos.x << ", " << this->pos.y << ") q: " << this->q << std::endl;
-}
\ No newline at end of file
+}
+
+template class Particule<float>;
+template class Particule<double>;
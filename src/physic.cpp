@@ -2,51 +2,57 @@
 # include "physic.hpp"
 # include "partcule.hpp"
 
-Physics::Physics() {
+template<typename T, typename A>
+Physics<T, A>::Physics() {
     this->constants = Constants();
 }
 
-Vect2D<float> Physics::getParticulesAttraction(const Particule &p1, const Particule &p2) const {
-    Vect2D<float> dx = p2.pos - p1.pos;
+template<typename T, typename A>
+Vect2D<A> Physics<T, A>::getParticulesAttraction(const Particule<T> &p1, const Particule<T> &p2) const {
+    Vect2D<A> dx = Vect2D<A>(p2.pos) - Vect2D<A>(p1.pos);
 
-    float length = dx.length();
-    float force = this->constants.getK() * p1.q * p2.q / (length*length);
+    A length = dx.length();
+    A force = this->constants.getK() * p1.q * p2.q / (length*length);
     force *= -1; // charge +- & -+ are attracted | ++ & -- are repulsed
     return dx.normalize() * force;
 }
 
-void Physics::handelnParticulesInteraction(Particule &p1, Particule &p2) const {
-    Vect2D<float> force = this->getParticulesAttraction(p1, p2);
-    p1.applyForce(force);
-    p2.applyForce(force * -1);
+template<typename T, typename A>
+void Physics<T, A>::handelnParticulesInteraction(const Particule<T> &p1, const Particule<T> &p2, Vect2D<A> &a1, Vect2D<A> &a2) const {
+    Vect2D<A> force = this->getParticulesAttraction(p1, p2);
+    a1 += force / static_cast<A>(p1.m);
+    a2 -= force / static_cast<A>(p2.m);
 }
 
-void Physics::handelnMagneticInteraction(Particule &p, MagneticField &m) const {
-    float B = m.getIntensity(p.pos);
+template<typename T, typename A>
+void Physics<T, A>::handelnMagneticInteraction(const Particule<T> &p, const MagneticField<T> &m, Vect2D<A> &a) const {
+    A B = m.getIntensity(p.pos);
 
     if (B == 0) {
         return;
     }
 
     // compute Lorentz force F = q * v * B
-    Vect2D<float> force = p.v * (p.q * B);
+    Vect2D<A> force = Vect2D<A>(p.v) * (p.q * B);
 
     // compute normal to v
-    float inter = force.x;
+    A inter = force.x;
     force.x = force.y;
     force.y = -inter;
     
     // apply force
-    p.applyForce(force);
+    a += force / static_cast<A>(p.m);
 }
 
-bool Physics::areNearby(Particule &p1, Particule &p2) const {
-    float dist = (p1.pos - p2.pos).length();
+template<typename T, typename A>
+bool Physics<T, A>::areNearby(const Particule<T> &p1, const Particule<T> &p2) const {
+    T dist = (p1.pos - p2.pos).length();
 
     return (dist < constants.mergeDistanceThreshold);
 }
 
-MagneticField::MagneticField(Vect2D<float> origin, float intensity, float dispersion, bool isUniform) {
+template<typename T>
+MagneticField<T>::MagneticField(Vect2D<T> origin, T intensity, T dispersion, bool isUniform) {
     this->origin = origin;
     this->intensity = intensity;
     this->isUniform = isUniform;
@@ -58,8 +64,9 @@ MagneticField::MagneticField(Vect2D<float> origin, float intensity, float disper
     }
 }
 
-MagneticField::MagneticField(float x, float y, float intensity, float dispersion, bool isUniform) {
-    this->origin = (Vect2D<float>(x, y));
+template<typename T>
+MagneticField<T>::MagneticField(T x, T y, T intensity, T dispersion, bool isUniform) {
+    this->origin = (Vect2D<T>(x, y));
     this->intensity = intensity;
     this->isUniform = isUniform;
 
@@ -70,15 +77,16 @@ MagneticField::MagneticField(float x, float y, float intensity, float dispersion
     }
 }
 
-float MagneticField::getIntensity(const Vect2D<float> &coordinate) const {
-    float dist = (this->origin - coordinate).length();
+template<typename T>
+T MagneticField<T>::getIntensity(const Vect2D<T> &coordinate) const {
+    T dist = (this->origin - coordinate).length();
 
     // handle to far coordinates
     if (dist >= this->dispersion) {
         return 0;
     }
 
-    float coefDispersion;
+    T coefDispersion;
     if (this->isUniform) {
         coefDispersion = 1;
     } else {
@@ -86,4 +94,11 @@ float MagneticField::getIntensity(const Vect2D<float> &coordinate) const {
     }
 
     return coefDispersion * this->intensity;
-}
\ No newline at end of file
+}
+
+template class MagneticField<float>;
+template class MagneticField<double>;
+
+template class Physics<float, float>;
+template class Physics<float, double>;
+template class Physics<double, double>;
@@ -0,0 +1,248 @@
+# include <algorithm>
+# include <cmath>
+# include <complex>
+# include <stdexcept>
+# include "potential.hpp"
+
+namespace {
+
+typedef std::complex<double> Complex;
+
+int nextPowerOfTwo(int n) {
+    int p = 1;
+    while (p < n) {
+        p <<= 1;
+    }
+    return p;
+}
+
+/*
+Roots of unity exp(-2i pi k / n), k < n / 2, used by the FFTs of size n.
+*/
+std::vector<Complex> getRoots(int n) {
+    std::vector<Complex> roots(n / 2);
+    for (int k=0; k<n/2; k++) {
+        roots[k] = std::polar(1.0, -2 * M_PI * k / n);
+    }
+    return roots;
+}
+
+/*
+In place radix-2 FFT of n values, n a power of two,
+the inverse isn't normalized.
+*/
+void fft(Complex *data, int n, const std::vector<Complex> &roots, bool inverse) {
+    // bit reversal permutation
+    for (int i=1, j=0; i<n; i++) {
+        int bit = n >> 1;
+        for (; j & bit; bit >>= 1) {
+            j ^= bit;
+        }
+        j ^= bit;
+        if (i < j) {
+            std::swap(data[i], data[j]);
+        }
+    }
+
+    for (int len=2; len<=n; len<<=1) {
+        int step = n / len;
+        for (int i=0; i<n; i+=len) {
+            for (int j=0; j<len/2; j++) {
+                Complex w = inverse ? std::conj(roots[j * step]) : roots[j * step];
+                Complex u = data[i + j];
+                Complex v = data[i + j + len/2] * w;
+                data[i + j] = u + v;
+                data[i + j + len/2] = u - v;
+            }
+        }
+    }
+}
+
+/*
+2D FFT of px * py values, row by row, the inverse isn't normalized.
+Only the first `rows` rows are transformed, the other ones being zero.
+*/
+void fft2D(std::vector<Complex> &data, int px, int py, bool inverse, int rows) {
+    std::vector<Complex> rootsX = getRoots(px);
+    std::vector<Complex> rootsY = getRoots(py);
+
+    for (int j=0; j<rows; j++) {
+        fft(&data[j * px], px, rootsX, inverse);
+    }
+
+    // columns, copied to be contiguous
+    std::vector<Complex> column(py);
+    for (int i=0; i<px; i++) {
+        for (int j=0; j<py; j++) {
+            column[j] = data[j * px + i];
+        }
+        fft(column.data(), py, rootsY, inverse);
+        for (int j=0; j<py; j++) {
+            data[j * px + i] = column[j];
+        }
+    }
+}
+
+}
+
+PotentialGrid::PotentialGrid(double minX, double maxX, double minY, double maxY, int nx, int ny, double softening) {
+    if (nx < 1 || ny < 1) {
+        throw std::invalid_argument("the grid needs at least one node per axis");
+    }
+    if (!(minX <= maxX) || !(minY <= maxY)) {
+        throw std::invalid_argument("invalid bounds of the grid");
+    }
+
+    this->minX = minX;
+    this->maxX = maxX;
+    this->minY = minY;
+    this->maxY = maxY;
+    this->nx = nx;
+    this->ny = ny;
+    this->softening = softening;
+}
+
+template<typename T>
+std::vector<double> PotentialGrid::compute(const std::vector<Particule<T>> &particules, double k) const {
+    return computeFrom(particules.size(), [&](int i, double &x, double &y, double &q) {
+        x = particules[i].pos.x;
+        y = particules[i].pos.y;
+        q = particules[i].q;
+    }, k);
+}
+
+template<typename T>
+std::vector<double> PotentialGrid::compute(int n, const T *positions, const T *charges, double k) const {
+    return computeFrom(n, [&](int i, double &x, double &y, double &q) {
+        x = positions[2*i];
+        y = positions[2*i+1];
+        q = charges[i];
+    }, k);
+}
+
+/*
+Compute the potential, particule(i, x, y, q) setting the position & charge of the i-th particule.
+*/
+template<typename F>
+std::vector<double> PotentialGrid::computeFrom(int n, F particule, double k) const {
+    // spacing of the grid
+    double gx = nx > 1 ? (maxX - minX) / (nx - 1) : 0;
+    double gy = ny > 1 ? (maxY - minY) / (ny - 1) : 0;
+
+    double hx = gx > 0 ? gx : (gy > 0 ? gy : 1);
+    double hy = gy > 0 ? gy : hx;
+
+    // bounds of the mesh: the grid & the finite positions
+    double x0 = minX, x1 = maxX, y0 = minY, y1 = maxY;
+    for (int i=0; i<n; i++) {
+        double x, y, q;
+        particule(i, x, y, q);
+        if (std::isfinite(x) && std::isfinite(y)) {
+            x0 = std::min(x0, x);
+            x1 = std::max(x1, x);
+            y0 = std::min(y0, y);
+            y1 = std::max(y1, y);
+        }
+    }
+
+    // a node beyond the last position, for the cloud in cell
+    auto meshSize = [](double extent, double &h) {
+        double size = std::ceil(extent / h - 1e-9) + 2;
+        if (!(size <= MAX_MESH)) {
+            h = extent / (MAX_MESH - 2);
+            return MAX_MESH;
+        }
+        return static_cast<int>(size);
+    };
+    int mx = meshSize(x1 - x0, hx);
+    int my = meshSize(y1 - y0, hy);
+
+    // zero padded: the charges don't see periodic images
+    int px = nextPowerOfTwo(2 * mx);
+    int py = nextPowerOfTwo(2 * my);
+
+    // cloud in cell deposit, on the mesh only: it stays in cache
+    std::vector<double> mesh(mx * my);
+    for (int i=0; i<n; i++) {
+        double x, y, q;
+        particule(i, x, y, q);
+        if (!std::isfinite(x) || !std::isfinite(y) || !std::isfinite(q)) {
+            continue;
+        }
+
+        double fx = (x - x0) / hx;
+        double fy = (y - y0) / hy;
+        int ix = std::min(static_cast<int>(fx), mx - 2);
+        int iy = std::min(static_cast<int>(fy), my - 2);
+        double wx = fx - ix;
+        double wy = fy - iy;
+
+        mesh[iy * mx + ix] += q * (1 - wx) * (1 - wy);
+        mesh[iy * mx + ix + 1] += q * wx * (1 - wy);
+        mesh[(iy + 1) * mx + ix] += q * (1 - wx) * wy;
+        mesh[(iy + 1) * mx + ix + 1] += q * wx * wy;
+    }
+
+    std::vector<Complex> charges(px * py);
+    for (int j=0; j<my; j++) {
+        std::copy(&mesh[j * mx], &mesh[j * mx] + mx, &charges[j * px]);
+    }
+
+    // kernel, negative offsets wrapped around
+    double s = softening < 0 ? std::max(hx, hy) : softening;
+    std::vector<Complex> kernel(px * py);
+
+    for (int j=0; j<py; j++) {
+        int dj = j < my ? j : j - py;
+        if (dj <= -my) {
+            continue;
+        }
+        for (int i=0; i<px; i++) {
+            int di = i < mx ? i : i - px;
+            if (di <= -mx) {
+                continue;
+            }
+            double r2 = di * hx * di * hx + dj * hy * dj * hy + s * s;
+            kernel[j * px + i] = r2 > 0 ? k / std::sqrt(r2) : 0;
+        }
+    }
+
+    fft2D(charges, px, py, false, my);
+    fft2D(kernel, px, py, false, py);
+
+    for (int c=0; c<px * py; c++) {
+        charges[c] *= kernel[c];
+    }
+    fft2D(charges, px, py, true, py);
+
+    double norm = 1.0 / (px * py);
+
+    // bilinear interpolation at the nodes of the grid
+    std::vector<double> potential(nx * ny);
+
+    for (int j=0; j<ny; j++) {
+        double fy = std::min(std::max((minY + j * gy - y0) / hy, 0.0), my - 1.0);
+        int iy = std::min(static_cast<int>(fy), my - 2);
+        double wy = fy - iy;
+
+        for (int i=0; i<nx; i++) {
+            double fx = std::min(std::max((minX + i * gx - x0) / hx, 0.0), mx - 1.0);
+            int ix = std::min(static_cast<int>(fx), mx - 2);
+            double wx = fx - ix;
+
+            double value = charges[iy * px + ix].real() * (1 - wx) * (1 - wy)
+                + charges[iy * px + ix + 1].real() * wx * (1 - wy)
+                + charges[(iy + 1) * px + ix].real() * (1 - wx) * wy
+                + charges[(iy + 1) * px + ix + 1].real() * wx * wy;
+
+            potential[j * nx + i] = value * norm;
+        }
+    }
+
+    return potential;
+}
+
+template std::vector<double> PotentialGrid::compute(const std::vector<Particule<float>>&, double) const;
+template std::vector<double> PotentialGrid::compute(const std::vector<Particule<double>>&, double) const;
+template std::vector<double> PotentialGrid::compute(int, const float*, const float*, double) const;
+template std::vector<double> PotentialGrid::compute(int, const double*, const double*, double) const;
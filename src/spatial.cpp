@@ -0,0 +1,248 @@
+# include <algorithm>
+# include <cmath>
+# include <queue>
+# include <utility>
+# include "spatial.hpp"
+
+namespace {
+
+// clamp a cell coordinate in [0, n-1], NaN goes to 0
+int clampCell(double c, int n) {
+    if (!(c >= 0)) {
+        return 0;
+    }
+    if (c > n - 1) {
+        return n - 1;
+    }
+    return static_cast<int>(c);
+}
+
+// equal coordinates, NaN included
+template<typename T>
+bool sameCoordinate(T a, T b) {
+    return a == b || (a != a && b != b);
+}
+
+}
+
+template<typename T>
+int SpatialIndex<T>::cellX(double x) const {
+    return clampCell(std::floor((x - originX) * invCellSize), nx);
+}
+
+template<typename T>
+int SpatialIndex<T>::cellY(double y) const {
+    return clampCell(std::floor((y - originY) * invCellSize), ny);
+}
+
+template<typename T>
+void SpatialIndex<T>::build(const std::vector<Particule<T>> &particules) {
+    buildFrom(particules.size(), [&](int i) { return particules[i].pos; });
+}
+
+template<typename T>
+void SpatialIndex<T>::build(int n, const T *positions) {
+    buildFrom(n, [&](int i) { return Vect2D<T>(positions[2*i], positions[2*i+1]); });
+}
+
+/*
+Build the index, position(i) returning the position of the i-th point.
+*/
+template<typename T>
+template<typename F>
+void SpatialIndex<T>::buildFrom(int n, F position) {
+    // bounding box of the finite positions
+    double minX = INFINITY, maxX = -INFINITY, minY = INFINITY, maxY = -INFINITY;
+    for (int i=0; i<n; i++) {
+        Vect2D<T> p = position(i);
+        if (std::isfinite(p.x) && std::isfinite(p.y)) {
+            minX = std::min(minX, (double)p.x);
+            maxX = std::max(maxX, (double)p.x);
+            minY = std::min(minY, (double)p.y);
+            maxY = std::max(maxY, (double)p.y);
+        }
+    }
+    if (minX > maxX) {
+        minX = maxX = minY = maxY = 0;
+    }
+
+    double width = maxX - minX;
+    double height = maxY - minY;
+    double extent = std::max(width, height);
+
+    // flat distributions: a minimal thickness, the cells are capped per axis below
+    double area = std::max(width, extent * 1e-6) * std::max(height, extent * 1e-6);
+
+    cellSize = std::sqrt(area * CELL_OCCUPANCY / std::max(n, 1));
+    if (!(cellSize > 0) || !std::isfinite(cellSize)) {
+        cellSize = 1;
+    }
+
+    nx = clampCell(width / cellSize, MAX_CELLS_PER_AXIS) + 1;
+    ny = clampCell(height / cellSize, MAX_CELLS_PER_AXIS) + 1;
+    cellSize = std::max({cellSize, width / nx, height / ny});
+
+    originX = minX;
+    originY = minY;
+    invCellSize = 1 / cellSize;
+
+    // counting sort by cell
+    std::vector<int32_t> cells(n);
+    cellStart.assign(nx * ny + 1, 0);
+
+    for (int i=0; i<n; i++) {
+        Vect2D<T> p = position(i);
+        cells[i] = cellY(p.y) * nx + cellX(p.x);
+        cellStart[cells[i] + 1]++;
+    }
+    for (int c=0; c<nx * ny; c++) {
+        cellStart[c + 1] += cellStart[c];
+    }
+
+    std::vector<int32_t> next(cellStart.begin(), cellStart.end() - 1);
+    order.resize(n);
+    xs.resize(n);
+    ys.resize(n);
+
+    for (int i=0; i<n; i++) {
+        int slot = next[cells[i]]++;
+        Vect2D<T> p = position(i);
+        order[slot] = i;
+        xs[slot] = p.x;
+        ys[slot] = p.y;
+    }
+
+    valid = true;
+}
+
+template<typename T>
+bool SpatialIndex<T>::matches(const std::vector<Particule<T>> &particules) const {
+    if (!valid || particules.size() != order.size()) {
+        return false;
+    }
+    for (int s=0; s<order.size(); s++) {
+        const Vect2D<T> &p = particules[order[s]].pos;
+        if (!sameCoordinate(p.x, xs[s]) || !sameCoordinate(p.y, ys[s])) {
+            return false;
+        }
+    }
+    return true;
+}
+
+template<typename T>
+std::vector<int64_t> SpatialIndex<T>::queryRect(double minX, double maxX, double minY, double maxY) const {
+    std::vector<int64_t> indices;
+    if (order.empty() || minX > maxX || minY > maxY) {
+        return indices;
+    }
+
+    int cx0 = cellX(minX), cx1 = cellX(maxX);
+    int cy0 = cellY(minY), cy1 = cellY(maxY);
+
+    for (int cy=cy0; cy<=cy1; cy++) {
+        for (int cx=cx0; cx<=cx1; cx++) {
+            int c = cy * nx + cx;
+            for (int s=cellStart[c]; s<cellStart[c + 1]; s++) {
+                if (xs[s] >= minX && xs[s] <= maxX && ys[s] >= minY && ys[s] <= maxY) {
+                    indices.push_back(order[s]);
+                }
+            }
+        }
+    }
+
+    std::sort(indices.begin(), indices.end());
+    return indices;
+}
+
+template<typename T>
+std::vector<int64_t> SpatialIndex<T>::queryRadius(double x, double y, double r) const {
+    std::vector<int64_t> indices;
+    if (order.empty() || !(r >= 0)) {
+        return indices;
+    }
+
+    int cx0 = cellX(x - r), cx1 = cellX(x + r);
+    int cy0 = cellY(y - r), cy1 = cellY(y + r);
+    double r2 = r * r;
+
+    for (int cy=cy0; cy<=cy1; cy++) {
+        for (int cx=cx0; cx<=cx1; cx++) {
+            int c = cy * nx + cx;
+            for (int s=cellStart[c]; s<cellStart[c + 1]; s++) {
+                double dx = xs[s] - x;
+                double dy = ys[s] - y;
+                if (dx*dx + dy*dy <= r2) {
+                    indices.push_back(order[s]);
+                }
+            }
+        }
+    }
+
+    std::sort(indices.begin(), indices.end());
+    return indices;
+}
+
+template<typename T>
+void SpatialIndex<T>::nearest(double x, double y, int k, std::vector<int64_t> &indices, std::vector<double> &distances) const {
+    indices.clear();
+    distances.clear();
+
+    k = std::min(k, (int)order.size());
+    if (k <= 0) {
+        return;
+    }
+
+    // max-heap of the k nearest found: (squared distance, index)
+    std::priority_queue<std::pair<double, int32_t>> heap;
+
+    int cx = cellX(x), cy = cellY(y);
+    int maxRing = std::max({cx, nx - 1 - cx, cy, ny - 1 - cy});
+
+    auto visit = [&](int cellX, int cellY) {
+        int c = cellY * nx + cellX;
+        for (int s=cellStart[c]; s<cellStart[c + 1]; s++) {
+            double dx = xs[s] - x;
+            double dy = ys[s] - y;
+            double d2 = dx*dx + dy*dy;
+
+            if ((int)heap.size() < k) {
+                heap.push({d2, order[s]});
+            } else if (d2 < heap.top().first) {
+                heap.pop();
+                heap.push({d2, order[s]});
+            }
+        }
+    };
+
+    for (int ring=0; ring<=maxRing; ring++) {
+        // the cells of this ring are at least (ring - 1) cells away from the point
+        double bound = std::max(ring - 1, 0) * cellSize;
+        if ((int)heap.size() == k && bound * bound > heap.top().first) {
+            break;
+        }
+
+        int x0 = cx - ring, x1 = cx + ring;
+        int y0 = cy - ring, y1 = cy + ring;
+
+        for (int i=std::max(x0, 0); i<=std::min(x1, nx - 1); i++) {
+            if (y0 >= 0) visit(i, y0);
+            if (y1 < ny && ring > 0) visit(i, y1);
+        }
+        for (int j=std::max(y0 + 1, 0); j<=std::min(y1 - 1, ny - 1); j++) {
+            if (x0 >= 0) visit(x0, j);
+            if (x1 < nx && ring > 0) visit(x1, j);
+        }
+    }
+
+    indices.resize(heap.size());
+    distances.resize(heap.size());
+
+    for (int i=heap.size() - 1; i>=0; i--) {
+        distances[i] = std::sqrt(heap.top().first);
+        indices[i] = heap.top().second;
+        heap.pop();
+    }
+}
+
+template class SpatialIndex<float>;
+template class SpatialIndex<double>;
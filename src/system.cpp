@@ -1,3 +1,5 @@
+# include <algorithm>
+# include <chrono>
 # include <iostream>
 # include "system.hpp"
 # include "physic.hpp"
@@ -5,10 +7,29 @@
 
 # define LOG(x) std::cout << x << std::endl;
 
-System::System(std::vector<Particule> &particules, float dt, int flag) {
-    this->physic = Physics();
+namespace {
+
+using Clock = std::chrono::steady_clock;
+
+// elapsed nanoseconds since start, then reset start
+int64_t lap(Clock::time_point &start) {
+    Clock::time_point now = Clock::now();
+    int64_t ns = std::chrono::duration_cast<std::chrono::nanoseconds>(now - start).count();
+    start = now;
+    return ns;
+}
+
+}
+
+template<typename T, typename A>
+System<T, A>::System(std::vector<Particule<T>> &particules, T dt, int flag) {
+    this->physic = Physics<T, A>();
     this->particules = particules;
 
+    for (int i=0; i<this->particules.size(); i++) {
+        this->particules[i].id = nextId++;
+    }
+
     if (dt == -1) {
         dt = this->physic.constants.defaultDt;
     }
@@ -17,7 +38,8 @@ System::System(std::vector<Particule> &particules, float dt, int flag) {
     this->mergingFlag = flag;
 }
 
-void System::setLimits(float minX, float maxX, float minY, float maxY) {
+template<typename T, typename A>
+void System<T, A>::setLimits(T minX, T maxX, T minY, T maxY) {
     this->isLimits = true;
     this->minX = minX;
     this->maxX = maxX;
@@ -25,21 +47,52 @@ void System::setLimits(float minX, float maxX, float minY, float maxY) {
     this->maxY = maxY;
 }
 
-void System::clearElements() {
+template<typename T, typename A>
+void System<T, A>::clearElements() {
     this->particules.clear();
     this->magneticFields.clear();
+    index.invalidate();
+}
+
+template<typename T, typename A>
+const SpatialIndex<T>& System<T, A>::spatialIndex() const {
+    if (!index.isValid() || (exposed && !index.matches(particules))) {
+        index.build(particules);
+        statistics.indexBuilds++;
+    }
+    return index;
+}
+
+template<typename T, typename A>
+std::vector<int64_t> System<T, A>::queryRect(double minX, double maxX, double minY, double maxY) const {
+    return spatialIndex().queryRect(minX, maxX, minY, maxY);
+}
+
+template<typename T, typename A>
+std::vector<int64_t> System<T, A>::queryRadius(double x, double y, double r) const {
+    return spatialIndex().queryRadius(x, y, r);
 }
 
-void System::updateState(float dt) {
+template<typename T, typename A>
+void System<T, A>::nearest(double x, double y, int k, std::vector<int64_t> &indices, std::vector<double> &distances) const {
+    spatialIndex().nearest(x, y, k, indices, distances);
+}
+
+template<typename T, typename A>
+void System<T, A>::updateState(T dt) {
 
     if (dt == -1) {
         dt = this->dt;
     }
 
-    std::vector<int> toRemove;
-    std::vector<Particule> newParticules;
+    std::vector<Particule<T>> newParticules;
     newParticules.reserve(getNumberParticules());
-    Particule *ptrP1, *ptrP2;
+    Particule<T> *ptrP1, *ptrP2;
+
+    accelerations.assign(particules.size(), Vect2D<A>(0, 0));
+
+    Clock::time_point start = Clock::now();
+    int64_t nPairs = 0, nMerges = 0, nFields = 0, nRemovals = 0;
 
     // perform all particules interactions
     // merge close particules
@@ -60,6 +113,7 @@ void System::updateState(float dt) {
                     // set particule to be dead
                     ptrP1->isDead = true;
                     ptrP2->isDead = true;
+                    nMerges++;
 
                     // remove non-charged particules
                     if (willBeValidMerge(*ptrP1, *ptrP2)) {
@@ -70,11 +124,15 @@ void System::updateState(float dt) {
 
                 physic.handelnParticulesInteraction(
                     *ptrP1,
-                    *ptrP2
+                    *ptrP2,
+                    accelerations[i],
+                    accelerations[j]
                 );
+                nPairs++;
             }
         }
     }
+    statistics.pairsNs += lap(start);
 
     // perfom all magnetics interactions
     for (int i=0; i<magneticFields.size(); i++) {
@@ -86,10 +144,13 @@ void System::updateState(float dt) {
 
             physic.handelnMagneticInteraction(
                 particules[j],
-                magneticFields[i]
+                magneticFields[i],
+                accelerations[j]
             );
+            nFields++;
         }
     }
+    statistics.fieldsNs += lap(start);
 
     // update state
     // reconstruct particules
@@ -100,18 +161,61 @@ void System::updateState(float dt) {
         }
         
         if (!isInLimits(particules[i])) {
+            nRemovals++;
             continue;
         }
 
+        particules[i].a = Vect2D<T>(accelerations[i]);
         particules[i].updateState(dt);
 
         newParticules.push_back(particules[i]);
     }
 
     particules.swap(newParticules);
+    index.invalidate();
+    exposed = false;
+    statistics.integrationNs += lap(start);
+
+    step++;
+    time += dt;
+
+    if (recorder != nullptr && step % recorder->getEvery() == 0) {
+        recorder->write(particules, step, time);
+        statistics.recordNs += lap(start);
+    }
+
+    statistics.steps++;
+    statistics.pairInteractions += nPairs;
+    statistics.fieldInteractions += nFields;
+    statistics.merges += nMerges;
+    statistics.removals += nRemovals;
+}
+
+template<typename T, typename A>
+void System<T, A>::run(int nSteps, T dt) {
+    for (int i=0; i<nSteps; i++) {
+        updateState(dt);
+    }
+}
+
+template<typename T, typename A>
+Summary System<T, A>::summary() const {
+    Summary summary;
+    summary.nParticules = particules.size();
+
+    for (int i=0; i<particules.size(); i++) {
+        const Particule<T> &p = particules[i];
+        summary.charge += p.q;
+        summary.mass += p.m;
+        summary.kineticEnergy += 0.5 * p.m * (p.v.x * p.v.x + p.v.y * p.v.y);
+        summary.momentumX += p.m * p.v.x;
+        summary.momentumY += p.m * p.v.y;
+    }
+    return summary;
 }
 
-bool System::isInLimits(Particule &p) const {
+template<typename T, typename A>
+bool System<T, A>::isInLimits(Particule<T> &p) const {
     if (!isLimits) {
         return true;
     } else if (
@@ -126,7 +230,8 @@ bool System::isInLimits(Particule &p) const {
     return false;
 }
 
-bool System::willBeValidMerge(Particule &p1, Particule &p2) {
+template<typename T, typename A>
+bool System<T, A>::willBeValidMerge(Particule<T> &p1, Particule<T> &p2) {
     if (mergingFlag == FLAG_SUM_ONESIDE) {
         return true;
     }
@@ -134,7 +239,8 @@ bool System::willBeValidMerge(Particule &p1, Particule &p2) {
     return (p1.q + p2.q != 0);
 }
 
-Particule System::mergeParticules(Particule &p1, Particule &p2) {
+template<typename T, typename A>
+Particule<T> System<T, A>::mergeParticules(Particule<T> &p1, Particule<T> &p2) {
     
     int q = 0;
     if (mergingFlag == FLAG_SUM) {
@@ -146,24 +252,80 @@ Particule System::mergeParticules(Particule &p1, Particule &p2) {
         q = p1.q + p2.q;
     }
     
-    return Particule(
+    Particule<T> particule(
         p1.pos,
         q,
         p1.m + p2.m
     );
+    particule.id = nextId++;
+    return particule;
 }
 
-void System::addMagneticField(MagneticField &magneticField) {
+template<typename T, typename A>
+void System<T, A>::addMagneticField(MagneticField<T> &magneticField) {
     magneticFields.push_back(magneticField);
 }
 
-void System::addParticule(Particule &particule) {
+template<typename T, typename A>
+void System<T, A>::addParticule(Particule<T> &particule) {
     particules.push_back(particule);
+    particules.back().id = nextId++;
+    index.invalidate();
+}
+
+template<typename T, typename A>
+void System<T, A>::addParticules(int n, const T *pos, const T *q, const T *m, const T *v, const T *a, const int64_t *ids) {
+    particules.reserve(particules.size() + n);
+    for (int i=0; i<n; i++) {
+        Particule<T> particule(pos[2*i], pos[2*i+1], q[i], m[i]);
+
+        if (v != nullptr) {
+            particule.v = Vect2D<T>(v[2*i], v[2*i+1]);
+        }
+        if (a != nullptr) {
+            particule.a = Vect2D<T>(a[2*i], a[2*i+1]);
+        }
+        if (ids != nullptr) {
+            particule.id = ids[i];
+            nextId = std::max(nextId, ids[i] + 1);
+        } else {
+            particule.id = nextId++;
+        }
+        particules.push_back(particule);
+    }
+    index.invalidate();
+}
+
+template<typename T, typename A>
+void System<T, A>::record(const std::string &path, int every, int chunkFrames, int codec, int bits) {
+    std::vector<double> bounds = {0, 0, 0, 0};
+    if (isLimits) {
+        bounds = {minX, maxX, minY, maxY};
+    }
+
+    stopRecording();
+    recorder = std::make_shared<TrajectoryWriter<T>>(path, every, chunkFrames, bounds, codec, bits);
+
+    // initial frame
+    recorder->write(particules, step, time);
+}
+
+template<typename T, typename A>
+void System<T, A>::stopRecording() {
+    if (recorder != nullptr) {
+        recorder->close();
+        recorder.reset();
+    }
 }
 
-void System::print() {
+template<typename T, typename A>
+void System<T, A>::print() {
     std::cout << "System : " << particules.size() << " particules." << std::endl;
     for (int i=0; i<particules.size(); i++) {
         particules[i].print();
     }
-}
\ No newline at end of file
+}
+
+template class System<float, float>;
+template class System<float, double>;
+template class System<double, double>;
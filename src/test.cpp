@@ -3,16 +3,17 @@
 # include "physic.hpp"
 # include "partcule.hpp"
 # include "system.hpp"
+# include "ensemble.hpp"
 
 int main() {
     
-    Particule p1(0, 0, 1, 1);
-    Particule p2(0, 1, -1, 1);
-    Particule p3(1, 1, 1, 1);
+    Particule<float> p1(0, 0, 1, 1);
+    Particule<float> p2(0, 1, -1, 1);
+    Particule<float> p3(1, 1, 1, 1);
 
-    std::vector<Particule> particules = {p1, p2, p3};
+    std::vector<Particule<float>> particules = {p1, p2, p3};
 
-    System system = System(particules, 1);
+    System<float> system = System<float>(particules, 1);
     system.physic.constants.setK(1);
     // system.setLimits(0, 10, 0, 10);
 
@@ -27,11 +28,32 @@ int main() {
     system.print();
 
     Vect2D<float> origin(2,3);
-    auto magnetic = MagneticField(origin, 10);
+    auto magnetic = MagneticField<float>(origin, 10);
 
     Vect2D<float> coord(3,3);
     std::cout << magnetic.getIntensity(coord) << std::endl;
 
+    // mixed precision: float storage, double accumulation
+    std::vector<Particule<float>> mixedParticules = {p1, p2, p3};
+    System<float, double> mixed = System<float, double>(mixedParticules, 1);
+    mixed.physic.constants.setK(1);
+    mixed.updateState();
+    mixed.print();
+
+    // ensemble of independent systems
+    Ensemble<float> ensemble;
+    ensemble.addSystem(system);
+    ensemble.addSystem(system);
+    ensemble.run(2, 2);
+    std::cout << "ensemble: " << ensemble.summaries()[1].nParticules << " particules" << std::endl;
+
+    // checkpoint
+    system.save("/tmp/test_checkpoint.bin");
+    std::vector<Particule<double>> empty;
+    System<double> restored = System<double>(empty);
+    restored.load("/tmp/test_checkpoint.bin");
+    restored.print();
+
     std::cout << "number: " << -23 << " -> " << sign(-23) << std::endl;
 
     return 0;
@@ -0,0 +1,282 @@
+# include <algorithm>
+# include <cmath>
+# include <cstring>
+# include <limits>
+# include <iostream>
+# include <stdexcept>
+# include <zlib.h>
+# include "trajectory.hpp"
+
+namespace {
+
+const char MAGIC[8] = {'P', 'S', 'I', 'M', 'T', 'R', 'A', 'J'};
+const char CHUNK_MAGIC[4] = {'C', 'H', 'N', 'K'};
+const char INDEX_MAGIC[4] = {'I', 'N', 'D', 'X'};
+const char TRAILER_MAGIC[8] = {'P', 'S', 'I', 'M', 'I', 'D', 'X', '\0'};
+const uint32_t HEADER_SIZE = 64;
+
+}
+
+template<typename T>
+TrajectoryWriter<T>::TrajectoryWriter(const std::string &path, int every, int chunkFrames, const std::vector<double> &bounds,
+        int codec, int bits) {
+    this->every = std::max(1, every);
+    this->chunkFrames = std::max(1, chunkFrames);
+    this->codec = codec;
+    this->bits = bits;
+
+    if (codec != CODEC_RAW && codec != CODEC_QUANTIZED) {
+        throw std::invalid_argument("unknown trajectory codec: " + std::to_string(codec));
+    }
+
+    if (codec == CODEC_QUANTIZED) {
+        if (bits < 1 || bits > 30) {
+            throw std::invalid_argument("quantization bits must be in [1, 30]");
+        }
+        if (bounds.size() < 4 || bounds[1] <= bounds[0] || bounds[3] <= bounds[2]) {
+            throw std::invalid_argument("the quantized codec requires the limits of the system");
+        }
+        double levels = (1 << bits) - 1;
+        minX = bounds[0];
+        minY = bounds[2];
+        stepX = (bounds[1] - bounds[0]) / levels;
+        stepY = (bounds[3] - bounds[2]) / levels;
+    }
+
+    file.open(path, std::ios::binary | std::ios::trunc);
+
+    if (!file) {
+        throw std::runtime_error("can't open trajectory file: " + path);
+    }
+
+    // header
+    append(MAGIC);
+    append<uint32_t>(VERSION);
+    append<uint32_t>(HEADER_SIZE);
+    append<uint32_t>(sizeof(T));
+    append<uint32_t>(codec);
+    append<uint32_t>(this->every);
+    append<uint32_t>(codec == CODEC_QUANTIZED ? bits : 0);
+    for (int i=0; i<4; i++) {
+        append<double>(i < bounds.size() ? bounds[i] : 0);
+    }
+    file.write(chunk.data(), chunk.size());
+    fileOffset = chunk.size();
+    chunk.clear();
+}
+
+template<typename T>
+TrajectoryWriter<T>::~TrajectoryWriter() {
+    try {
+        close();
+    } catch (const std::exception &e) {
+        std::cerr << "TrajectoryWriter: " << e.what() << std::endl;
+    }
+}
+
+template<typename T>
+template<typename V>
+void TrajectoryWriter<T>::append(const V &value) {
+    const char *bytes = reinterpret_cast<const char*>(&value);
+    chunk.insert(chunk.end(), bytes, bytes + sizeof(V));
+}
+
+template<typename T>
+void TrajectoryWriter<T>::pad() {
+    chunk.resize((chunk.size() + 7) / 8 * 8, 0);
+}
+
+template<typename T>
+void TrajectoryWriter<T>::write(const std::vector<Particule<T>> &particules, int64_t step, double time) {
+    uint64_t n = particules.size();
+
+    index.push_back({step, time, n, 0, chunk.size()});
+
+    append<int64_t>(step);
+    append<double>(time);
+    append<uint64_t>(n);
+
+    // one block per attribute
+    chunk.reserve(chunk.size() + n * (sizeof(int64_t) + 6 * sizeof(T)) + 32);
+
+    if (codec == CODEC_QUANTIZED) {
+        writeQuantized(particules);
+    } else {
+        writeRaw(particules);
+    }
+
+    nFrames++;
+
+    if (nFrames >= chunkFrames) {
+        flush();
+    }
+}
+
+template<typename T>
+int32_t TrajectoryWriter<T>::quantize(double x, double min, double step) const {
+    double level = std::round((x - min) / step);
+    level = std::max(level, (double)std::numeric_limits<int32_t>::min());
+    level = std::min(level, (double)std::numeric_limits<int32_t>::max());
+    return static_cast<int32_t>(level);
+}
+
+template<typename T>
+void TrajectoryWriter<T>::writeQuantized(const std::vector<Particule<T>> &particules) {
+    uint64_t n = particules.size();
+
+    int64_t previousId = 0;
+    for (uint64_t i=0; i<n; i++) {
+        append<int64_t>(particules[i].id - previousId);
+        previousId = particules[i].id;
+    }
+
+    current.clear();
+    current.reserve(n);
+
+    for (uint64_t i=0; i<n; i++) {
+        int32_t x = quantize(particules[i].pos.x, minX, stepX);
+        int32_t y = quantize(particules[i].pos.y, minY, stepY);
+        current[particules[i].id] = {x, y};
+
+        // deltas modulo 2^32, never overflow
+        auto it = previous.find(particules[i].id);
+        if (it != previous.end()) {
+            append<int32_t>((int32_t)((uint32_t)x - (uint32_t)it->second.first));
+            append<int32_t>((int32_t)((uint32_t)y - (uint32_t)it->second.second));
+        } else {
+            append<int32_t>(x);
+            append<int32_t>(y);
+        }
+    }
+    previous.swap(current);
+
+    writeAttributes(particules);
+}
+
+template<typename T>
+void TrajectoryWriter<T>::writeRaw(const std::vector<Particule<T>> &particules) {
+    uint64_t n = particules.size();
+
+    for (uint64_t i=0; i<n; i++) {
+        append<int64_t>(particules[i].id);
+    }
+    for (uint64_t i=0; i<n; i++) {
+        append<T>(particules[i].pos.x);
+        append<T>(particules[i].pos.y);
+    }
+
+    writeAttributes(particules);
+}
+
+template<typename T>
+void TrajectoryWriter<T>::writeAttributes(const std::vector<Particule<T>> &particules) {
+    uint64_t n = particules.size();
+
+    for (uint64_t i=0; i<n; i++) {
+        append<T>(particules[i].v.x);
+        append<T>(particules[i].v.y);
+    }
+    for (uint64_t i=0; i<n; i++) {
+        append<T>(particules[i].q);
+    }
+    pad();
+    for (uint64_t i=0; i<n; i++) {
+        append<T>(particules[i].m);
+    }
+    pad();
+}
+
+template<typename T>
+void TrajectoryWriter<T>::flush() {
+    if (nFrames == 0 || !file.is_open()) {
+        return;
+    }
+
+    uint64_t rawSize = chunk.size();
+    uint64_t size = rawSize;
+    const char *payload = chunk.data();
+    std::vector<char> compressed;
+
+    if (codec == CODEC_QUANTIZED) {
+        uLongf compressedSize = compressBound(rawSize);
+        compressed.resize(compressedSize);
+
+        int status = compress2(
+            reinterpret_cast<Bytef*>(compressed.data()), &compressedSize,
+            reinterpret_cast<const Bytef*>(chunk.data()), rawSize,
+            Z_BEST_SPEED
+        );
+        if (status != Z_OK) {
+            throw std::runtime_error("failed to compress trajectory chunk");
+        }
+        size = compressedSize;
+        payload = compressed.data();
+
+        // the next chunk starts with a key frame
+        previous.clear();
+    }
+
+    file.write(CHUNK_MAGIC, sizeof(CHUNK_MAGIC));
+    file.write(reinterpret_cast<const char*>(&nFrames), sizeof(uint32_t));
+    file.write(reinterpret_cast<const char*>(&size), sizeof(uint64_t));
+    file.write(reinterpret_cast<const char*>(&rawSize), sizeof(uint64_t));
+    file.write(payload, size);
+
+    // keep the payloads aligned on 8 bytes
+    uint64_t padding = (8 - size % 8) % 8;
+    const char zeros[8] = {0};
+    file.write(zeros, padding);
+    file.flush();
+
+    for (int i=nIndexedFrames; i<index.size(); i++) {
+        index[i].chunkOffset = fileOffset;
+    }
+    nIndexedFrames = index.size();
+    fileOffset += sizeof(CHUNK_MAGIC) + sizeof(uint32_t) + 2 * sizeof(uint64_t) + size + padding;
+
+    chunk.clear();
+    nFrames = 0;
+
+    if (!file) {
+        throw std::runtime_error("failed to write trajectory file");
+    }
+}
+
+template<typename T>
+void TrajectoryWriter<T>::close() {
+    if (!file.is_open()) {
+        return;
+    }
+    flush();
+    writeIndex();
+    file.close();
+}
+
+template<typename T>
+void TrajectoryWriter<T>::writeIndex() {
+    uint64_t indexOffset = fileOffset;
+    uint64_t nEntries = index.size();
+    uint32_t reserved = 0;
+
+    file.write(INDEX_MAGIC, sizeof(INDEX_MAGIC));
+    file.write(reinterpret_cast<const char*>(&reserved), sizeof(uint32_t));
+    file.write(reinterpret_cast<const char*>(&nEntries), sizeof(uint64_t));
+
+    for (const IndexEntry &entry : index) {
+        file.write(reinterpret_cast<const char*>(&entry.step), sizeof(int64_t));
+        file.write(reinterpret_cast<const char*>(&entry.time), sizeof(double));
+        file.write(reinterpret_cast<const char*>(&entry.n), sizeof(uint64_t));
+        file.write(reinterpret_cast<const char*>(&entry.chunkOffset), sizeof(uint64_t));
+        file.write(reinterpret_cast<const char*>(&entry.frameOffset), sizeof(uint64_t));
+    }
+
+    file.write(reinterpret_cast<const char*>(&indexOffset), sizeof(uint64_t));
+    file.write(TRAILER_MAGIC, sizeof(TRAILER_MAGIC));
+
+    if (!file) {
+        throw std::runtime_error("failed to write trajectory index");
+    }
+}
+
+template class TrajectoryWriter<float>;
+template class TrajectoryWriter<double>;